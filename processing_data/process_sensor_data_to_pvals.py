@@ -41,6 +41,7 @@ from utilities.aux import (get_active_node_nam_lst,
 from utilities.physical_setup import (
     dim, sen_loc_arr, get_experiment_parameters,
     get_true_label_start_and_end_time_lsts, get_selected_alternative)
+from utilities.geometry import static_coords
 
 # %% setup: user-defined parameters
 experiment_name = 'bonus'  # the name of the conducted experiment
@@ -68,6 +69,10 @@ selected_nodes = [
     "Node4", "Node11", "Node5", "Node25", "Node24", "Node15", "Node33"]
 selected_nodes = 'all' # this selects all active nodes for investigation
 
+static_geometry = True  # if True, the sensor coordinates are stored once and
+# broadcast to all epochs as a read-only view instead of being copied for every
+# epoch. Set to False for data where sensors change their locations.
+
  # %% setup: automated initializations
 data_directory = os.path.join("..", "csv", experiment_name)
 
@@ -133,13 +138,21 @@ for alt_idx_lst in selected_alternative_epochs:
 # (only to be done once for each scenario!)
 fd_dim = dim
 
-sen_cds = np.zeros(
-    (len(selected_alternative_epochs[0]), len(selected_nodes), 2), dtype=int)
 p = np.zeros((len(selected_alternative_epochs[0]), len(selected_nodes)))
 for node_idx, node in enumerate(selected_nodes):
     p[:, node_idx] = pvals_emp_alt[0][node]
-    sen_cds[:, node_idx, :] = np.tile(sen_loc_arr[node_idx][np.newaxis, :],
-                                      [len(selected_alternative_epochs[0]), 1])
+if static_geometry:
+    sen_cds = static_coords(
+        sen_loc_arr[:len(selected_nodes)].astype(int),
+        len(selected_alternative_epochs[0]))
+else:
+    sen_cds = np.zeros(
+        (len(selected_alternative_epochs[0]), len(selected_nodes), 2),
+        dtype=int)
+    for node_idx, node in enumerate(selected_nodes):
+        sen_cds[:, node_idx, :] = np.tile(
+            sen_loc_arr[node_idx][np.newaxis, :],
+            [len(selected_alternative_epochs[0]), 1])
 
 # %% Save pickle file
 custom_pval = pd.DataFrame(
@@ -44,8 +44,6 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import matplotlib.colors as colors
 
-from scipy.ndimage import uniform_filter1d
-
 import datetime
 
 import sys
@@ -56,17 +54,27 @@ from utilities.aux import (
     is_notebook, start_end_to_index_list_renewed, plot_evolution_raw_data,
     plot_evolution_pvals_fd, plot_evolution_lfdrs, plot_evolution_all_lfdrs,
     plot_evolution_rej, plot_evolution_all_rej,
-    plot_evolution_all_side_by_side, plot_av_det_prob)
+    plot_evolution_all_side_by_side, plot_evolution_av_det_prob,
+    plot_av_det_prob, get_hist_matrix, get_hist_frame)
 from utilities.physical_setup import (
     sen_loc_arr as sen_loc,
     anchor_loc_arr as imported_anchor_loc,
     get_experiment_parameters, get_event_start_end_times, get_ground_truth_crd,
     get_ground_truth_r)
 from utilities.parameters import get_par_smom, get_par_spa_var
+from utilities.smoothing import segment_moving_average
+from utilities.scheduling import run_dependent_jobs
+from utilities.interpolation import InterpolationPlan, ipl_lfdrs
+from utilities.geometry import to_static_coords
+from utilities.detection import (
+    apply_lfdr_detection, save_detection_results)
+from utilities.evaluation import evaluate_detections
+from utilities.report import PlotReport
+from utilities.aggregation import TimeAggregation
+from utilities.heatmap import DetectionCounts
 
 import spatialmht.field_handling as fd_hdl
 import spatialmht.lfdr_estimation as lfdr_est
-import spatialmht.detectors as det
 import spatialmht.analysis as anal
 
 # %% setup: things needed for VSCode
@@ -93,12 +101,22 @@ null_sfx = ''  # a suffix that can be used to discriminate between different
 #                      depending on when the experiment was terminated.
 
 # simulation parameters
+parallel_estimation = True # If true, the lfdr estimators are run concurrently
+# in a process pool. Set to False to run them one after another.
 use_anchors = True # If true, lfdr =1 in places where we know that null is true
 # Should always be true.
 ma_filter_len = 3 # number of epochs across which moving average filter is
 # applied to lfdrs. 3 works well usually (when one epoch is 6 seconds long).
 # reasoning: a person cannot just spawn or disappear -> moving average filter
 # adjusts lfdr to spatio-temporally smooth nature of observed phenomenon
+ma_edge_mode = 'nearest' # how the moving average treats the first epochs
+# after a sensor (re-)appears. 'nearest' repeats the first available value,
+# 'shrink' averages only available values, 'nan' gives no result until a full
+# window of data is available.
+save_det_res = True # If true, the detection results of all methods are stored
+# (bit-packed) in the results directory as det_res.pkl
+save_pval_hist = False # If true, the p-value histogram of every epoch is
+# stored in the results directory as pval_hist.csv (one column per bin)
 
 # Specify here all nominal FDR levels that results shall be computed for!
 alp_vec = np.array([0.01, 0.02, 0.05, 0.07, 0.10, 0.15, 0.2, .25, .3])
@@ -107,6 +125,25 @@ alp_vec = np.array([0.01, 0.02, 0.05, 0.07, 0.10, 0.15, 0.2, .25, .3])
 show_alp_val = 0.1 # showing the detection maps for this target FDR level
 
 figsize = (12.5, 7.5)
+headless_report = False # If true, none of the selected plots is shown.
+# Instead, their frames are rendered to png files in the subdirectory report of
+# the results directory, spread over a process pool. Needs no display.
+report_all_alp = False # If true, the headless report contains the rejection
+# plots for all nominal FDR levels in alp_vec, not only for show_alp_val.
+report_video = False # If true, the headless report contains the evolution
+# plots as videos (mp4 if ffmpeg is installed, gif otherwise) instead of frames.
+report_fps = 2 # The frames per second in the report videos.
+multi_panel = False # If true, the plots comparing all methods show them as
+# panels of one figure instead of one figure per method.
+time_agg_len = 1 # Number of consecutive epochs shown as one frame in the
+# evolution plots. Larger values make overview animations of long events
+# feasible. 1 shows every epoch.
+time_agg_mode = 'step' # 'step' shows every time_agg_len-th epoch. 'mean',
+# 'max' or 'min' aggregate the lfdrs and p-values over the time_agg_len epochs,
+# and show a discovery (or other detection category) if it occurred in the
+# majority of ('mean'), in any of ('max') or in all of ('min') them.
+av_det_win_len = 50 # Number of epochs per window in the sliding discovery
+# heatmaps. The window moves by time_agg_len epochs per frame.
  #%% setup: user input - which things to plot
 # lfdr plots
 plot_raw_data_evol = False
@@ -132,11 +169,17 @@ plot_all_sbs_evol = False
 plot_sen_evol_ma_vs_non_ma = False
 plot_evol_ma_vs_non_ma = False
 
+# discovery heatmaps over a sliding window
+plot_av_det_prob_evol = False
+
  # %% setup: automated initializations
 FD_SCEN = evaluate_event + null_sfx
 
 print("Running " + FD_SCEN)
 
+if headless_report:
+    plt.switch_backend('Agg')
+
 FIELD_MODE = "custom"  # Do not change. Has to be custom to process real-world
 # data. 
 SEN_CFG = FIELD_MODE  # Do not change this.
@@ -181,6 +224,10 @@ time_idx_vec = time_idx_vec[0]
 # load the field
 stored_fd_info = pd.read_pickle(os.path.join(dat_path, '..', FD_SCEN + '.pkl'))
 fd, est_fd = fd_hdl.rd_in_fds(FD_SCEN, SEN_CFG, dat_path)
+# the sensors don't move. Pickles from before static geometry was supported
+# hold one copy of the coordinates per epoch, replace them by a view.
+fd.sen_cds = to_static_coords(fd.sen_cds)
+est_fd.sen_cds = to_static_coords(est_fd.sen_cds)
 fully_loaded = fd.n == est_fd.n
 
 all_node_names = []
@@ -219,75 +266,56 @@ get_par_smom(dat_path)
 # for clfdrs)
 get_par_spa_var(dat_path)
 
-# load lfdrs at sensors and interpolated lfdrs
+# estimate lfdrs at sensors. lfdr-sMoM and lfdr-sMoM-EM are independent of
+# each other and run concurrently, each clfdr variant starts as soon as the
+# lfdrs it builds on are available.
+lfdr_jobs = {
+    'smom': (lfdr_est.est_lfdrs, (
+        est_fd, res_path, True, "smom", [dat_path, 50, 'stan', None, 1]), []),
+    'smom-em': (lfdr_est.est_lfdrs, (
+        est_fd, res_path, True, "smom-em", [50, 1e-5]), []),
+    # spatially varying prior without EM
+    'smom-sls': (lfdr_est.est_clfdrs, (
+        est_fd, res_path, True, "smom-sls",
+        [dat_path, 50, 'stan', 'smom-sen']), ['smom']),
+    'smom-sns': (lfdr_est.est_clfdrs, (
+        est_fd, res_path, True, "smom-sns",
+        [dat_path, 50, 'stan', 'smom-sen']), ['smom']),
+    # spatially varying prior with EM
+    'smom-em-sls': (lfdr_est.est_clfdrs, (
+        est_fd, res_path, True, "smom-sls",
+        [dat_path, 50, 'stan', 'smom-em-sen']), ['smom-em']),
+    'smom-em-sns': (lfdr_est.est_clfdrs, (
+        est_fd, res_path, True, "smom-sns",
+        [dat_path, 50, 'stan', 'smom-em-sen']), ['smom-em'])}
+if parallel_estimation:
+    lfdr_res = run_dependent_jobs(lfdr_jobs)
+else:
+    lfdr_res = run_dependent_jobs(lfdr_jobs, max_wrk=1)
+
 [lfdrs_sen_smom, f_p_sen_smom, f1_p_sen_smom, pi0_sen_smom,
-ex_time_sen_smom] = (lfdr_est.est_lfdrs(
-    est_fd, res_path, True, "smom",
-    [dat_path, 50, 'stan', None, 1]))
-
-lfdrs_ipl_smom = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-sen',
-    np.concatenate(
-        [lfdrs_sen_smom, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
-
-# EM
+ ex_time_sen_smom] = lfdr_res['smom']
 [lfdrs_sen_smom_em, f_p_sen_smom_em, f1_p_sen_smom_em, pi0_sen_smom_em,
-    ex_time_sen_smom_em] = (lfdr_est.est_lfdrs(
-        est_fd, res_path, True, "smom-em",
-        [50, 1e-5]))
-lfdrs_ipl_smom_em = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-em-sen',
-    np.concatenate(
-        [lfdrs_sen_smom_em, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
-
-# spatially varying prior without EM
-[clfdrs_sen_smom_sls, pi0_sen_smom_sls] = (lfdr_est.est_clfdrs(
-    est_fd, res_path, True, "smom-sls",
-    [dat_path, 50, 'stan', 'smom-sen']))
-[clfdrs_sen_smom_sns, pi0_sen_smom_sns] = (lfdr_est.est_clfdrs(
-    est_fd, res_path, True, "smom-sns",
-    [dat_path, 50, 'stan', 'smom-sen']))
-clfdrs_ipl_smom_sls = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-sen-sls',
-    np.concatenate(
-        [clfdrs_sen_smom_sls, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
-clfdrs_ipl_smom_sns = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-sen-sns',
-        np.concatenate(
-        [clfdrs_sen_smom_sns, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
-# spatially varying prior with EM
-[clfdrs_sen_smom_em_sls, pi0_sen_smom_em_sls] = (lfdr_est.est_clfdrs(
-    est_fd, res_path, True, "smom-sls",
-    [dat_path, 50, 'stan', 'smom-em-sen']))
-[clfdrs_sen_smom_em_sns, pi0_sen_smom_em_sns] = (lfdr_est.est_clfdrs(
-    est_fd, res_path, True, "smom-sns",
-    [dat_path, 50, 'stan', 'smom-em-sen']))
-clfdrs_ipl_smom_em_sls = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-em-sen-sls',
-    np.concatenate(
-        [clfdrs_sen_smom_em_sls, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
-clfdrs_ipl_smom_em_sns = lfdr_est.ipl_lfdrs(
-    res_path, 'smom-em-sen-sns',
-    np.concatenate(
-        [clfdrs_sen_smom_em_sns, np.ones((fd.n_MC, len(anchor_loc)))], axis=1),
-    np.concatenate([est_fd.sen_cds,
-        np.tile(anchor_loc[np.newaxis, :, :], [fd.n_MC, 1, 1])], axis=1),
-    est_fd.dim, fd.n)
+ ex_time_sen_smom_em] = lfdr_res['smom-em']
+[clfdrs_sen_smom_sls, pi0_sen_smom_sls] = lfdr_res['smom-sls']
+[clfdrs_sen_smom_sns, pi0_sen_smom_sns] = lfdr_res['smom-sns']
+[clfdrs_sen_smom_em_sls, pi0_sen_smom_em_sls] = lfdr_res['smom-em-sls']
+[clfdrs_sen_smom_em_sns, pi0_sen_smom_em_sns] = lfdr_res['smom-em-sns']
+
+# interpolate lfdrs. Sensors and anchors don't move, so the interpolation
+# weights are set up once and shared by all methods.
+ipl_plan = InterpolationPlan(est_fd.sen_cds[0], anchor_loc, est_fd.dim)
+lfdrs_ipl_smom = ipl_lfdrs(ipl_plan, res_path, 'smom-sen', lfdrs_sen_smom)
+lfdrs_ipl_smom_em = ipl_lfdrs(
+    ipl_plan, res_path, 'smom-em-sen', lfdrs_sen_smom_em)
+clfdrs_ipl_smom_sls = ipl_lfdrs(
+    ipl_plan, res_path, 'smom-sen-sls', clfdrs_sen_smom_sls)
+clfdrs_ipl_smom_sns = ipl_lfdrs(
+    ipl_plan, res_path, 'smom-sen-sns', clfdrs_sen_smom_sns)
+clfdrs_ipl_smom_em_sls = ipl_lfdrs(
+    ipl_plan, res_path, 'smom-em-sen-sls', clfdrs_sen_smom_em_sls)
+clfdrs_ipl_smom_em_sns = ipl_lfdrs(
+    ipl_plan, res_path, 'smom-em-sen-sns', clfdrs_sen_smom_em_sns)
 
 # %% apply moving average filter to sensor lfdrs and interpolated lfdrs
 # concatenate all different typoes of sensor lfdrs in one list
@@ -299,88 +327,57 @@ all_lfdrs_sen = [
 all_lfdrs_ipl = [
     lfdrs_ipl_smom, lfdrs_ipl_smom_em, clfdrs_ipl_smom_sls,
     clfdrs_ipl_smom_sns, clfdrs_ipl_smom_em_sls, clfdrs_ipl_smom_em_sns]
-# apply moving average filter
-all_lfdrs_sen_ma = []
-
-for lfdrs, name in zip(all_lfdrs_sen, met_names):
-    all_lfdrs_sen_ma_this_node = np.zeros((fd.n_MC, num_nodes)) + np.nan
-    for sen_idx in np.arange(num_nodes):
-        nan_borders = np.concatenate([
-            np.array([-1]), np.where(np.isnan(lfdrs[:, sen_idx]))[0],
-            np.array([fd.n_MC])])
-        for border_idx in np.arange(0, len(nan_borders)-1):
-            try:
-                all_lfdrs_sen_ma_this_node[nan_borders[
-                    border_idx]+1:nan_borders[border_idx+1], sen_idx] = (
-                        uniform_filter1d(
-                            lfdrs[nan_borders[border_idx]+1:nan_borders[
-                                border_idx+1], sen_idx], size=ma_filter_len,
-                                origin=int(ma_filter_len/2), mode='nearest',
-                                axis=0))
-            except ValueError:
-                all_lfdrs_sen_ma_this_node[nan_borders[
-                    border_idx]+1:nan_borders[border_idx+1], sen_idx] = (
-                        uniform_filter1d(
-                            lfdrs[nan_borders[border_idx]+1:nan_borders[
-                                border_idx+1], sen_idx], size=ma_filter_len,
-                                origin=int(ma_filter_len/2)-1, mode='nearest',
-                                axis=0))
-    all_lfdrs_sen_ma.append(all_lfdrs_sen_ma_this_node)
-
-all_lfdrs_ipl_ma = []
-try:
-    for lfdrs, name in zip(all_lfdrs_ipl, met_names):
-        all_lfdrs_ipl_ma.append(uniform_filter1d(
-            lfdrs, size=ma_filter_len, origin=int(ma_filter_len/2),
-            mode='nearest', axis=0))
-except:
-    for lfdrs, name in zip(all_lfdrs_ipl, met_names):
-        all_lfdrs_ipl_ma.append(uniform_filter1d(
-            lfdrs, size=ma_filter_len, origin=int(ma_filter_len/2)-1,
-            mode='nearest', axis=0))
+# apply moving average filter. The filter restarts wherever a sensor has no
+# data (NaN), so that lfdrs are never averaged across gaps.
+all_lfdrs_sen_ma = [
+    segment_moving_average(lfdrs, ma_filter_len, mode=ma_edge_mode)
+    for lfdrs in all_lfdrs_sen]
+all_lfdrs_ipl_ma = [
+    segment_moving_average(lfdrs, ma_filter_len, mode=ma_edge_mode)
+    for lfdrs in all_lfdrs_ipl]
 
 # %% create the detection results
 # lfdrs and interpolated lfdrs
-det_res_sen_smom = det.apply_lfdr_detection(
+det_res_sen_smom = apply_lfdr_detection(
     lfdrs_sen_smom, est_fd.r_tru, alp_vec, 'lfdr-sMoM at sensors',
     sen=True)
-det_res_ipl_smom = det.apply_lfdr_detection(
+det_res_ipl_smom = apply_lfdr_detection(
     lfdrs_ipl_smom, fd.r_tru, alp_vec, 'lfdr-sMoM at all grid points',
     sen=False)
 
 # em
-det_res_sen_smom_em = det.apply_lfdr_detection(
+det_res_sen_smom_em = apply_lfdr_detection(
     lfdrs_sen_smom_em, est_fd.r_tru, alp_vec, 'lfdr-sMoM-EM at sensors',
     sen=True)
-det_res_ipl_smom_em = det.apply_lfdr_detection(
+det_res_ipl_smom_em = apply_lfdr_detection(
     lfdrs_ipl_smom_em, fd.r_tru, alp_vec,
     'lfdr-sMoM-EM at all grid points', sen=False)
 
 # spatially varying prior
-det_res_sen_smom_sls = det.apply_lfdr_detection(
+det_res_sen_smom_sls = apply_lfdr_detection(
     clfdrs_sen_smom_sls, est_fd.r_tru, alp_vec,
     'clfdr-sMoM-SLS at sensors', sen=True)
-det_res_sen_smom_sns = det.apply_lfdr_detection(
+det_res_sen_smom_sns = apply_lfdr_detection(
     clfdrs_sen_smom_sns, est_fd.r_tru, alp_vec,
     'clfdr-sMoM-SNS at sensors', sen=True)
-det_res_ipl_smom_sls = det.apply_lfdr_detection(
+det_res_ipl_smom_sls = apply_lfdr_detection(
     clfdrs_ipl_smom_sls, fd.r_tru, alp_vec,
     'clfdr-sMoM-SLS at all grid points', sen=False)
-det_res_ipl_smom_sns = det.apply_lfdr_detection(
+det_res_ipl_smom_sns = apply_lfdr_detection(
     clfdrs_ipl_smom_sns, fd.r_tru, alp_vec,
     'clfdr-sMoM-SNS at all grid points', sen=False)
 
 # spatially varying prior with EM
-det_res_sen_smom_em_sls = det.apply_lfdr_detection(
+det_res_sen_smom_em_sls = apply_lfdr_detection(
     clfdrs_sen_smom_em_sls, est_fd.r_tru, alp_vec,
     'clfdr-sMoM-EM-SLS at sensors', sen=True)
-det_res_sen_smom_em_sns = det.apply_lfdr_detection(
+det_res_sen_smom_em_sns = apply_lfdr_detection(
     clfdrs_sen_smom_em_sns, est_fd.r_tru, alp_vec,
     'clfdr-sMoM-EM-SNS at sensors', sen=True)
-det_res_ipl_smom_em_sls = det.apply_lfdr_detection(
+det_res_ipl_smom_em_sls = apply_lfdr_detection(
     clfdrs_ipl_smom_em_sls, fd.r_tru, alp_vec,
     'clfdr-sMoM-EM-SLS at all grid points', sen=False)
-det_res_ipl_smom_em_sns = det.apply_lfdr_detection(
+det_res_ipl_smom_em_sns = apply_lfdr_detection(
     clfdrs_ipl_smom_em_sns, fd.r_tru, alp_vec,
     'clfdr-sMoM-EM-SNS at all grid points', sen=False)
 
@@ -397,138 +394,192 @@ all_res_sen_ma = []
 all_res_ipl_ma = []
 for lfdrs_sen, lfdrs_ipl, name in zip(
     all_lfdrs_sen_ma, all_lfdrs_ipl_ma, met_names):
-    all_res_sen_ma.append(det.apply_lfdr_detection(
+    all_res_sen_ma.append(apply_lfdr_detection(
         lfdrs_sen, est_fd.r_tru, alp_vec, name + 'at sensors',
         sen=True))
-    all_res_ipl_ma.append(det.apply_lfdr_detection(
+    all_res_ipl_ma.append(apply_lfdr_detection(
         lfdrs_ipl, fd.r_tru, alp_vec, name + 'at all grid point',
         sen=True))
 
+if save_det_res:
+    save_detection_results(os.path.join(res_path, 'det_res.pkl'), {
+        "met_names": met_names, "alp_vec": alp_vec, "sen": all_res_sen,
+        "ipl": all_res_ipl, "sen_ma": all_res_sen_ma,
+        "ipl_ma": all_res_ipl_ma})
+if save_pval_hist:
+    get_hist_frame(get_hist_matrix(fd.p), time_idx_vec).to_csv(
+        os.path.join(res_path, 'pval_hist.csv'))
+
 # %% Evolution plots: raw data, p-values and lfdrs
-if plot_raw_data_evol and not is_notebook():
-     plot_evolution_raw_data(data_directory, event_start_end_times[0],
-                            event_start_end_times[1], start_glob_time_at,
-                            tsEpochDuration, sen_loc_arr[0],
-                            evaluate_event, click=True, which_data="humid",
-                            time_between_updates=int(tsEpochDuration/1000),
-                            dim=dim)
-if plot_pval_evol and not is_notebook():
-    plot_evolution_pvals_fd(fd, time_idx_vec, start_glob_time_at, tsEpochDuration,
-                            sen_loc_arr[0], click=True,
-                            time_between_updates=int(tsEpochDuration/1000))
-
-if plot_lfdr_sen_evol and not is_notebook():
+# in headless report mode, plots are collected and rendered to files at the end
+report = PlotReport(os.path.join(res_path, 'report'), headless=headless_report,
+                    video=report_video, fps=report_fps)
+show_plots = headless_report or not is_notebook()
+if time_agg_len > 1:
+    time_agg = TimeAggregation(time_agg_len, mode=time_agg_mode)
+else:
+    time_agg = None
+if headless_report and report_all_alp:
+    plot_alp_vec_idc = np.arange(alp_vec.size)
+else:
+    plot_alp_vec_idc = [show_alp_vec_idx]
+
+if plot_raw_data_evol and show_plots:
+    report.plot('raw_data', plot_evolution_raw_data, data_directory,
+                event_start_end_times[0], event_start_end_times[1],
+                start_glob_time_at, tsEpochDuration, sen_loc_arr[0],
+                evaluate_event, click=True, which_data="humid",
+                time_between_updates=int(tsEpochDuration/1000), dim=dim,
+                time_agg=time_agg)
+if plot_pval_evol and show_plots:
+    report.plot('pvals', plot_evolution_pvals_fd, fd, time_idx_vec,
+                start_glob_time_at, tsEpochDuration, sen_loc_arr[0],
+                click=True, time_between_updates=int(tsEpochDuration/1000),
+                time_agg=time_agg)
+
+if plot_lfdr_sen_evol and show_plots:
     for sensor_lfdr, name in zip(all_lfdrs_sen, met_names):
-        plot_evolution_lfdrs(
+        report.plot(
+            'lfdrs_sen_' + name, plot_evolution_lfdrs,
             sensor_lfdr, fd.dim, time_idx_vec, start_glob_time_at,
             tsEpochDuration, fd.sen_cds[0, :].astype(int), name,
             anchor_cds=anchor_loc, click=True, sen_only=True,
-            time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+            time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+            time_agg=time_agg)
 
-if plot_lfdr_evol and not is_notebook():
+if plot_lfdr_evol and show_plots:
     for sensor_lfdr, name in zip(all_lfdrs_ipl, met_names):
-        plot_evolution_lfdrs(
+        report.plot(
+            'lfdrs_ipl_' + name, plot_evolution_lfdrs,
             sensor_lfdr, fd.dim, time_idx_vec, start_glob_time_at,
             tsEpochDuration, fd.sen_cds[0, :].astype(int), name,
             anchor_cds=anchor_loc, click=True, sen_only=False,
-            time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+            time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+            time_agg=time_agg)
         
-if plot_all_lfdr_sen_evol and not is_notebook():
-    plot_evolution_all_lfdrs(
+if plot_all_lfdr_sen_evol and show_plots:
+    report.plot(
+        'all_lfdrs_sen', plot_evolution_all_lfdrs,
         all_lfdrs_sen, fd.dim, time_idx_vec, start_glob_time_at,
         tsEpochDuration, fd.sen_cds[0, :].astype(int), met_names,
         anchor_cds=anchor_loc, click=True, sen_only=True,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg, multi_panel=multi_panel)
 
-if plot_all_lfdr_evol and not is_notebook():
-    plot_evolution_all_lfdrs(
+if plot_all_lfdr_evol and show_plots:
+    report.plot(
+        'all_lfdrs_ipl', plot_evolution_all_lfdrs,
         all_lfdrs_ipl, fd.dim, time_idx_vec, start_glob_time_at,
         tsEpochDuration, fd.sen_cds[0, :].astype(int), met_names,
         anchor_cds=anchor_loc, click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg, multi_panel=multi_panel)
 
 # %% Evolution plots: Detection results
-if plot_sen_rej_evol and not is_notebook():
+if plot_sen_rej_evol and show_plots:
     for det_res, name in zip(all_res_sen, met_names):
-        plot_evolution_rej(det_res[show_alp_vec_idx], fd.dim, time_idx_vec,
-                           start_glob_time_at, tsEpochDuration, sen_loc_arr[0],
-                           name, anchor_cds=anchor_loc,
-                           sen_only=True, click=True)
-
-if plot_rej_evol and not is_notebook():
+        for alp_idx in plot_alp_vec_idc:
+            report.plot(
+                'rej_sen_{}_alp{}'.format(name, alp_vec[alp_idx]),
+                plot_evolution_rej, det_res[alp_idx], fd.dim, time_idx_vec,
+                start_glob_time_at, tsEpochDuration, sen_loc_arr[0], name,
+                anchor_cds=anchor_loc, sen_only=True, click=True,
+                time_agg=time_agg)
+
+if plot_rej_evol and show_plots:
     for det_res, name in zip(all_res_ipl, met_names):
-        plot_evolution_rej(det_res[show_alp_vec_idx], fd.dim, time_idx_vec,
-                           start_glob_time_at, tsEpochDuration, sen_loc_arr[0],
-                           name, anchor_cds=anchor_loc,
-                           sen_only=False, click=True)
-
-if plot_all_sen_rej_evol and not is_notebook():
-    all_res_sen_sel = [x[show_alp_vec_idx] for x in all_res_sen]
-    plot_evolution_all_rej(
-        all_res_sen_sel, fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
-        fd.sen_cds[0, :].astype(int), met_names,
-        anchor_cds=anchor_loc, click=True,
-        sen_only=True, time_between_updates=int(tsEpochDuration/1000),
-        figsize=figsize)
-
-if plot_all_rej_evol and not is_notebook():
-    all_res_sel = [x[show_alp_vec_idx] for x in all_res_ipl]
-    plot_evolution_all_rej(
-        all_res_sel, fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
-        fd.sen_cds[0, :].astype(int), met_names,
-        anchor_cds=anchor_loc, click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        for alp_idx in plot_alp_vec_idc:
+            report.plot(
+                'rej_ipl_{}_alp{}'.format(name, alp_vec[alp_idx]),
+                plot_evolution_rej, det_res[alp_idx], fd.dim, time_idx_vec,
+                start_glob_time_at, tsEpochDuration, sen_loc_arr[0], name,
+                anchor_cds=anchor_loc, sen_only=False, click=True,
+                time_agg=time_agg)
+
+if plot_all_sen_rej_evol and show_plots:
+    for alp_idx in plot_alp_vec_idc:
+        all_res_sen_sel = [x[alp_idx] for x in all_res_sen]
+        report.plot(
+            'all_rej_sen_alp{}'.format(alp_vec[alp_idx]),
+            plot_evolution_all_rej, all_res_sen_sel, fd.dim, time_idx_vec,
+            start_glob_time_at, tsEpochDuration,
+            fd.sen_cds[0, :].astype(int), met_names,
+            anchor_cds=anchor_loc, click=True,
+            sen_only=True, time_between_updates=int(tsEpochDuration/1000),
+            figsize=figsize, time_agg=time_agg, multi_panel=multi_panel)
+
+if plot_all_rej_evol and show_plots:
+    for alp_idx in plot_alp_vec_idc:
+        all_res_sel = [x[alp_idx] for x in all_res_ipl]
+        report.plot(
+            'all_rej_ipl_alp{}'.format(alp_vec[alp_idx]),
+            plot_evolution_all_rej, all_res_sel, fd.dim, time_idx_vec,
+            start_glob_time_at, tsEpochDuration,
+            fd.sen_cds[0, :].astype(int), met_names,
+            anchor_cds=anchor_loc, click=True, sen_only=False,
+            time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+            time_agg=time_agg, multi_panel=multi_panel)
 # %% side by side test
-if plot_all_sbs_evol and not is_notebook():
+if plot_all_sbs_evol and show_plots:
     all_res_sel = [x[show_alp_vec_idx] for x in all_res_ipl]
-    plot_evolution_all_side_by_side(all_res_sel, all_lfdrs_ipl,
+    report.plot('all_sbs_ipl', plot_evolution_all_side_by_side,
+        all_res_sel, all_lfdrs_ipl,
         fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), met_names,
         anchor_cds=anchor_loc, click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg)
 
 # %% Plot all moving average results side-by-side
 ma_met_names = [x + " ma" for x in met_names]
-if plot_all_sen_sbs_evol and not is_notebook():
+if plot_all_sen_sbs_evol and show_plots:
     all_res_sel = [x[show_alp_vec_idx] for x in all_res_sen_ma]
-    plot_evolution_all_side_by_side(all_res_sel, all_lfdrs_sen_ma,
+    report.plot('all_sbs_sen_ma', plot_evolution_all_side_by_side,
+        all_res_sel, all_lfdrs_sen_ma,
         fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), ma_met_names,
         anchor_cds=anchor_loc, click=True, sen_only=True,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg)
 
-if plot_all_sbs_evol and not is_notebook():
+if plot_all_sbs_evol and show_plots:
     all_res_sel = [x[show_alp_vec_idx] for x in all_res_ipl_ma]
-    plot_evolution_all_side_by_side(all_res_sel, all_lfdrs_ipl_ma,
+    report.plot('all_sbs_ipl_ma', plot_evolution_all_side_by_side,
+        all_res_sel, all_lfdrs_ipl_ma,
         fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), ma_met_names, anchor_cds=anchor_loc,
         click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg)
 
 # %% Plot moving average ipl lfdrs
 # select method of choice
 all_lfdrs_sel = [all_lfdrs_ipl_ma[4]]
 met_names_this_plt = ['smom-em-sls-ma']
 
-if plot_lfdr_evol_ma and not is_notebook():
-    plot_evolution_all_lfdrs(
+if plot_lfdr_evol_ma and show_plots:
+    report.plot(
+        'lfdrs_ipl_ma', plot_evolution_all_lfdrs,
         all_lfdrs_sel, fd.dim, time_idx_vec, start_glob_time_at,
         tsEpochDuration,
         fd.sen_cds[0, :].astype(int), met_names_this_plt, anchor_cds=anchor_loc,
         click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg, multi_panel=multi_panel)
 
 # %% Plot moving average ipl rej
 # select method of choice
 all_res_sel = [all_res_ipl_ma[4][show_alp_vec_idx]]
 met_names_this_plt = ['smom-em-sls-ma']
 
-if plot_rej_evol_ma and not is_notebook():
-    plot_evolution_all_rej(
+if plot_rej_evol_ma and show_plots:
+    report.plot(
+        'rej_ipl_ma', plot_evolution_all_rej,
         all_res_sel, fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), met_names,
         anchor_cds=anchor_loc, click=True, sen_only=False,
-        time_between_updates=int(tsEpochDuration/1000), figsize=figsize)
+        time_between_updates=int(tsEpochDuration/1000), figsize=figsize,
+        time_agg=time_agg, multi_panel=multi_panel)
 # %% Plot moving average vs non-moving average sen side by side for smom-em-sls
 # and standard smom-em (without clfdr)
 all_res_sel = [all_res_sen[1][show_alp_vec_idx],
@@ -537,15 +588,16 @@ all_res_sel = [all_res_sen[1][show_alp_vec_idx],
                 all_res_sen_ma[4][show_alp_vec_idx]]
 all_lfdrs_sel = [all_lfdrs_sen[1], all_lfdrs_sen[4], all_lfdrs_sen_ma[1],
                     all_lfdrs_sen_ma[4]]
-if plot_sen_evol_ma_vs_non_ma and not is_notebook():
+if plot_sen_evol_ma_vs_non_ma and show_plots:
     met_names_this_plt = [
         'smom-em', 'smom-em-sls', 'smom-em-ma', 'smom-em-sls-ma']
-    plot_evolution_all_side_by_side(all_res_sel, all_lfdrs_sel,
+    report.plot('sbs_sen_ma_vs_non_ma', plot_evolution_all_side_by_side,
+        all_res_sel, all_lfdrs_sel,
         fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), met_names_this_plt,
         anchor_cds=anchor_loc, click=True,
         sen_only=True, time_between_updates=int(tsEpochDuration/1000),
-        figsize=figsize)
+        figsize=figsize, time_agg=time_agg)
     
 # %% Plot moving average vs non-moving average ipl side by side for smom-em-sls
 # and standard smom-em (without clfdr)
@@ -556,13 +608,14 @@ all_res_sel = [all_res_ipl[1][show_alp_vec_idx],
 all_lfdrs_sel = [all_lfdrs_ipl[1], all_lfdrs_ipl[4], all_lfdrs_ipl_ma[1],
                     all_lfdrs_ipl_ma[4]]
 met_names_this_plt = ['smom-em', 'smom-em-sls', 'smom-em-ma', 'smom-em-sls-ma']
-if plot_evol_ma_vs_non_ma and not is_notebook():
-    plot_evolution_all_side_by_side(all_res_sel, all_lfdrs_sel,
+if plot_evol_ma_vs_non_ma and show_plots:
+    report.plot('sbs_ipl_ma_vs_non_ma', plot_evolution_all_side_by_side,
+        all_res_sel, all_lfdrs_sel,
         fd.dim, time_idx_vec, start_glob_time_at, tsEpochDuration,
         fd.sen_cds[0, :].astype(int), met_names_this_plt,
         anchor_cds=anchor_loc, click=True,
         sen_only=False, time_between_updates=int(tsEpochDuration/1000),
-        figsize=figsize)
+        figsize=figsize, time_agg=time_agg)
 
 # %% Compute "localization probability" and FDRs
 # localization probability: Percentage of epochs, in wich someone was detected
@@ -574,27 +627,31 @@ all_res_sel = [all_res_ipl[1][show_alp_vec_idx],
                all_res_ipl_ma[4][show_alp_vec_idx]]
 met_names_res = ['smom-em', 'smom-em-sls', 'smom-em-ma', 'smom-em-sls-ma']
 
+all_res_eval = [all_res_ipl[1], all_res_ipl[4], all_res_ipl_ma[1],
+                all_res_ipl_ma[4]]
+
 if experiment_name == 'eusipco' and evaluate_event == 'scenario_1':
-    br_detected = np.zeros((len(all_res_sel), len(mc_steady_idc_vec)))
-    tl_detected = np.zeros((len(all_res_sel), len(mc_steady_idc_vec)))
-    for idx, res in enumerate(all_res_sel):
-        for mc_idx, mc in enumerate(mc_steady_idc_vec):
-            br_detected[idx, mc_idx] = np.any(res.r_det[mc].reshape(dim)[
-                true_H1_crd_br[:, 1], true_H1_crd_br[:, 0]])
-            tl_detected[idx, mc_idx] = np.any(res.r_det[mc].reshape(dim)[
-                true_H1_crd_tl[:, 1], true_H1_crd_tl[:, 0]])
+    res_tab = evaluate_detections(
+        all_res_eval, met_names_res, alp_vec,
+        regions={'tl': true_H1_crd_tl, 'br': true_H1_crd_br}, dim=dim,
+        mc_idc=mc_steady_idc_vec)
+    show_tab = res_tab[res_tab["alpha"] == alp_vec[show_alp_vec_idx]]
+    for met_nam in met_names_res:
+        met_tab = show_tab[show_tab["method"] == met_nam].set_index("region")
         print("--------- Nominal FDR: {} | FDR/TL Loc prob".format(
             alp_vec[show_alp_vec_idx]) + "/BR loc prob---------")
-        print("{}: {:.2f} / {:.2f} / {:.2f} ".format(
-            met_names_res[idx], np.mean(res.fdp[mc_steady_idc_vec]),
-            np.mean(tl_detected[idx, :]), np.mean(br_detected[idx, :])))
+        print("{}: {:.2f} / {:.2f} / {:.2f} ".format(
+            met_nam, met_tab.loc["tl", "fdr"], met_tab.loc["tl", "loc_prob"],
+            met_tab.loc["br", "loc_prob"]))
         print("")
 elif evaluate_event == 'scenario_3' or 'bonus_example_null':
-    for idx, res in enumerate(all_res_sel):
+    res_tab = evaluate_detections(all_res_eval, met_names_res, alp_vec)
+    show_tab = res_tab[res_tab["alpha"] == alp_vec[show_alp_vec_idx]]
+    for met_nam, fdr in zip(show_tab["method"], show_tab["fdr"]):
         print("--------- Nominal FDR: {} | FDR  ---------".format(
             alp_vec[show_alp_vec_idx]))
-        print("{}: {:.2f}  ".format(met_names_res[idx], res.fdr))
-        print("")  
+        print("{}: {:.2f}  ".format(met_nam, fdr))
+        print("")
 # %% Show discovery heatmaps
 # can be used to detect "hot spots" where discoveries often take place
 # -> either for assessing match with ground truth or for finding a path!
@@ -620,7 +677,26 @@ elif experiment_name == 'bonus':
         end_av_time = event_start_end_times[1]
 # probably quite useful to illustrate a walking path
 
-plot_av_det_prob(
+# the discoveries are accumulated once, then any window is cheap
+all_det_counts_sel = [DetectionCounts(res.r_det) for res in all_res_sel]
+report.plot(
+    'av_det_prob', plot_av_det_prob,
     all_res_sel, dim, start_av_time, end_av_time, time_idx_vec,
     start_glob_time_at, tsEpochDuration, fd.sen_cds[0, :].astype(int),
-    met_names_res, anchor_cds=anchor_loc, figsize=figsize)
+    met_names_res, anchor_cds=anchor_loc, figsize=figsize,
+    det_counts_lst=all_det_counts_sel)
+if plot_av_det_prob_evol and show_plots:
+    for det_counts, nam in zip(all_det_counts_sel, met_names_res):
+        report.plot(
+            'av_det_prob_evol_{}'.format(nam), plot_evolution_av_det_prob,
+            det_counts, dim, time_idx_vec, av_det_win_len,
+            start_glob_time_at, tsEpochDuration,
+            fd.sen_cds[0, :].astype(int), nam, anchor_cds=anchor_loc,
+            click=True, time_between_updates=int(tsEpochDuration/1000),
+            step=time_agg_len, figsize=figsize)
+
+# %% Render the report
+if headless_report:
+    report_dirs = report.render()
+    print("Rendered {} plots to {}".format(
+        len(report_dirs), report.report_dir))
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Temporal aggregation of epochs for the evolution plots.
+
+Events that last for hours consist of thousands of epochs. For overview
+animations, the epochs are grouped into consecutive windows of k epochs and
+every window is shown as one frame, either by showing only the first epoch of
+each window or by reducing (mean, max, ...) over the window. The reduction is
+one vectorized pass over the whole p-value, lfdr or detection array before
+plotting.
+"""
+import warnings
+
+import numpy as np
+
+
+class TimeAggregation(object):
+    """How epochs are aggregated into the frames of an evolution plot."""
+
+    def __init__(self, k, mode='step'):
+        """Set up the aggregation.
+
+        Parameters
+        ----------
+        k : int
+            The number of consecutive epochs aggregated into one frame.
+        mode : str, optional
+            'step' shows the first epoch of every window, i.e., every k-th
+            epoch. 'mean', 'max' and 'min' reduce over the epochs of a window,
+            ignoring NaNs. For detections, a test is discovered (or truly
+            alternative) in a window if it is so in the majority of the epochs
+            ('mean'), in any epoch ('max' or 'any') or in all epochs ('min');
+            its detection category follows from both. By default 'step'.
+        """
+        if int(k) < 1:
+            raise ValueError("k must be a positive integer")
+        if mode not in ['step', 'mean', 'max', 'min', 'any']:
+            raise ValueError("Unknown aggregation mode {}".format(mode))
+        self.k = int(k)
+        self.mode = mode
+
+    def epochs(self, epochs_to_show):
+        """Return the epochs the frames are labeled with.
+
+        Parameters
+        ----------
+        epochs_to_show : numpy array
+            The epoch indexes before aggregation.
+
+        Returns
+        -------
+        numpy array
+            The first epoch of every window.
+        """
+        return np.asarray(epochs_to_show)[::self.k]
+
+    def _reduce(self, vals, func):
+        vals = np.asarray(vals, dtype=float)
+        n_win = -(-vals.shape[0] // self.k)
+        # the last window is padded with NaNs, which the reductions ignore
+        pad = np.zeros(
+            (n_win * self.k - vals.shape[0],) + vals.shape[1:]) + np.nan
+        win = np.concatenate([vals, pad]).reshape(
+            (n_win, self.k) + vals.shape[1:])
+        with warnings.catch_warnings():
+            # windows without any data give NaN
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return func(win, axis=1)
+
+    def values(self, vals):
+        """Aggregate values such as p-values or lfdrs.
+
+        Parameters
+        ----------
+        vals : numpy array
+            The values, with the epochs along the first axis.
+
+        Returns
+        -------
+        numpy array
+            The values of every window, NaN for windows without data. 'any'
+            is the same as 'max'.
+        """
+        if self.mode == 'step':
+            return np.asarray(vals)[::self.k]
+        func = {'mean': np.nanmean, 'max': np.nanmax, 'any': np.nanmax,
+                'min': np.nanmin}[self.mode]
+        return self._reduce(vals, func)
+
+    def indicators(self, ind):
+        """Aggregate 0/1 indicators, such as discoveries.
+
+        Parameters
+        ----------
+        ind : numpy array
+            The indicators (0, 1 or NaN), with the epochs along the first
+            axis.
+
+        Returns
+        -------
+        numpy array
+            The 0/1 indicators of every window, NaN for windows without data.
+        """
+        if self.mode == 'step':
+            return ind[::self.k]
+        agg = self.values(ind)
+        if self.mode == 'mean':
+            agg_ind = (agg >= .5) * 1.
+        elif self.mode == 'min':
+            agg_ind = (agg == 1) * 1.
+        else:
+            agg_ind = (agg > 0) * 1.
+        agg_ind[np.isnan(agg)] = np.nan
+        return agg_ind
+
+    def detection_result(self, det_res):
+        """Aggregate a detection result for the rejection plots.
+
+        Parameters
+        ----------
+        det_res : DetectionResult
+            The detection result.
+
+        Returns
+        -------
+        AggregatedDetectionResult
+            The discovery pattern and detection categories per window.
+        """
+        return AggregatedDetectionResult(det_res, self)
+
+
+class AggregatedDetectionResult(object):
+    """The parts of a detection result shown in the rejection plots, with
+    aggregated epochs."""
+
+    def __init__(self, det_res, time_agg):
+        """Aggregate the discovery pattern and the ground truth and derive the
+        detection categories from them.
+
+        Parameters
+        ----------
+        det_res : DetectionResult
+            The detection result.
+        time_agg : TimeAggregation
+            The aggregation.
+        """
+        self.nam = det_res.nam
+        self.tar = det_res.tar
+        self.thr = det_res.thr
+        self.sen = det_res.sen
+        self.r_det = time_agg.indicators(det_res.r_det)
+        self.r_tru = time_agg.indicators(det_res.r_tru)
+        # correct non-discoveries, correct, false and missed discoveries,
+        # derived from the aggregated discoveries and ground truth so that
+        # every test is in exactly one category (NaN where either is NaN)
+        self.u = (1 - self.r_det) * (1 - self.r_tru)
+        self.s = self.r_det * self.r_tru
+        self.v = self.r_det * (1 - self.r_tru)
+        self.t = (1 - self.r_det) * self.r_tru
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Animation core for the evolution plots.
+
+The artists that change from epoch to epoch (images, titles, legends, ...) are
+created once and registered with an EvolutionAnimation. Each frame, only these
+artists are updated and drawn on top of a cached background of the static
+parts of the figure (blitting), instead of redrawing the whole figure. The
+same core either shows the frames interactively, saves them to files or
+encodes them to videos.
+"""
+import os
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+
+class EvolutionAnimation(object):
+    """Draws the frames of an evolution plot with blitting.
+
+    Usage: create the figures with all static content, register every artist
+    that changes over time with add_artist (and the artists drawn on top of
+    them with add_overlays), call start, and then, for each epoch, update the
+    registered artists (e.g., with set_data or set_text) and call next_frame.
+    The frames to be drawn are given by the frames method.
+    """
+
+    def __init__(self, fig_lst, epochs_to_show, click=False,
+                 time_between_updates=.5, save_dir=None, file_prefix='frame',
+                 video=None):
+        """Set up the animation.
+
+        Parameters
+        ----------
+        fig_lst : list
+            The figures of the evolution plot.
+        epochs_to_show : numpy array
+            The epoch indexes to be plotted.
+        click : bool, optional
+            If advancing to next epoch by clicking a key is desired, by
+            default False.
+        time_between_updates : float, optional
+            When click is false, this time dictates how long it takes to the
+            next transission, by default .5.
+        save_dir : str, optional
+            If given, nothing is shown and no input is waited for. Instead,
+            every frame of every figure is saved as png file to this
+            directory, by default None.
+        file_prefix : str, optional
+            The beginning of the file names of the saved frames, by default
+            'frame'.
+        video : VideoExport, optional
+            If given, nothing is shown and no input is waited for. Instead,
+            the frames of the chunk of epochs specified by video are encoded
+            to one video per figure, by default None.
+        """
+        self.fig_lst = list(fig_lst)
+        self.epochs_to_show = epochs_to_show
+        self.click = click
+        self.time_between_updates = time_between_updates
+        self.save_dir = save_dir
+        self.file_prefix = file_prefix
+        self.video = video
+        self._writers = [None for _ in self.fig_lst]
+        # backends that cannot blit fall back to redrawing the full figure
+        self.blit = all(fig.canvas.supports_blit for fig in self.fig_lst)
+        self._artists = [[] for _ in self.fig_lst]
+        self._bg = [None for _ in self.fig_lst]
+        self._cids = []
+
+    def _fig_idx(self, fig):
+        for idx, this_fig in enumerate(self.fig_lst):
+            if this_fig is fig:
+                return idx
+        raise ValueError("Figure is not part of this animation")
+
+    def add_artist(self, fig, artist):
+        """Register an artist that changes over time.
+
+        Parameters
+        ----------
+        fig : matplotlib Figure
+            The figure the artist belongs to.
+        artist : matplotlib Artist
+            The artist, e.g., an image, a text or an entire Axes.
+
+        Returns
+        -------
+        matplotlib Artist
+            The registered artist.
+        """
+        artist.set_animated(self.blit)
+        self._artists[self._fig_idx(fig)].append(artist)
+        return artist
+
+    def remove_artist(self, fig, artist):
+        """Unregister an artist, e.g., before removing it from the figure.
+
+        Parameters
+        ----------
+        fig : matplotlib Figure
+            The figure the artist belongs to.
+        artist : matplotlib Artist
+            The artist.
+        """
+        art_lst = self._artists[self._fig_idx(fig)]
+        art_lst[:] = [art for art in art_lst if art is not artist]
+
+    def add_overlays(self, ax):
+        """Register everything drawn on top of the images of an Axes, i.e.,
+        patches (sensor outlines), collections, lines, texts, the legend and
+        the spines (the Axes frame).
+
+        Parameters
+        ----------
+        ax : matplotlib Axes
+            The Axes.
+        """
+        fig = ax.get_figure()
+        for art in (list(ax.patches) + list(ax.collections) + list(ax.lines)
+                    + list(ax.texts) + list(ax.spines.values())):
+            self.add_artist(fig, art)
+        if ax.get_legend() is not None:
+            self.add_artist(fig, ax.get_legend())
+
+    def add_title(self, fig, text=''):
+        """Register the figure title (suptitle) as changing over time.
+
+        Parameters
+        ----------
+        fig : matplotlib Figure
+            The figure.
+        text : str, optional
+            The initial title, by default ''.
+
+        Returns
+        -------
+        matplotlib Text
+            The title, to be updated with set_text.
+        """
+        return self.add_artist(fig, fig.suptitle(text))
+
+    @property
+    def interactive(self):
+        """True if the frames are shown, False if they are written to files.
+        """
+        return self.save_dir is None and self.video is None
+
+    def frames(self):
+        """Iterate over the frames to be drawn.
+
+        Yields
+        ------
+        tuple
+            The index of the frame (iteration) and the epoch shown in it. In
+            video mode, only the frames of the chunk to be encoded.
+        """
+        if self.video is None:
+            it_vec = np.arange(len(self.epochs_to_show))
+        else:
+            it_vec = self.video.get_chunk_frames(len(self.epochs_to_show))
+        for it in it_vec:
+            yield it, self.epochs_to_show[it]
+
+    def start(self):
+        """Draw the static parts of all figures and show them."""
+        for fig in self.fig_lst:
+            self._cids.append(
+                (fig, fig.canvas.mpl_connect('draw_event', self._on_draw)))
+            fig.canvas.draw()
+        if self.save_dir is not None:
+            os.makedirs(self.save_dir, exist_ok=True)
+        elif self.interactive:
+            if self.click:
+                print("Press any key for advancing to next epochs!")
+            plt.pause(1)
+
+    def stop(self):
+        """Disconnect from the figures and finish the videos."""
+        for fig, cid in self._cids:
+            fig.canvas.mpl_disconnect(cid)
+        self._cids = []
+        for fig_idx, writer in enumerate(self._writers):
+            if writer is not None:
+                writer.close()
+            self._writers[fig_idx] = None
+
+    def _on_draw(self, event):
+        # a full draw (initial or e.g. after resizing) renders everything but
+        # the animated artists: cache it as background, then add them
+        fig_idx = self._fig_idx(event.canvas.figure)
+        if self.blit:
+            self._bg[fig_idx] = event.canvas.copy_from_bbox(
+                event.canvas.figure.bbox)
+            self._draw_animated(fig_idx)
+
+    def _draw_animated(self, fig_idx):
+        fig = self.fig_lst[fig_idx]
+        for art in sorted(self._artists[fig_idx],
+                          key=lambda art: art.get_zorder()):
+            fig.draw_artist(art)
+
+    def update(self):
+        """Redraw the registered artists of all figures."""
+        for fig_idx, fig in enumerate(self.fig_lst):
+            canvas = fig.canvas
+            if not self.blit:
+                canvas.draw_idle()
+                continue
+            if self._bg[fig_idx] is None:
+                canvas.draw()
+            else:
+                canvas.restore_region(self._bg[fig_idx])
+                self._draw_animated(fig_idx)
+            canvas.blit(fig.bbox)
+            if self.interactive:
+                canvas.flush_events()
+
+    def next_frame(self, it):
+        """Draw the current frame and advance to the next one.
+
+        Parameters
+        ----------
+        it : int
+            The index of the current frame.
+        """
+        self.update()
+        if not self.interactive:
+            for fig_idx, fig in enumerate(self.fig_lst):
+                if not self.blit:
+                    fig.canvas.draw()
+                rgba = np.asarray(fig.canvas.buffer_rgba())
+                if self.video is not None:
+                    if self._writers[fig_idx] is None:
+                        self._writers[fig_idx] = self.video.open(
+                            self.file_prefix, fig_idx, rgba.shape[1],
+                            rgba.shape[0])
+                    self._writers[fig_idx].write(rgba)
+                else:
+                    plt.imsave(os.path.join(
+                        self.save_dir, '{}_fig{}_{:05d}.png'.format(
+                            self.file_prefix, fig_idx, it)), rgba)
+        elif self.click:
+            plt.waitforbuttonpress()
+        else:
+            self.fig_lst[0].canvas.start_event_loop(self.time_between_updates)
@@ -12,18 +12,23 @@ from matplotlib.ticker import MaxNLocator
 import datetime
 
 import os
+import re
 import sys
 sys.path.append('..')
 
 from utilities.tuda_colors import *
+from utilities.animation import EvolutionAnimation
+from utilities.heatmap import DetectionCounts
+from utilities.node_store import NodeStore, node_store_dirname
 
 # from aux import *
 from spatialmht.analysis import show_sensors_in_field
 
-import requests
-import time
-import serial
-import re
+# the FC runtime helpers used to live here, re-exported for existing imports
+from utilities.fc import (
+    calculate_current_epoch_index, create_csv_datafile, restart_serial,
+    pass_time_to_nano, reboot, send_telegram_message,
+    write_data_buffer_to_csv)
 # %% setup: define my custom colormaps
 # The color dictionairy for my linearly spaced color-map emphasizing small
 # p-values. Setup such that yellow is exactly at 0.15
@@ -60,6 +65,10 @@ color_dic_prct = {'red':   [(0.0,  0.0, 1.0),
                 'blue':  [(0.0,  0.0, 1.0),
                            (1.0,  1.0, 0.0)]}
 my_cmap2 = colors.LinearSegmentedColormap('prct', color_dic_prct)
+
+# bin edges of the p-value and lfdr histograms in the evolution plots
+hist_bins = np.array([0, .02, .04, .06, .08, .1, .125, .15, .175, .2, .25, .3,
+                      .35, .5, .6, .7, .8, 1])
 # %% Setup and administration
 def create_hist_legends_list(null_lst, walk_lst):
     """create legends list for histograms.
@@ -151,8 +160,45 @@ def is_notebook() -> bool:
     except NameError:
         return False      # Probably standard Python interpreter
 
+def read_node_data(filepath, columns=None, time_idx=None):
+    """Reads the data of a node. If the directory of the csv file holds a node
+    store (written by run_fc.py) with data of the node, the data is read from
+    the store, otherwise from the csv file.
+
+    Parameters
+    ----------
+    filepath : string
+        The path of the csv file of the node, Node<node>_data.csv.
+    columns : list, optional
+        The columns to read besides the epoch index, by default None, i.e.,
+        all.
+    time_idx : numpy array, optional
+        The epoch indexes that are needed, by default None, i.e., all. Only
+        used to skip the chunks of the store outside of them.
+
+    Returns
+    -------
+    DataFrame
+        The data, indexed by epoch, in the order it was received.
+    """
+    store_directory = os.path.join(os.path.dirname(filepath),
+                                   node_store_dirname)
+    match = re.match(r'Node(\d+)_data\.csv$', os.path.basename(filepath))
+    if match is not None and os.path.isdir(store_directory):
+        store = NodeStore(store_directory)
+        node = int(match.group(1))
+        if node in store.get_nodes():
+            if time_idx is None or len(time_idx) == 0:
+                return store.read_node(node, columns)
+            return store.read_node(node, columns, epoch_start=np.min(time_idx),
+                                   epoch_end=np.max(time_idx))
+    if columns is None:
+        return pd.read_csv(filepath, sep=',', header=0, index_col=0)
+    return pd.read_csv(filepath, usecols=['epoch'] + columns, index_col=0)
+
 def load_all_nodes(data_directory, time_idx, num_nodes=54, which_data="humid"):
-    """Loads the data from all nodes and returns them as a DataFrame
+    """Loads the data from all nodes and returns them as a DataFrame. Reads
+    from the node store if there is one, see read_node_data.
 
     Parameters
     ----------
@@ -171,8 +217,8 @@ def load_all_nodes(data_directory, time_idx, num_nodes=54, which_data="humid"):
         The loaded data.
     """
     try:
-        df = pd.read_csv(os.path.join(data_directory, 'Node1_data.csv'),
-                           usecols=['epoch', which_data], index_col=0)
+        df = read_node_data(os.path.join(data_directory, 'Node1_data.csv'),
+                            columns=[which_data], time_idx=time_idx)
         df = df.loc[time_idx]
         df = df[df.index.duplicated(keep=False)==False]
         df = df.rename(columns={which_data: "Node1"})
@@ -211,9 +257,9 @@ def load_all_nodes(data_directory, time_idx, num_nodes=54, which_data="humid"):
         df = df.rename(columns={which_data: "Node1"})
     for node_idx in np.arange(2, num_nodes+1, 1):
         try:
-            df_tmp = pd.read_csv(os.path.join(
+            df_tmp = read_node_data(os.path.join(
                 data_directory, 'Node{}_data.csv'.format(int(node_idx))),
-                usecols=['epoch', which_data], index_col=0)
+                columns=[which_data], time_idx=time_idx)
             df_tmp = df_tmp.loc[time_idx].rename(
                 columns={which_data: "Node{}".format(int(node_idx))})
             df_tmp = df_tmp[df_tmp.index.duplicated(keep=False)==False]
@@ -260,7 +306,8 @@ def load_data_single_node(filepath, time_idx=None, fullsize=False,
                           idx_header='epoch'):
     """Load a data file under the given path and return its content. Default:
     return the entire dataframe. If time_idx_vec is not None, returns values
-    for given time indexes.
+    for given time indexes. Reads from the node store if there is one, see
+    read_node_data.
 
     Parameters
     ----------
@@ -283,7 +330,7 @@ def load_data_single_node(filepath, time_idx=None, fullsize=False,
     """
     # first loads the data frame from the given file path and then uses the
     # specified index to return the desired values
-    df = pd.read_csv(filepath, sep=',', header=0, index_col=0)
+    df = read_node_data(filepath, time_idx=time_idx)
     # drop duplicates
     df = (df.reset_index()
         .drop_duplicates(subset=idx_header, keep='last')
@@ -541,10 +588,60 @@ def initialize_map(sensor_map, cmap=my_cmap, vmin=0, vmax=1, figsize=(8,8),
     fig.suptitle("sensor locations")
     return fig, ax, im, cbar
 
+def initialize_multi_map(sensor_map, title_lst, cmap=my_cmap, vmin=0, vmax=1,
+                         figsize=(8,8), cbar=True):
+    """Set up one figure with a map panel per method, with shared axes,
+    colorbar and title.
+
+    Parameters
+    ----------
+    sensor_map : numpy array
+        The initial map shown in all panels.
+    title_lst : list
+        The titles of the panels, e.g., the method names.
+    cmap : matplotlib colormap, optional
+        The colormap of all panels, by default my_cmap.
+    vmin : float, optional
+        The lower end of the colormap, by default 0.
+    vmax : float, optional
+        The upper end of the colormap, by default 1.
+    figsize : tuple, optional
+        The size of the figure, by default (8,8).
+    cbar : bool, optional
+        If a colorbar shared by all panels is to be shown, by default True.
+
+    Returns
+    -------
+    tuple
+        The figure, the list of panel axes, the list of panel images and the
+        colorbar (False if none).
+    """
+    n_maps = len(title_lst)
+    n_cols = int(np.ceil(np.sqrt(n_maps)))
+    n_rows = int(np.ceil(n_maps / n_cols))
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=figsize, sharex=True,
+                             sharey=True, squeeze=False)
+    axes = list(axes.ravel())
+    im = []
+    for ax, title in zip(axes, title_lst):
+        im.append(ax.imshow(sensor_map, cmap=cmap, origin="lower", vmin=vmin,
+                            vmax=vmax))
+        ax.set_title(title)
+        ax.yaxis.get_major_locator().set_params(integer=True)
+        ax.xaxis.get_major_locator().set_params(integer=True)
+    for ax in axes[n_maps:]:
+        ax.set_axis_off()
+    if cbar:
+        cbar = fig.colorbar(im[0], ax=axes, fraction=0.046, pad=0.04)
+    fig.supxlabel('$x$-coordinate')
+    fig.supylabel('$y$-coordinate')
+    fig.suptitle("sensor locations")
+    return fig, axes[:n_maps], im, cbar
+
 def plot_av_det_prob(
         det_res_lst, dim, start_av, end_av, time_idx_vec, global_start_time,
         tsEpochDuration, sen_cds, res_names, anchor_cds=np.zeros((0, 2)),
-        figsize=(8,8), **kwargs):
+        figsize=(8,8), save_dir=None, det_counts_lst=None, **kwargs):
     """Plot the average detection probability per grid point over the given
     time period.
 
@@ -574,7 +671,16 @@ def plot_av_det_prob(
         default np.zeros((0, 2))
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the figures are saved as png files to this directory instead
+        of being shown, by default None.
+    det_counts_lst : list, optional
+        The DetectionCounts of the detection results, by default None, which
+        accumulates them here. Pass them to plot several periods without
+        going through all epochs each time.
     """
+    if det_counts_lst is None:
+        det_counts_lst = [DetectionCounts(res.r_det) for res in det_res_lst]
 
     start_to_end_av_idx_lst = start_end_to_index_list_renewed(
         [[start_av, end_av]], global_start_time, tsEpochDuration)
@@ -582,10 +688,8 @@ def plot_av_det_prob(
         time_idx_vec == start_to_end_av_idx_lst[0][0])[0][0]
     end_av_mc_idc = np.where(
         time_idx_vec == start_to_end_av_idx_lst[0][-1])[0][0]
-    mc_av_idc_vec = np.arange(start_av_mc_idx, end_av_mc_idc, 1, dtype=int)
-    v = np.linspace(-.1, 2.0, 15, endpoint=True)
 
-    for res, nam in zip(det_res_lst, res_names):
+    for det_counts, nam in zip(det_counts_lst, res_names):
         fig, ax = plt.subplots()
         if not anchor_cds.shape==(0,2):
             show_sensors_in_field(
@@ -594,8 +698,8 @@ def plot_av_det_prob(
                 facecolor="k")
             show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
                               color='black', linewidth=1.5, ax=ax)
-        im = ax.imshow(np.mean(
-            res.r_det[mc_av_idc_vec, :], axis=0).reshape(dim), cmap='hot_r',
+        im = ax.imshow(det_counts.mean(
+            start_av_mc_idx, end_av_mc_idc).reshape(dim), cmap='hot_r',
             vmin=0, vmax=1, origin='lower')
         cbar = fig.colorbar(im, fraction=0.046, pad=0.04)
        #cbar.set_ticks(np.arange(0, 1.1, .1))
@@ -606,6 +710,140 @@ def plot_av_det_prob(
         ax.set_ylabel('$y$-coordinate')
         ax.yaxis.get_major_locator().set_params(integer=True)
         ax.xaxis.get_major_locator().set_params(integer=True)
+        if save_dir is not None:
+            os.makedirs(save_dir, exist_ok=True)
+            fig.savefig(os.path.join(save_dir, 'av_det_prob_{}.png'.format(
+                nam)))
+
+def get_det_palette(col_lst):
+    """Return the colors of the detection categories as an array.
+
+    Parameters
+    ----------
+    col_lst : list
+        The colors of the categories, in any format matplotlib understands.
+
+    Returns
+    -------
+    numpy array
+        The n_categories x 3 RGB values, to be indexed with category maps.
+    """
+    return np.array([colors.to_rgb(x) for x in col_lst])
+
+def get_det_map(cat_dat, dim, sen_cds=None):
+    """Return the detection category of every grid point for one epoch.
+
+    Parameters
+    ----------
+    cat_dat : list
+        One vector per category that is 1 for the tests in this category.
+        If a test is in several categories, the last one counts.
+    dim : tuple
+        The dimension of the grid of the room.
+    sen_cds : numpy array, optional
+        If given, the tests are the sensors at these coordinates. Otherwise,
+        the tests are all grid points, by default None.
+
+    Returns
+    -------
+    numpy array
+        The category indexes of shape dim, 0 where no category applies.
+    """
+    cat_idx = np.zeros(np.asarray(cat_dat[0]).size, dtype=int)
+    for idx, this_dat in enumerate(cat_dat):
+        cat_idx[np.asarray(this_dat).ravel() == 1] = idx
+    if sen_cds is None:
+        return cat_idx.reshape(dim)
+    dmap = np.zeros(dim, dtype=int)
+    dmap[sen_cds[:, 1], sen_cds[:, 0]] = cat_idx
+    return dmap
+
+def get_hist_matrix(vals, bins=hist_bins):
+    """Compute the density histograms of many epochs at once.
+
+    Same as np.histogram(..., density=True) for every epoch, i.e., the last
+    bin includes its right edge and NaNs as well as values outside the bins
+    are ignored.
+
+    Parameters
+    ----------
+    vals : numpy array
+        The n_epochs x n values, e.g., p-values or lfdrs.
+    bins : numpy array, optional
+        The increasing bin edges, by default hist_bins.
+
+    Returns
+    -------
+    numpy array
+        The n_epochs x n_bins densities, 0 for epochs without values.
+    """
+    vals = np.asarray(vals, dtype=float).reshape(len(vals), -1)
+    n_ep = vals.shape[0]
+    n_bins = bins.size - 1
+    bin_idx = np.searchsorted(bins, vals, side='right') - 1
+    bin_idx[vals == bins[-1]] = n_bins - 1
+    # NaNs and values outside the bins go to an extra bin that is dropped
+    bin_idx[(bin_idx < 0) | (bin_idx >= n_bins) | np.isnan(vals)] = n_bins
+    counts = np.bincount(
+        (bin_idx + (n_bins + 1) * np.arange(n_ep)[:, np.newaxis]).ravel(),
+        minlength=n_ep * (n_bins + 1)).reshape(n_ep, n_bins + 1)[:, :n_bins]
+    n_vals = np.sum(counts, axis=1, keepdims=True)
+    return counts / (np.maximum(n_vals, 1) * np.diff(bins))
+
+def get_hist_frame(hist_mat, epochs, bins=hist_bins):
+    """Put the histograms from get_hist_matrix in a table, e.g., for export.
+
+    Parameters
+    ----------
+    hist_mat : numpy array
+        The n_epochs x n_bins densities.
+    epochs : numpy array
+        The epoch indexes of the rows.
+    bins : numpy array, optional
+        The bin edges, by default hist_bins.
+
+    Returns
+    -------
+    pandas DataFrame
+        One row per epoch and one column per bin, named by its left edge.
+    """
+    return pd.DataFrame(hist_mat, index=pd.Index(epochs, name='epoch'),
+                        columns=bins[:-1])
+
+def init_hist_bars(ax, bins=hist_bins):
+    """Create the bars of a histogram that is updated with set_hist_bars.
+
+    Parameters
+    ----------
+    ax : matplotlib Axes
+        The Axes of the histogram.
+    bins : numpy array, optional
+        The bin edges, by default hist_bins.
+
+    Returns
+    -------
+    matplotlib BarContainer
+        The bars, initially of height 0.
+    """
+    return ax.bar(bins[:-1], np.zeros(bins.size - 1), width=np.diff(bins),
+                  align='edge', color=TUDa_1b)
+
+def set_hist_bars(ax, bars, heights):
+    """Set the bar heights of a histogram and rescale its y-axis.
+
+    Parameters
+    ----------
+    ax : matplotlib Axes
+        The Axes of the histogram.
+    bars : matplotlib BarContainer
+        The bars from init_hist_bars.
+    heights : numpy array
+        The new heights.
+    """
+    for bar, height in zip(bars, heights):
+        bar.set_height(height)
+    # same upper margin as autoscaling
+    ax.set_ylim(0, max(np.max(heights), 1e-3) * 1.05)
 
 def plot_data_map(fig, ax, data):
     im = ax.imshow(data, origin="lower")
@@ -616,7 +854,9 @@ def plot_data_map(fig, ax, data):
 def plot_evolution_all_lfdrs(
         lfdr_lst, dim, epochs_to_show, global_start_time, tsEpochDuration,
         sen_cds, met_names, anchor_cds=np.zeros((0, 2)), click=False,
-        time_between_updates=.5, sen_only=True, figsize=(8,8), **kwargs):
+        time_between_updates=.5, sen_only=True, figsize=(8,8),
+        save_dir=None, video=None, time_agg=None, multi_panel=False,
+        **kwargs):
     """Plots lfdrs of different methods in parallel to enable an epoch-by-epoch
     comparison between methods.
 
@@ -650,7 +890,24 @@ def plot_evolution_all_lfdrs(
         If only sensor lfdrs to be shown, by default True
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
+    multi_panel : bool, optional
+        If True, all methods are shown as panels of one figure with shared
+        axes, colorbar and title. Otherwise, every method gets its own
+        figure, by default False.
     """
+    if time_agg is not None:
+        lfdr_lst = [time_agg.values(lfdrs) for lfdrs in lfdr_lst]
+        epochs_to_show = time_agg.epochs(epochs_to_show)
     if sen_only:
         fullsize_lfdrs = []
         for lfdrs in lfdr_lst:
@@ -659,16 +916,6 @@ def plot_evolution_all_lfdrs(
             fullsize_this_lfdrs[:, sen_cds[:, 1], sen_cds[:, 0]] = lfdrs
             fullsize_lfdrs.append(fullsize_this_lfdrs)
         lfdr_lst = fullsize_lfdrs
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
 
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
@@ -676,12 +923,18 @@ def plot_evolution_all_lfdrs(
     fig_lst = []
     ax_lst = []
     im_lst = []
-    for lfdrs in lfdr_lst:
-        fig, ax, im, _ = initialize_map(
-            sensor_map, cmap=cm_lfdr, figsize=figsize)
-        fig_lst.append(fig)
-        ax_lst.append(ax)
-        im_lst.append(im)
+    if multi_panel:
+        fig, ax_lst, im_lst, _ = initialize_multi_map(
+            sensor_map, met_names, cmap=cm_lfdr, figsize=figsize)
+        fig_lst = [fig for _ in lfdr_lst]
+    else:
+        for lfdrs in lfdr_lst:
+            fig, ax, im, _ = initialize_map(
+                sensor_map, cmap=cm_lfdr, figsize=figsize)
+            fig_lst.append(fig)
+            ax_lst.append(ax)
+            im_lst.append(im)
+    for ax in ax_lst:
         if not anchor_cds.shape==(0,2):
             show_sensors_in_field(
                 np.array([anchor_cds[:, 1], anchor_cds[:, 0]]) -.5,
@@ -690,32 +943,36 @@ def plot_evolution_all_lfdrs(
         show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
                               color='black', linewidth=1, ax=ax)
 
-
-    for fig in fig_lst:
-        fig.canvas.draw_idle()
-    plt.pause(1)
-
-    for it, i in enumerate(epochs_to_show):
-        new_im_lst = []
-        for lfdrs, im, ax, fig, name in zip(
-            lfdr_lst, im_lst, ax_lst, fig_lst, met_names):
-            im.remove()
-            dmap = np.zeros(dim) + np.nan
-            dmap = lfdrs[it, :].reshape(dim)
-
-            im = plot_pval_map(fig, ax, dmap, cmap=cm_lfdr)
-            new_im_lst.append(im)
-
-            fig.suptitle("{} - epoch: {} / Time: {}".format(
-                name, i, get_time(global_start_time, i, tsEpochDuration)))
-
-        get_next_frame(it)
-        im_lst = new_im_lst
+    anim = EvolutionAnimation(
+        fig_lst[:1] if multi_panel else fig_lst, epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='all_lfdrs', video=video)
+    for fig, ax, im in zip(fig_lst, ax_lst, im_lst):
+        anim.add_artist(fig, im)
+        anim.add_overlays(ax)
+    ttl_lst = [anim.add_title(fig, "sensor locations")
+               for fig in anim.fig_lst]
+    anim.start()
+
+    for it, i in anim.frames():
+        for lfdrs, im in zip(lfdr_lst, im_lst):
+            im.set_data(lfdrs[it, :].reshape(dim))
+        if multi_panel:
+            ttl_lst[0].set_text("epoch: {} / Time: {}".format(
+                i, get_time(global_start_time, i, tsEpochDuration)))
+        else:
+            for ttl, name in zip(ttl_lst, met_names):
+                ttl.set_text("{} - epoch: {} / Time: {}".format(
+                    name, i, get_time(global_start_time, i, tsEpochDuration)))
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_all_rej(
         det_res_lst, dim, epochs_to_show, global_start_time, tsEpochDuration,
         sen_cds, name_lst, anchor_cds=np.zeros((0, 2)), click=False,
-        time_between_updates=.5, sen_only=True, figsize=(8,8), **kwargs):
+        time_between_updates=.5, sen_only=True, figsize=(8,8),
+        save_dir=None, video=None, time_agg=None, multi_panel=False,
+        **kwargs):
     """Plots decisions of different methods in parallel to enable an
     epoch-by-epoch comparison between methods.
 
@@ -749,17 +1006,25 @@ def plot_evolution_all_rej(
         If only sensor lfdrs to be shown, by default True
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
+    multi_panel : bool, optional
+        If True, all methods are shown as panels of one figure with shared
+        axes, colorbar and title. Otherwise, every method gets its own
+        figure, by default False.
     """
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    if time_agg is not None:
+        det_res_lst = [time_agg.detection_result(det_res)
+                       for det_res in det_res_lst]
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     legend_lst = []
     col_lst = []
@@ -779,7 +1044,7 @@ def plot_evolution_all_rej(
 
     # Set up the colormap
     for this_col_lst in col_lst:
-        cmap_det_lst.append([colors.to_rgb(x) for x in this_col_lst])
+        cmap_det_lst.append(get_det_palette(this_col_lst))
 
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
@@ -787,14 +1052,18 @@ def plot_evolution_all_rej(
     fig_lst = []
     ax_lst = []
     im_lst = []
-    for this_cmap in cmap_det_lst:
-        fig, ax, im, _ = initialize_map(
-            sensor_map, cmap='binary', figsize=figsize, cbar=False)
-        fig_lst.append(fig)
-        ax_lst.append(ax)
-        im_lst.append(im)
-
-        fig.canvas.draw_idle()
+    if multi_panel:
+        fig, ax_lst, im_lst, _ = initialize_multi_map(
+            sensor_map, name_lst, cmap='binary', figsize=figsize, cbar=False)
+        fig_lst = [fig for _ in cmap_det_lst]
+    else:
+        for this_cmap in cmap_det_lst:
+            fig, ax, im, _ = initialize_map(
+                sensor_map, cmap='binary', figsize=figsize, cbar=False)
+            fig_lst.append(fig)
+            ax_lst.append(ax)
+            im_lst.append(im)
+    for ax in ax_lst:
         if not anchor_cds.shape==(0,2):
             show_sensors_in_field(
                 np.array([anchor_cds[:, 1], anchor_cds[:, 0]]) -.5,
@@ -803,44 +1072,50 @@ def plot_evolution_all_rej(
         show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
                               color='black', linewidth=1.5, ax=ax)
 
-    plt.pause(1)
-
-    for it, i in enumerate(epochs_to_show):
-        new_im_lst = []
-        for fig, im, dat, cmap_det, legend, ax, name in zip(
-            fig_lst, im_lst, dat_lst, cmap_det_lst, legend_lst, ax_lst,
-            name_lst):
-            im.remove()
-
-            if sen_only:    
-                dmap = np.zeros(dim, dtype=int)
-                for idx, this_dat in enumerate(dat):
-                    dmap[sen_cds[this_dat[it]==1, 1],
-                         sen_cds[this_dat[it]==1, 0]] = idx
-            else:
-                dmap = np.zeros(np.prod(dim), dtype=int)
-                for idx, this_dat in enumerate(dat):
-                    dmap[this_dat[it]==1] = idx
-                dmap = dmap.reshape(dim)
-    
-            dat_to_show = np.array([[cmap_det[i] for i in j] for j in dmap])
-            new_im_lst.append(ax.imshow(dat_to_show, origin="lower"))
-            patches = [mpatches.Patch(color=cmap_det[i],label=legend[i])
-                       for i, entry in enumerate(cmap_det)]
+    anim = EvolutionAnimation(
+        fig_lst[:1] if multi_panel else fig_lst, epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='all_rej', video=video)
+    # in a multi-panel figure, one legend suffices if all panels share it
+    shared_legend = multi_panel and all(
+        legend == legend_lst[-1] for legend in legend_lst)
+    for fig, ax, im, cmap_det, legend in zip(
+            fig_lst, ax_lst, im_lst, cmap_det_lst, legend_lst):
+        patches = [mpatches.Patch(color=cmap_det[i],label=legend[i])
+                   for i, entry in enumerate(cmap_det)]
+        if not shared_legend:
             ax.legend(handles=patches)
-
-            fig.canvas.draw_idle()
-
-            fig.suptitle("{} - epoch: {} / Time: {}".format(
+        anim.add_artist(fig, im)
+        anim.add_overlays(ax)
+    if shared_legend:
+        # lower right is where the grid of panels has free space, if any
+        anim.add_artist(fig_lst[0], fig_lst[0].legend(
+            handles=patches, loc='lower right'))
+    ttl_lst = [anim.add_title(fig, "sensor locations")
+               for fig in anim.fig_lst]
+    anim.start()
+
+    for it, i in anim.frames():
+        for im, dat, cmap_det in zip(im_lst, dat_lst, cmap_det_lst):
+            dmap = get_det_map([this_dat[it] for this_dat in dat], dim,
+                               sen_cds=sen_cds if sen_only else None)
+            im.set_data(cmap_det[dmap])
+        if multi_panel:
+            ttl_lst[0].set_text("epoch: {} / Time: {}".format(
+                i, get_time(global_start_time, i, tsEpochDuration)))
+        else:
+            for ttl, name in zip(ttl_lst, name_lst):
+                ttl.set_text("{} - epoch: {} / Time: {}".format(
                     name, i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
-        im_lst = new_im_lst
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_all_side_by_side(
         det_res_lst, lfdr_lst, dim, epochs_to_show, global_start_time,
         tsEpochDuration, sen_cds, name_lst, anchor_cds=np.zeros((0, 2)),
         click=False, time_between_updates=.5,
-        sen_only=True, figsize=(8,8), **kwargs):
+        sen_only=True, figsize=(8,8), save_dir=None, video=None,
+        time_agg=None, **kwargs):
     """Plot the evolution of detection results and lfdrs side-by-side.
 
     Parameters
@@ -875,19 +1150,22 @@ def plot_evolution_all_side_by_side(
         If only sensor lfdrs to be shown, by default True
     figsize : tuple, optional
         The size of the figures, by default (8,8).
-
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
-
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    if time_agg is not None:
+        det_res_lst = [time_agg.detection_result(det_res)
+                       for det_res in det_res_lst]
+        lfdr_lst = [time_agg.values(lfdrs) for lfdrs in lfdr_lst]
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     if sen_only:
         fullsize_lfdrs = []
@@ -902,7 +1180,6 @@ def plot_evolution_all_side_by_side(
     col_lst = []
     dat_lst = []
 
-
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
     
@@ -929,75 +1206,155 @@ def plot_evolution_all_side_by_side(
                 np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5, color='black',
                 linewidth=1, ax=subax)
 
-    plt.pause(1)
-
-    for it, i in enumerate(epochs_to_show):
-        new_im_lst = []
+    anim = EvolutionAnimation(
+        fig_lst, epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='all_sbs', video=video)
+    ttl_lst = []
+    for fig, ax, im in zip(fig_lst, ax_lst, im_lst):
+        for subax, subim in zip(ax, im):
+            anim.add_artist(fig, subim)
+            anim.add_overlays(subax)
+        ttl_lst.append(anim.add_title(fig, "sensor locations"))
+    anim.start()
+
+    # Set up the colormaps
+    cmap_det_no_tru = get_det_palette(['#FFFFFF', TUDa_6d])
+    cmap_det_tru = get_det_palette(['#FFFFFF', TUDa_4b, TUDa_9b, '#555555'])
+
+    # the legend only changes if the ground truth becomes (un)available
+    shown_legend_lst = [None for _ in fig_lst]
+    for it, i in anim.frames():
         legend_lst = []
-        col_lst = []
+        cmap_det_lst = []
         dat_lst = []
         for det_res in det_res_lst:
             if np.sum(np.isnan(det_res.r_tru[it])) == np.prod(dim):
                 legend_lst.append(['non-discovery', 'discovery'])
-                col_lst.append(['#FFFFFF', TUDa_6d])
+                cmap_det_lst.append(cmap_det_no_tru)
                 dat_lst.append([det_res.r_det[it]==0, det_res.r_det[it]==1])
             else:
                 legend_lst.append(['correct non-discovery',
                                    'correct discovery', 'false discovery',
                                    'missed discovery'])
-                col_lst.append(['#FFFFFF', TUDa_4b, TUDa_9b, '#555555'])
+                cmap_det_lst.append(cmap_det_tru)
                 dat_lst.append([
                     det_res.u[it], det_res.s[it], det_res.v[it],
                     det_res.t[it]])
 
-        cmap_det_lst = []
-        # Set up the colormap
-        for this_col_lst in col_lst:
-            cmap_det_lst.append([colors.to_rgb(x) for x in this_col_lst])
-        for fig, im, lfdrs, dat, cmap_det, legend, ax, name in zip(
-            fig_lst, im_lst, lfdr_lst, dat_lst, cmap_det_lst, legend_lst,
-            ax_lst, name_lst):
+        for fig_idx, (fig, im, ttl, lfdrs, dat, cmap_det, legend, ax,
+                      name) in enumerate(zip(
+            fig_lst, im_lst, ttl_lst, lfdr_lst, dat_lst, cmap_det_lst,
+            legend_lst, ax_lst, name_lst)):
             # Taking care of the lfdrs
-            im[0].remove()
-            dmap = np.zeros(dim) + np.nan
-            dmap = lfdrs[it, :].reshape(dim)
-            
-            lfdr_im = plot_pval_map(fig, ax[0], dmap, cmap=cm_lfdr)
+            im[0].set_data(lfdrs[it, :].reshape(dim))
 
             # Taking care of the discoveries
-            im[1].remove()
-            dmap = np.zeros(dim) + np.nan
-            dmap = lfdrs[it, :].reshape(dim)
-
-            if sen_only:    
-                dmap = np.zeros(dim, dtype=int)
-                for idx, this_dat in enumerate(dat):
-                    dmap[sen_cds[this_dat==1, 1],
-                         sen_cds[this_dat==1, 0]] = idx
-            else:
-                dmap = np.zeros(np.prod(dim), dtype=int)
-                for idx, this_dat in enumerate(dat):
-                    dmap[this_dat==1] = idx
-                dmap = dmap.reshape(dim)
-    
-            dat_to_show = np.array([[cmap_det[w] for w in j] for j in dmap])
-            res_im = ax[1].imshow(dat_to_show, origin="lower")
-            patches = [mpatches.Patch(color=cmap_det[w],label=legend[w])
-                       for w, entry in enumerate(cmap_det)]
-            ax[1].legend(handles=patches)
+            dmap = get_det_map(dat, dim, sen_cds=sen_cds if sen_only else None)
+            im[1].set_data(cmap_det[dmap])
+            if shown_legend_lst[fig_idx] != legend:
+                if ax[1].get_legend() is not None:
+                    anim.remove_artist(fig, ax[1].get_legend())
+                    ax[1].get_legend().remove()
+                patches = [mpatches.Patch(color=cmap_det[w],label=legend[w])
+                           for w, entry in enumerate(cmap_det)]
+                anim.add_artist(fig, ax[1].legend(handles=patches))
+                shown_legend_lst[fig_idx] = legend
+
+            ttl.set_text("{} - epoch: {} / Time: {}".format(
+                    name, i, get_time(global_start_time, i, tsEpochDuration)))
+        anim.next_frame(it)
+    anim.stop()
 
-            new_im_lst.append([lfdr_im, res_im])
-            fig.canvas.draw_idle()
+def plot_evolution_av_det_prob(
+        det_counts, dim, epochs_to_show, win_len, global_start_time,
+        tsEpochDuration, sen_cds, name, anchor_cds=np.zeros((0, 2)),
+        click=False, time_between_updates=.5, step=1, figsize=(8,8),
+        save_dir=None, video=None, **kwargs):
+    """Plot the evolution of the average detection probability per grid point
+    over a window of epochs sliding along the event.
 
-            fig.suptitle("{} - epoch: {} / Time: {}".format(
-                    name, i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
-        im_lst = new_im_lst
+    Parameters
+    ----------
+    det_counts : DetectionCounts
+        The cumulative discovery counts of the detection result.
+    dim : tuple, optional
+        The dimension of the grid of the room, for our data the default
+        (20, 20).
+    epochs_to_show : numpy array
+        The epoch indexes of the detection result.
+    win_len : int
+        The number of epochs per window.
+    global_start_time : datetime.datetime
+        The absolute time when this experiment started
+    tsEpochDuration : int
+        The epoch duration.
+    sen_cds : numpy array
+        The sensor location coordinates.
+    name : string
+        The method name
+    anchor_cds : numpy array, optional
+        The coordinates of the anchors (where H0 is known to be true), by
+        default np.zeros((0, 2))
+    click : bool, optional
+        If advancing to next window by clicking a key is desired, by default
+        False.
+    time_between_updates : float, optional
+        When click is false, this time dictates how long it takes to the next
+        transission, by default .5.
+    step : int, optional
+        The number of epochs the window moves per frame, by default 1.
+    figsize : tuple, optional
+        The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of windows specified by video) are
+        encoded to videos instead of being shown, by default None.
+    """
+    starts, av_det = det_counts.sliding(win_len, step=step)
+    epochs_to_show = np.asarray(epochs_to_show)
+
+    sensor_map = np.zeros(dim, dtype=bool) + np.nan
+    sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
+
+    fig, ax, im, _ = initialize_map(sensor_map, cmap='hot_r', figsize=figsize)
+
+    if not anchor_cds.shape == (0, 2):
+        show_sensors_in_field(
+            np.array([anchor_cds[:, 1], anchor_cds[:, 0]]) -.5, linewidth=.5,
+            ax=ax, fill=True, edgecolor='white', facecolor="k")
+    show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
+                          color='black', linewidth=1, ax=ax)
+
+    # frames are labeled with the first epoch of their window
+    anim = EvolutionAnimation(
+        [fig], epochs_to_show[starts], click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='av_det_prob', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    anim.start()
+
+    for it, i in anim.frames():
+        im.set_data(av_det[it].reshape(dim))
+        i_end = epochs_to_show[starts[it] + win_len - 1]
+        ttl.set_text(
+            "{} - Detection percentage epochs: {} - {} / {} - {}".format(
+            name, i, i_end,
+            get_time(global_start_time, i, tsEpochDuration).strftime('%H:%M'),
+            get_time(global_start_time, i_end, tsEpochDuration).strftime(
+                '%H:%M')))
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_lfdrs(
         lfdrs, dim, epochs_to_show, global_start_time, tsEpochDuration,
         sen_cds, name, anchor_cds=np.zeros((0, 2)), click=False,
-        time_between_updates=.5, sen_only=True, figsize=(8,8), **kwargs):
+        time_between_updates=.5, sen_only=True, figsize=(8,8),
+        save_dir=None, video=None, time_agg=None, **kwargs):
     """Plot the evolution of lfdrs over epochs.
 
     Parameters
@@ -1030,22 +1387,25 @@ def plot_evolution_lfdrs(
         If only sensor lfdrs to be shown, by default True
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
+    if time_agg is not None:
+        lfdrs = time_agg.values(lfdrs)
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     if sen_only:
         fullsize_lfdrs = np.zeros((lfdrs.shape[0], dim[0], dim[1])) + np.nan
         fullsize_lfdrs[:, sen_cds[:, 1], sen_cds[:, 0]] = lfdrs
         lfdrs = fullsize_lfdrs
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
 
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
@@ -1061,39 +1421,39 @@ def plot_evolution_lfdrs(
     show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
                           color='black', linewidth=1, ax=ax)
 
-    plt.pause(1)
-
+    hist_mat = get_hist_matrix(lfdrs)
     fig_hist, ax_hist = plt.subplots()
-    counts, bins, bars = ax_hist.hist(
-        stats.uniform.rvs(size=1000), density=True, bins=30)
-
-    for it, i in enumerate(epochs_to_show):
-        _ = [b.remove() for b in bars]
-        im.remove()
-
-        counts, bins, bars = ax_hist.hist(
-            lfdrs[it, :].flatten(), density=True,
-            bins=np.array([0, .02, .04, .06, .08, .1, .125, .15, .175, .2, .25,
-                           .3, .35, .5, .6, .7, .8, 1]),       
-            color=TUDa_1b)
-        fig_hist.canvas.draw_idle()
-
-        dmap = np.zeros(dim) + np.nan
-        dmap = lfdrs[it, :].reshape(dim)
-
-        im = plot_pval_map(fig, ax, dmap, cmap=cm_lfdr)
-
-        fig.suptitle("{} - epoch: {} / Time: {}".format(
+    bars = init_hist_bars(ax_hist)
+    anim = EvolutionAnimation(
+        [fig, fig_hist], epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='lfdrs', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    # the histogram rescales every epoch, so its Axes is redrawn entirely
+    anim.add_artist(fig_hist, ax_hist)
+    ttl_hist = anim.add_title(fig_hist)
+    anim.start()
+
+    for it, i in anim.frames():
+        set_hist_bars(ax_hist, bars, hist_mat[it])
+
+        im.set_data(lfdrs[it, :].reshape(dim))
+
+        ttl.set_text("{} - epoch: {} / Time: {}".format(
                 name, i, get_time(global_start_time, i, tsEpochDuration)))
-        fig_hist.suptitle("{} - epoch: {} / Time: {}".format(name,
+        ttl_hist.set_text("{} - epoch: {} / Time: {}".format(name,
             i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_pvals(data_directory, start_plot_at, end_plot_at,
                          global_start_time, tsEpochDuration, tsWindowLength,
                          sen_loc_arr, dim, edf_lst, null_sizes, which_nodes,
                          click=False, which_data="humid", figsize=(8,8),
-                         time_between_updates=.5, **kwargs):
+                         time_between_updates=.5, save_dir=None,
+                         video=None, time_agg=None, **kwargs):
     """Plot the evolution of p-values over time (room map and histogram).
 
     Parameters
@@ -1129,6 +1489,16 @@ def plot_evolution_pvals(data_directory, start_plot_at, end_plot_at,
     time_between_updates : float, optional
         When click is false, this time dictates how long it takes to the next
         transission, by default .5.
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
     start_epoch = get_epoch(global_start_time, start_plot_at, tsEpochDuration)
     end_epoch = get_epoch(global_start_time, end_plot_at, tsEpochDuration)
@@ -1141,48 +1511,37 @@ def plot_evolution_pvals(data_directory, start_plot_at, end_plot_at,
     pval = get_pvals_from_edfs(
         data_directory, edf_lst, null_sizes, tsWindowLength, which_nodes,
         epochs_to_show, which_data=which_data)
-
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    if time_agg is not None:
+        pval = pd.DataFrame(
+            time_agg.values(pval.reindex(epochs_to_show).values),
+            index=time_agg.epochs(epochs_to_show), columns=pval.columns)
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_loc_arr.T[1], sen_loc_arr.T[0]] = 1
     
     fig, ax, im, cbar = initialize_map(sensor_map, figsize=figsize)
     fig.canvas.draw_idle()
-    plt.pause(1)
 
+    # epochs without data get an empty histogram
+    hist_mat = get_hist_matrix(pval.reindex(epochs_to_show).values)
     fig_hist, ax_hist = plt.subplots()
-    counts, bins, bars = ax_hist.hist(stats.uniform.rvs(size=1000),
-                                      density=True, bins=30)
+    bars = init_hist_bars(ax_hist)
     ax_hist.set_ylabel('PDF')
     ax_hist.set_xlabel(r'$p$')
-
-    for it, i in enumerate(epochs_to_show):
-        try:
-            _ = [b.remove() for b in bars]
-        except ValueError:
-            print("")
-        im.remove()
-
-        try:
-            new_counts, new_bins, new_bars = ax_hist.hist(
-                pval.loc[i].values, density=True,
-                bins=np.array([0, .02, .04, .06, .08, .1, .125, .15, .175, .2,
-                                .25, .3, .35, .5, .6, .7, .8, 1]),       
-                color=TUDa_1b)
-            counts, bins, bars = new_counts, new_bins, new_bars
-        except KeyError:
-            print("")
-        fig_hist.canvas.draw_idle()
+    anim = EvolutionAnimation(
+        [fig, fig_hist], epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='pvals', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    anim.add_artist(fig_hist, ax_hist)
+    ttl_hist = anim.add_title(fig_hist)
+    anim.start()
+
+    for it, i in anim.frames():
+        set_hist_bars(ax_hist, bars, hist_mat[it])
 
         dmap = np.zeros(dim) + np.nan
         try:
@@ -1190,18 +1549,19 @@ def plot_evolution_pvals(data_directory, start_plot_at, end_plot_at,
         except KeyError:
             print('No Node has data for epoch {}'.format(i))
 
-        im = plot_pval_map(fig, ax, dmap)
+        im.set_data(dmap)
 
-        fig.suptitle("Epoch: {} / Time: {}".format(
+        ttl.set_text("Epoch: {} / Time: {}".format(
             i, get_time(global_start_time, i, tsEpochDuration)))
-        fig_hist.suptitle("Epoch: {} / Time: {}".format(
+        ttl_hist.set_text("Epoch: {} / Time: {}".format(
             i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_pvals_fd(
         fd, epochs_to_show, global_start_time, tsEpochDuration, sen_loc_arr,
         click=False, which_data="humid", time_between_updates=.5,
-        figsize=(8,8), **kwargs):
+        figsize=(8,8), save_dir=None, video=None, time_agg=None, **kwargs):
     """Plot the evolution of p-values over time (room map and histogram) when
     a SpatialFiekd object is given.
 
@@ -1227,55 +1587,59 @@ def plot_evolution_pvals_fd(
         transission, by default .5.
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    pvals = fd.p
+    if time_agg is not None:
+        pvals = time_agg.values(pvals)
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     sensor_map = np.zeros(fd.dim, dtype=bool) + np.nan
     sensor_map[sen_loc_arr.T[1], sen_loc_arr.T[0]] = 1
     
     fig, ax, im, _ = initialize_map(sensor_map, figsize=figsize)
     fig.canvas.draw_idle()
-    plt.pause(1)
 
+    hist_mat = get_hist_matrix(pvals)
     fig_hist, ax_hist = plt.subplots()
-    counts, bins, bars = ax_hist.hist(stats.uniform.rvs(size=1000),
-                                      density=True, bins=30)
-
-    for it, i in enumerate(epochs_to_show):
-        _ = [b.remove() for b in bars]
-        im.remove()
-
-        counts, bins, bars = ax_hist.hist(
-            fd.p[it, :], density=True,
-            bins=np.array([0, .02, .04, .06, .08, .1, .125, .15, .175, .2, .25,
-                           .3, .35, .5, .6, .7, .8, 1]),       
-            color=TUDa_1b)
-        fig_hist.canvas.draw_idle()
-
-        dmap = np.zeros(fd.dim) + np.nan
-        dmap = fd.p[it, :].reshape(fd.dim)
-
-        im = plot_pval_map(fig, ax, dmap)
-
-        fig.suptitle("Epoch: {} / Time: {}".format(
+    bars = init_hist_bars(ax_hist)
+    anim = EvolutionAnimation(
+        [fig, fig_hist], epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='pvals', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    anim.add_artist(fig_hist, ax_hist)
+    ttl_hist = anim.add_title(fig_hist)
+    anim.start()
+
+    for it, i in anim.frames():
+        set_hist_bars(ax_hist, bars, hist_mat[it])
+
+        im.set_data(pvals[it, :].reshape(fd.dim))
+
+        ttl.set_text("Epoch: {} / Time: {}".format(
             i, get_time(global_start_time, i, tsEpochDuration)))
-        fig_hist.suptitle("Epoch: {} / Time: {}".format(
+        ttl_hist.set_text("Epoch: {} / Time: {}".format(
             i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_raw_data(
         data_directory, start_plot_at, end_plot_at, global_start_time,
         tsEpochDuration, sen_loc_arr, evaluate_event, click=False,
-        which_data="humid", time_between_updates=.5, dim=(20, 20), **kwargs):
+        which_data="humid", time_between_updates=.5, dim=(20, 20),
+        save_dir=None, video=None, time_agg=None, **kwargs):
     """Plot the evolution of AAD over time. 
 
     Parameters
@@ -1305,6 +1669,16 @@ def plot_evolution_raw_data(
     dim : tuple, optional
         The dimension of the grid of the room, for our data the default
         (20, 20).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
     start_epoch = get_epoch(global_start_time, start_plot_at, tsEpochDuration)
     end_epoch = get_epoch(global_start_time, end_plot_at, tsEpochDuration)
@@ -1316,29 +1690,30 @@ def plot_evolution_raw_data(
 
     data = load_all_nodes(
         data_directory, epochs_to_show, which_data=which_data)
-
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    if time_agg is not None:
+        data = pd.DataFrame(
+            time_agg.values(data.reindex(epochs_to_show).values),
+            index=time_agg.epochs(epochs_to_show), columns=data.columns)
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     sensor_map = np.zeros(dim, dtype=bool)
     sensor_map[sen_loc_arr.T[1], sen_loc_arr.T[0]] = 1
     
     fig, ax, im, cbar = initialize_map(sensor_map)
     fig.canvas.draw_idle()
-    plt.pause(1)
-
-    for it, i in enumerate(epochs_to_show):
-        cbar.remove()
-        im.remove()
-
+    # the data is shown with the default colormap, scaled to each epoch
+    im.set_cmap(plt.rcParams['image.cmap'])
+    anim = EvolutionAnimation(
+        [fig], epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='raw_data', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    anim.add_artist(fig, cbar.ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    anim.start()
+
+    for it, i in anim.frames():
         dmap = np.zeros(dim) + np.nan
         try:
             dmap[sen_loc_arr.T[1], sen_loc_arr.T[0]] = data.loc[i].values
@@ -1352,16 +1727,20 @@ def plot_evolution_raw_data(
         dmap[sen_loc_arr[38][1], sen_loc_arr[38][0]] = np.nan 
         dmap[sen_loc_arr[44][1], sen_loc_arr[44][0]] = np.nan 
         dmap[sen_loc_arr[43][1], sen_loc_arr[43][0]] = np.nan 
-        im, cbar = plot_data_map(fig, ax, dmap)
+        im.set_data(dmap)
+        if not np.all(np.isnan(dmap)):
+            im.set_clim(np.nanmin(dmap), np.nanmax(dmap))
 
-        fig.suptitle("Epoch: {} / Time: {}".format(
+        ttl.set_text("Epoch: {} / Time: {}".format(
             i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_evolution_rej(
         det_res, dim, epochs_to_show, global_start_time, tsEpochDuration,
         sen_cds, name, anchor_cds=np.zeros((0, 2)), click=False,
-        time_between_updates=.5, sen_only=True, figsize=(8,8), **kwargs):
+        time_between_updates=.5, sen_only=True, figsize=(8,8),
+        save_dir=None, video=None, time_agg=None, **kwargs):
     """Plots the evolution of detection results for given epochs.
 
     Parameters
@@ -1394,18 +1773,20 @@ def plot_evolution_rej(
         If only sensor lfdrs to be shown, by default True
     figsize : tuple, optional
         The size of the figures, by default (8,8).
+    save_dir : str, optional
+        If given, the frames are saved as png files to this directory instead
+        of being shown, by default None.
+    video : VideoExport, optional
+        If given, the frames (of the chunk of epochs specified by video) are
+        encoded to videos instead of being shown, by default None.
+    time_agg : TimeAggregation, optional
+        If given, consecutive epochs are aggregated into one frame as
+        specified, by default None. Frames are labeled with the first epoch
+        they show.
     """
-
-    if not click:
-        next_frame_time = 1/(np.arange(epochs_to_show.size) + 1)
-        next_frame_time = np.ones(epochs_to_show.size) * time_between_updates
-        # is numpy array
-        def get_next_frame(i):
-            plt.pause(next_frame_time[i])
-    else:
-        print("Press any key for advancing to next epochs!")
-        def get_next_frame(i):
-            plt.waitforbuttonpress()
+    if time_agg is not None:
+        det_res = time_agg.detection_result(det_res)
+        epochs_to_show = time_agg.epochs(epochs_to_show)
 
     if np.sum(np.isnan(det_res.r_tru)) == np.prod(det_res.r_det.shape):
         legend_lst = ['non-discovery', 'discovery']
@@ -1418,7 +1799,7 @@ def plot_evolution_rej(
         dat = [det_res.u, det_res.s, det_res.v, det_res.t]
 
     # Set up the colormap
-    cmap_det = [colors.to_rgb(x) for x in col_lst]
+    cmap_det = get_det_palette(col_lst)
 
     sensor_map = np.zeros(dim, dtype=bool) + np.nan
     sensor_map[sen_cds[:, 1], sen_cds[:, 0]] = 1
@@ -1441,34 +1822,28 @@ def plot_evolution_rej(
     show_sensors_in_field(np.array([sen_cds[:, 1], sen_cds[:, 0]]) -.5,
                           color='black', linewidth=1, ax=ax)
 
-    plt.pause(1)
-
-    for it, i in enumerate(epochs_to_show):
-        im.remove()
-
-        if sen_only:    
-            dmap = np.zeros(dim, dtype=int)
-            for idx, this_dat in enumerate(dat):
-                dmap[sen_cds[this_dat[it]==1, 1],
-                     sen_cds[this_dat[it]==1, 0]] = idx
-        else:
-            dmap = np.zeros(np.prod(dim), dtype=int)
-            for idx, this_dat in enumerate(dat):
-                dmap[this_dat[it]==1] = idx
-            dmap = dmap.reshape(dim)
-    
-        dat_to_show = np.array([[cmap_det[i] for i in j] for j in dmap])
-        im = ax.imshow(dat_to_show, origin="lower")
-        patches = [mpatches.Patch(color=cmap_det[i],label=legend_lst[i])
-                   for i, entry in enumerate(cmap_det)]
-        ax.legend(handles=patches)
-
-        # cbar = fig.colorbar(im)
-        fig.canvas.draw_idle()
-
-        fig.suptitle("{} - epoch: {} / Time: {}".format(
+    patches = [mpatches.Patch(color=cmap_det[i],label=legend_lst[i])
+               for i, entry in enumerate(cmap_det)]
+    ax.legend(handles=patches)
+
+    anim = EvolutionAnimation(
+        [fig], epochs_to_show, click=click,
+        time_between_updates=time_between_updates, save_dir=save_dir,
+        file_prefix='rej', video=video)
+    anim.add_artist(fig, im)
+    anim.add_overlays(ax)
+    ttl = anim.add_title(fig, "sensor locations")
+    anim.start()
+
+    for it, i in anim.frames():
+        dmap = get_det_map([this_dat[it] for this_dat in dat], dim,
+                           sen_cds=sen_cds if sen_only else None)
+        im.set_data(cmap_det[dmap])
+
+        ttl.set_text("{} - epoch: {} / Time: {}".format(
                 name, i, get_time(global_start_time, i, tsEpochDuration)))
-        get_next_frame(it)
+        anim.next_frame(it)
+    anim.stop()
 
 def plot_pval_map(fig, ax, data, cmap=my_cmap, vmin=0, vmax=1):
     im = ax.imshow(data, origin="lower", vmin=vmin, vmax=vmax, cmap=my_cmap)
@@ -1634,228 +2009,4 @@ def get_sen_loc_arrary(dim, sen_loc):
 
 
 # %% Running the fusion center
-def calculate_current_epoch_index(time_now, time_at_start, epoch_duration):
-    """Calculates the current epoch index from current given time, start of
-    global time and duration of an epoch.
-
-    Parameters
-    ----------
-    time_now : datetime.datetime
-        The current time.
-    time_at_start : datetime.datetime
-        The start of the global time.
-    epoch_duration : int
-        The duration of one epoch in milliseconds.
-
-    Returns
-    -------
-    int
-        The current epoch index.
-    """
-    if datetime.datetime.now() > time_at_start:
-        epoch_idx = int(int((time_now - time_at_start).total_seconds() * 1000)
-                        / epoch_duration)
-    else:
-        epoch_idx = -1
-    return epoch_idx
-
-def create_csv_datafile(filename):
-    """This function creates an empty csv data file to store the test
-    statistics from a node received by the fusion center and stores it under
-    the given absolute filename.
-
-    Parameters
-    ----------
-    filename : String
-        The desired filename
-    """
-    df = pd.DataFrame({'epoch': [], 'temp': [], 'humid': []})
-    df.to_csv(filename, index=False)
-
-def restart_serial(spn):
-    """Returns if given serial port name is accessible. 
-
-    Parameters
-    ----------
-    spn : String
-        The serial port name in question.
-
-    Returns
-    -------
-    serial.Serial or None
-        If the serial port name is accessible, return new serial.Serial object
-        representing the FC's Arduino nano. Else returns None.
-    """
-    try:
-        fc = serial.Serial(spn, 9600, timeout=1)
-        return fc
-    except OSError:
-        return None
-
-def pass_time_to_nano(fc, start_glob_time_at, tsEpochDuration, nano_pn_lst,
-                      wait_for_serial_seconds):
-    """Passes the current global time to the arduino nano.
-
-    Parameters
-    ----------
-    fc : serial.Serial
-        The object representing the fc receiver microcontroller (arduino nano)
-    start_glob_time_at : datetime.datetime
-        The start of the global time.
-    tsEpochDuration : int
-        The duration of one epoch in milliseconds.
-    nano_pn_lst : list of String
-        The list of all potential port names of the Arduino Nano.
-    wait_for_serial_seconds : int
-        the number of seconds after which we reboot if finding a serial was not
-        successful.
-    Returns
-    -------
-    serial.Serial
-        Serial object representing the port to which the Nano is attached. Must
-        be returned here, as object might change while in this function.
-    """
-
-    # Initialize, needed for making sure we are at beginnig of epoch
-    prevEpochIdx = calculate_current_epoch_index(
-        datetime.datetime.now(), start_glob_time_at, tsEpochDuration)
-    
-    globTimePattern = r'^Enter globTimeInput'
-
-    time_passed_to_nano = False
-
-    start_passing_at_time = datetime.datetime.now()
-    while not time_passed_to_nano:
-        currentEpochIdx = calculate_current_epoch_index(
-            datetime.datetime.now(), start_glob_time_at,
-            tsEpochDuration)
-        if currentEpochIdx >= 0:
-            try:
-                # now wait for the start of the next epoch to get perfect sync
-                if currentEpochIdx > prevEpochIdx:
-                    print(
-                        "Seconds passed since start of global time: {}".format(
-                        int((datetime.datetime.now()
-                             - start_glob_time_at).total_seconds())))
-                    while True:
-                        if (
-                            (datetime.datetime.now() -
-                             start_passing_at_time).seconds
-                             > wait_for_serial_seconds):
-                            return None
-                        if fc.in_waiting > 0:
-                            line = fc.readline().decode().strip()
-                            print(line)
-                            if re.match(globTimePattern, line):
-                                fc.write("{}".format(int((
-                                    datetime.datetime.now()
-                                    -start_glob_time_at).total_seconds()
-                                    * 1000)).encode())
-                                print(fc.readline().decode().strip())
-                                break
-                    time_passed_to_nano = True
-            except OSError:
-                # when there is nothing found on the serial port
-                print("Connection to serial was lost. Waiting for serial...")
-                serial_found = False
-                while not serial_found:
-                    for cand_pn in nano_pn_lst:
-                        fc = restart_serial(cand_pn)
-                        if fc is not None:
-                            print("Serial found!")
-                            serial_found = True
-                            break
-                time_passed_to_nano = False
-                prevEpochIdx = calculate_current_epoch_index(
-                    datetime.datetime.now(), start_glob_time_at,
-                    tsEpochDuration)
-        else:
-            print("Global time starts only at {}".format(start_glob_time_at))
-            prevEpochIdx = currentEpochIdx
-    return fc
-
-def reboot(rebooter):
-    """Reboot the nano microcontroller by triggering the reset pin via the
-    rebooter Uno.
-
-    Parameters
-    ----------
-    rebooter : serial.Serial
-        The object representing the rebooter microcontroller (arduino uno)
-    """
-    time.sleep(2)
-    rebooter.write("1".encode())
-    time.sleep(5)# this is crucial! Need to wait a bit for the pin to fire.
-
-def send_telegram_message(message):
-    """Sends the given message to subscribers of the telegram bot.
-
-    Parameters
-    ----------
-    message : String
-        The message to be send via the telegram bot
-    """
-    bot_token = "INSERTYOUROWNBOTTOKEN"  if you want to have a telegram bot, otherwise comment out
-    chat_id = "INSERTYOUR CHATID"
-    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-    payload = {"chat_id": chat_id, "text": message}
-    response = requests.post(url, json=payload)
-    #if response.status_code == 200:
-        #print("Telegram-Nachricht erfolgreich gesendet.")
-    #else:
-    #    print("Fehler beim Senden der Telegram-Nachricht.")
-
-def write_data_buffer_to_csv(data_buffer, this_node, data_directory,
-                             backup_directory, backup_key):
-    """This function writes the current data buffer of the fusion center to a
-    csv file.
-
-    Parameters
-    ----------
-    data_buffer : numpy array
-        array of size M x 3, where M is the number of epochs the FC currently
-        has data buffered for. First, second and third column are epoch index,
-        temperature and humidity test statistics, respectively.
-    this_node : int
-        the number of the node the data was received from.
-    data_directory : String
-        The absolute path were the file should be stored.
-    backup_directory : String
-        The absolute path were the backup file should be stored.
-    backup_key : String
-        Previously generated string that makes the backup file unique.
-    """
-    # create filename
-    filename = 'Node' + str(this_node) + '_data'
-    abs_filename = os.path.join(data_directory, filename + '.csv')
-    abs_filename_backup = os.path.join(
-        backup_directory, filename + '_' + backup_key + '.csv')
-
-    # check if file exists, otherwise create new
-    if not os.path.exists(data_directory):
-        os.makedirs(data_directory)
-    if not os.path.exists(backup_directory):
-        os.makedirs(backup_directory)
-
-    if not os.path.exists(abs_filename):
-        create_csv_datafile(abs_filename)
-    if not os.path.exists(abs_filename_backup):
-        create_csv_datafile(abs_filename_backup)
-
-    # first load existing files
-    df = pd.read_csv(abs_filename)
-    df_backup = pd.read_csv(abs_filename_backup)
-
-    # now append data in buffer to data frame created from existing file
-    for i in np.arange(data_buffer.shape[0]):
-        if (data_buffer[i, 0] != 0):
-            new_row = {'epoch': int(data_buffer[i, 0]),
-                       'temp': data_buffer[i, 1], 'humid': data_buffer[i, 2]}
-            df =  pd.concat([df, pd.DataFrame([new_row])], ignore_index = True)
-            df_backup =  pd.concat([df_backup, pd.DataFrame([new_row])],
-                                   ignore_index = True)
-
-    # save dataframe of old and new data into file
-    df.to_csv(abs_filename, index=False, mode='w')
-    df_backup.to_csv(abs_filename_backup, index=False, mode='w')
-
+# see utilities.fc
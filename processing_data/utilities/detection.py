@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+lfdr-based detection for many nominal FDR levels at once.
+
+spatialmht's apply_lfdr_detection runs the lfdr procedure (bh_loc_bayes) once
+per nominal level, i.e., it sorts the lfdrs of every epoch len(alp_vec) times.
+Here, the lfdrs of each epoch are sorted once and the number of rejections for
+all nominal levels is read off the running means of the sorted lfdrs. The
+results are identical to those of bh_loc_bayes.
+"""
+import numpy as np
+import pandas as pd
+
+from spatialmht.detectors import DetectionResult
+
+
+def lfdr_detection_cube(lfdrs, alp_vec):
+    """Apply the lfdr procedure for all given nominal FDR levels.
+
+    For every epoch, the largest set of tests with the smallest lfdrs is
+    rejected for which the Bayesian FDR (the running mean of the sorted lfdrs)
+    does not exceed the nominal level. As in bh_loc_bayes, the last position
+    where the running mean is below the nominal level counts, even if the
+    running mean is not monotonic.
+
+    Parameters
+    ----------
+    lfdrs : numpy array
+        The n_MC x n lfdrs, NaN where no data was available.
+    alp_vec : numpy array
+        The vector of nominal FDR levels.
+
+    Returns
+    -------
+    tuple
+        The len(alp_vec) x n_MC x n boolean array, True for rejected tests,
+        and the n_MC x n boolean array, True where lfdrs are not NaN.
+    """
+    lfdrs = np.asarray(lfdrs, dtype=float)
+    alp_vec = np.atleast_1d(np.asarray(alp_vec, dtype=float))
+    n_MC, n = lfdrs.shape
+    n_alp = alp_vec.size
+    vld = ~np.isnan(lfdrs)
+
+    # same sort and running means as bh_loc_bayes. NaNs are sorted last and
+    # their running means are NaN, i.e., never below a nominal level.
+    srt_idx = np.argsort(lfdrs, axis=1)
+    bfdr = (1 / np.arange(1, n + 1)) * np.cumsum(
+        np.take_along_axis(lfdrs, srt_idx, axis=1), axis=1)
+    bfdr[np.isnan(bfdr)] = np.inf
+    # the minimum over all positions from k onward is below the nominal level
+    # iff the last position with a running mean below it is at least k
+    bfdr_min = np.minimum.accumulate(bfdr[:, ::-1], axis=1)[:, ::-1]
+
+    # index of the smallest nominal level every position is rejected for.
+    # Counting these per epoch and accumulating gives the number of
+    # rejections for every nominal level.
+    alp_srt_idx = np.argsort(alp_vec)
+    first_alp = np.searchsorted(alp_vec[alp_srt_idx], bfdr_min, side='left')
+    n_rej = np.empty((n_alp, n_MC), dtype=int)
+    n_rej[alp_srt_idx, :] = np.cumsum(np.bincount(
+        (first_alp + (n_alp + 1) * np.arange(n_MC)[:, np.newaxis]).ravel(),
+        minlength=n_MC * (n_alp + 1)).reshape(n_MC, n_alp + 1),
+        axis=1)[:, :n_alp].transpose()
+
+    # rank of every test within its epoch
+    rnk = np.empty((n_MC, n), dtype=int)
+    np.put_along_axis(rnk, srt_idx, np.arange(n)[np.newaxis, :], axis=1)
+    return rnk[np.newaxis, :, :] < n_rej[:, :, np.newaxis], vld
+
+
+class PackedArray(object):
+    """Read-only n_MC x n array that is unpacked from bits on access.
+
+    Indexing unpacks only the requested epochs (rows), so that, e.g.,
+    plotting one epoch after the other never needs the full dense array.
+    Converting to a numpy array unpacks everything.
+    """
+
+    def __init__(self, unpack, shape, dtype):
+        """Set up the view.
+
+        Parameters
+        ----------
+        unpack : callable
+            Returns the dense rows for a given vector of row indexes.
+        shape : tuple
+            The shape of the dense array.
+        dtype : numpy dtype
+            The type of the dense array.
+        """
+        self._unpack = unpack
+        self.shape = shape
+        self.dtype = np.dtype(dtype)
+        self.ndim = len(shape)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        out = self._unpack(np.arange(self.shape[0]))
+        return out if dtype is None else out.astype(dtype)
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        rows = np.arange(self.shape[0])[key[0]]
+        if np.ndim(rows) == 0:
+            return self._unpack(np.array([rows]))[0][key[1:]]
+        return self._unpack(rows)[(slice(None),) + key[1:]]
+
+    def __eq__(self, other):
+        return np.asarray(self) == other
+
+    def __ne__(self, other):
+        return np.asarray(self) != other
+
+
+class PackedTruth(object):
+    """Bit-packed ground truth indicators (0, 1 or NaN) of a field."""
+
+    def __init__(self, r_tru):
+        """Pack the ground truth.
+
+        Parameters
+        ----------
+        r_tru : numpy array
+            The n_MC x n ground truth, 0 for true H0, 1 for true H1 and NaN
+            where not known or not evaluated.
+        """
+        r_tru = np.asarray(r_tru)
+        self.shape = r_tru.shape
+        self.h0 = np.packbits(r_tru == 0, axis=1)
+        self.h1 = np.packbits(r_tru == 1, axis=1)
+
+    def unpack(self, rows):
+        """Return the ground truth of the given epochs.
+
+        Parameters
+        ----------
+        rows : numpy array
+            The epoch indexes.
+
+        Returns
+        -------
+        tuple
+            The boolean indicators of true H0 and true H1.
+        """
+        return (unpack_bits(self.h0[rows], self.shape[1]),
+                unpack_bits(self.h1[rows], self.shape[1]))
+
+
+def unpack_bits(bits, n):
+    """Unpack boolean rows that were packed with np.packbits along axis 1.
+
+    Parameters
+    ----------
+    bits : numpy array
+        The packed rows.
+    n : int
+        The number of entries per row before packing.
+
+    Returns
+    -------
+    numpy array
+        The boolean rows.
+    """
+    return np.unpackbits(bits, axis=1, count=n).astype(bool)
+
+
+class PackedDetectionResult(DetectionResult):
+    """Detection result that holds the discovery pattern as packed bits.
+
+    Has the same attributes as spatialmht's DetectionResult and can be used
+    wherever one is expected. r_det, r_tru and the per-test categories u, s,
+    v and t are unpacked on access, the per-epoch and averaged performance
+    measures are computed once when the result is created.
+    """
+
+    def __init__(self, nam, tar, thr, r_tru, rej, vld, sen=False):
+        """Store a detection result and compute the performance measures.
+
+        Parameters
+        ----------
+        nam : string
+            The identifier of this detection result.
+        tar : string
+            The performance quantity targetted to control.
+        thr : float
+            The nominal level of the targetted performance quantity.
+        r_tru : PackedTruth
+            The true discovery pattern, NaN where no data was available. Can
+            be shared between results.
+        rej : numpy array
+            The n_MC x n boolean detected discovery pattern.
+        vld : numpy array
+            The n_MC x n boolean indicator of where data was available.
+        sen : boolean, optional
+            Indicator for whether these results were obtained for sensors.
+            The default is False.
+        """
+        self.nam = nam
+        self.tar = tar
+        self.thr = thr
+        self.sen = sen
+        self._tru = r_tru
+        self._n = rej.shape[1]
+        self._rej = np.packbits(rej & vld, axis=1)
+        self._vld = np.packbits(vld, axis=1)
+
+        # same performance measures as DetectionResult
+        h0, h1 = r_tru.unpack(np.arange(rej.shape[0]))
+        num_det = np.sum(rej & vld, axis=1)
+        num_h1 = np.sum(h1, axis=1)
+        num_v = np.sum(rej & h0, axis=1)
+        self.fdp = num_v / (num_det + (num_det == 0) * 1)
+        self.tdp = np.sum(rej & h1, axis=1) / (num_h1 + (num_h1 == 0) * 1)
+        self.fdr = np.mean(self.fdp, axis=0)
+        self.pow = np.mean(self.tdp, axis=0)
+        self.fwer = np.sum(num_v > 0) / rej.shape[0]
+
+    def _unpack_r_det(self, rows):
+        r_det = unpack_bits(self._rej[rows], self._n).astype(float)
+        r_det[~unpack_bits(self._vld[rows], self._n)] = np.nan
+        return r_det
+
+    def _unpack_r_tru(self, rows):
+        h0, h1 = self._tru.unpack(rows)
+        r_tru = np.zeros(h0.shape) + np.nan
+        r_tru[h0] = 0
+        r_tru[h1] = 1
+        return r_tru
+
+    def _unpack_category(self, rows, det, h1):
+        rej = unpack_bits(self._rej[rows], self._n)
+        tru = self._tru.unpack(rows)[int(h1)]
+        return (tru & (rej == det)).astype(int)
+
+    def _view(self, unpack, dtype):
+        return PackedArray(unpack, (self._rej.shape[0], self._n), dtype)
+
+    @property
+    def r_det(self):
+        """The detected discovery pattern, NaN where no data was available."""
+        return self._view(self._unpack_r_det, float)
+
+    @property
+    def r_tru(self):
+        """The true discovery pattern, NaN where no data was available."""
+        return self._view(self._unpack_r_tru, float)
+
+    @property
+    def v(self):
+        """False discoveries."""
+        return self._view(
+            lambda rows: self._unpack_category(rows, True, False), int)
+
+    @property
+    def s(self):
+        """Correct discoveries."""
+        return self._view(
+            lambda rows: self._unpack_category(rows, True, True), int)
+
+    @property
+    def t(self):
+        """Missed discoveries."""
+        return self._view(
+            lambda rows: self._unpack_category(rows, False, True), int)
+
+    @property
+    def u(self):
+        """Correct non-discoveries."""
+        return self._view(
+            lambda rows: self._unpack_category(rows, False, False), int)
+
+
+def apply_lfdr_detection(lfdrs, r_tru, alp_vec, name, sen, packed=True):
+    """Obtain detection results with lfdrs. Drop-in for spatialmht's
+    apply_lfdr_detection.
+
+    Parameters
+    ----------
+    lfdrs : numpy array
+        An nMC x number of tests numpy array with lfdrs.
+    r_tru : numpy array
+        An nMC x number of tests numpy array of 0 and 1 indicating true H0 & H1
+    alp_vec : numpy array
+        Vector of nominal FDR levels.
+    name : str
+        The name of the detection procedure.
+    sen : boolean
+        Indicating if sensors only
+    packed : bool, optional
+        If the results are to be stored as packed bits, by default True.
+        Otherwise, spatialmht's dense DetectionResult is used.
+
+    Returns
+    -------
+    list
+        The detection result for each nominal FDR level.
+    """
+    rej, vld = lfdr_detection_cube(lfdrs, alp_vec)
+    det_res = []
+    if packed:
+        # as in DetectionResult, tests without data are taken out of the
+        # evaluation in the (shared) ground truth
+        r_tru[~vld] = np.nan
+        tru = PackedTruth(r_tru)
+        for idx in np.arange(0, alp_vec.size, 1):
+            det_res.append(PackedDetectionResult(
+                'lfdrs ' + name, 'fdr', alp_vec[idx], tru, rej[idx], vld,
+                sen=sen))
+        return det_res
+    for idx in np.arange(0, alp_vec.size, 1):
+        r_det = rej[idx].astype(float)
+        r_det[~vld] = np.nan
+        det_res.append(DetectionResult('lfdrs ' + name, 'fdr', alp_vec[idx],
+                                       r_tru, r_det, sen=sen))
+    return det_res
+
+
+def save_detection_results(path, det_res):
+    """Store detection results in a pickle file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the pickle file.
+    det_res : object
+        The detection results, e.g., a dict of lists of detection results.
+        Packed results are stored as packed bits.
+    """
+    pd.to_pickle(det_res, path)
+
+
+def load_detection_results(path):
+    """Load detection results stored with save_detection_results.
+
+    Parameters
+    ----------
+    path : str
+        The path of the pickle file.
+
+    Returns
+    -------
+    object
+        The detection results.
+    """
+    return pd.read_pickle(path)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Evaluation of detection results for many methods and nominal FDR levels.
+
+All performance measures are computed with reductions over the stacked
+detection results of all nominal levels of a method, instead of looping over
+epochs. The results are returned as one table with a row per method, nominal
+level and ground truth region.
+"""
+import numpy as np
+import pandas as pd
+
+
+def region_mask(crds, dim):
+    """Return the grid point indicator of a region.
+
+    Parameters
+    ----------
+    crds : numpy array
+        The n_crds x 2 (x, y) coordinates of the grid points in the region.
+    dim : tuple of int
+        The dimensions of the field.
+
+    Returns
+    -------
+    numpy array
+        Boolean vector of length prod(dim), True for the grid points in the
+        region, in the same order as r_det of the detection results.
+    """
+    crds = np.asarray(crds, dtype=int).reshape(-1, 2)
+    msk = np.zeros(dim, dtype=bool)
+    msk[crds[:, 1], crds[:, 0]] = True
+    return msk.ravel()
+
+
+def evaluate_detections(all_res, met_names, alp_vec, regions=None, dim=None,
+                        mc_idc=None):
+    """Compute the performance measures for all methods and nominal levels.
+
+    Parameters
+    ----------
+    all_res : list
+        One list per method, holding the DetectionResult for every nominal FDR
+        level, as returned by apply_lfdr_detection.
+    met_names : list
+        The names of the methods.
+    alp_vec : numpy array
+        The nominal FDR levels.
+    regions : dict, optional
+        Maps a region name to the n_crds x 2 (x, y) grid point coordinates of
+        a ground truth area, by default None. For each region, the
+        localization probability is computed, i.e., the share of epochs in
+        which at least one grid point in the region was a discovery.
+    dim : tuple of int, optional
+        The dimensions of the field. Only needed if regions are given.
+    mc_idc : numpy array, optional
+        The indexes of the epochs to be evaluated, by default None, which
+        evaluates all epochs.
+
+    Returns
+    -------
+    pandas DataFrame
+        One row per method, nominal level and region, with the columns
+        'method', 'alpha', 'region', 'loc_prob', 'fdr' (average FDP over the
+        evaluated epochs), 'pow' (average TDP) and 'n_epochs'. If no regions
+        are given, there is one row per method and nominal level with region
+        None and loc_prob NaN.
+    """
+    if regions is None:
+        regions = {}
+    if len(regions) > 0:
+        reg_nam = list(regions.keys())
+        # n x n_regions indicator matrix
+        reg_msk = np.stack(
+            [region_mask(regions[nam], dim) for nam in reg_nam], axis=1)
+    else:
+        reg_nam = [None]
+
+    tab = []
+    for met_res, met_nam in zip(all_res, met_names):
+        if mc_idc is None:
+            sel = slice(None)
+        else:
+            sel = np.asarray(mc_idc, dtype=int)
+        # n_alp x n_epochs
+        fdp = np.stack([res.fdp[sel] for res in met_res])
+        tdp = np.stack([res.tdp[sel] for res in met_res])
+        n_ep = fdp.shape[1]
+        if len(regions) > 0:
+            # n_alp x n_epochs x n_regions number of discoveries per region
+            n_reg_det = np.stack(
+                [(res.r_det[sel] == 1) for res in met_res]).astype(
+                    int) @ reg_msk.astype(int)
+            loc_prob = np.mean(n_reg_det > 0, axis=1)
+        else:
+            loc_prob = np.zeros((len(met_res), 1)) + np.nan
+        fdr = np.mean(fdp, axis=1)
+        pwr = np.mean(tdp, axis=1)
+        for alp_idx, alp in enumerate(alp_vec):
+            for reg_idx, nam in enumerate(reg_nam):
+                tab.append(
+                    {"method": met_nam, "alpha": alp, "region": nam,
+                     "loc_prob": loc_prob[alp_idx, reg_idx],
+                     "fdr": fdr[alp_idx], "pow": pwr[alp_idx],
+                     "n_epochs": n_ep})
+    return pd.DataFrame(
+        tab, columns=["method", "alpha", "region", "loc_prob", "fdr", "pow",
+                      "n_epochs"])
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Runtime helpers of the fusion center (FC).
+
+Used by run_fc.py on the FC host. Only what the FC needs at start-up is
+imported here, so that the FC comes back up quickly after a crash or reboot
+and the FC host does not need the analysis and plotting stack. pandas and
+requests are imported when first used.
+"""
+import datetime
+import os
+import re
+import time
+
+import numpy as np
+import serial
+
+# serial-like stand-ins by port name, opened instead of real ports, e.g., the
+# FakeNano and FakeUno of utilities.fc_replay
+fake_ports = {}
+
+# a record received by the FC: epoch index, temperature and humidity test
+# statistics and the node it was received from
+record_dtype = np.dtype([('epoch', '<i8'), ('temp', '<f8'), ('humid', '<f8'),
+                         ('node', '<u2')])
+
+def calculate_current_epoch_index(time_now, time_at_start, epoch_duration):
+    """Calculates the current epoch index from current given time, start of
+    global time and duration of an epoch.
+
+    Parameters
+    ----------
+    time_now : datetime.datetime
+        The current time.
+    time_at_start : datetime.datetime
+        The start of the global time.
+    epoch_duration : int
+        The duration of one epoch in milliseconds.
+
+    Returns
+    -------
+    int
+        The current epoch index.
+    """
+    if datetime.datetime.now() > time_at_start:
+        epoch_idx = int(int((time_now - time_at_start).total_seconds() * 1000)
+                        / epoch_duration)
+    else:
+        epoch_idx = -1
+    return epoch_idx
+
+def create_csv_datafile(filename):
+    """This function creates an empty csv data file to store the test
+    statistics from a node received by the fusion center and stores it under
+    the given absolute filename.
+
+    Parameters
+    ----------
+    filename : String
+        The desired filename
+    """
+    import pandas as pd
+
+    df = pd.DataFrame({'epoch': [], 'temp': [], 'humid': []})
+    df.to_csv(filename, index=False)
+
+def restart_serial(spn):
+    """Returns if given serial port name is accessible. 
+
+    Parameters
+    ----------
+    spn : String
+        The serial port name in question.
+
+    Returns
+    -------
+    serial.Serial or None
+        If the serial port name is accessible, return new serial.Serial object
+        representing the FC's Arduino nano. Else returns None.
+    """
+    if spn in fake_ports:
+        return fake_ports[spn].reopen()
+    try:
+        fc = serial.Serial(spn, 9600, timeout=1)
+        return fc
+    except OSError:
+        return None
+
+def wait_for_serial(nano_pn_lst, retry_seconds=1):
+    """Wait until one of the given serial ports is accessible.
+
+    Parameters
+    ----------
+    nano_pn_lst : list of String
+        The list of all potential port names of the Arduino Nano.
+    retry_seconds : float, optional
+        The number of seconds to sleep before trying all port names again, by
+        default 1.
+
+    Returns
+    -------
+    serial.Serial
+        The first accessible serial port.
+    """
+    while True:
+        for cand_pn in nano_pn_lst:
+            fc = restart_serial(cand_pn)
+            if fc is not None:
+                print("Serial found!")
+                return fc
+        time.sleep(retry_seconds)
+
+def sleep_until_next_epoch(start_glob_time_at, tsEpochDuration):
+    """Sleep until the next epoch starts, or until the global time starts if
+    it has not yet.
+
+    Parameters
+    ----------
+    start_glob_time_at : datetime.datetime
+        The start of the global time.
+    tsEpochDuration : int
+        The duration of one epoch in milliseconds.
+    """
+    time_now = datetime.datetime.now()
+    epoch_idx = calculate_current_epoch_index(
+        time_now, start_glob_time_at, tsEpochDuration)
+    wake_up_at = start_glob_time_at + (epoch_idx + 1) * datetime.timedelta(
+        milliseconds=tsEpochDuration)
+    time.sleep(max((wake_up_at - time_now).total_seconds(), 0))
+
+def pass_time_to_nano(fc, start_glob_time_at, tsEpochDuration, nano_pn_lst,
+                      wait_for_serial_seconds, retry_seconds=1):
+    """Passes the current global time to the arduino nano.
+
+    All waits block on the serial port (with its read timeout) or sleep,
+    instead of polling.
+
+    Parameters
+    ----------
+    fc : serial.Serial
+        The object representing the fc receiver microcontroller (arduino
+        nano). Must have a read timeout.
+    start_glob_time_at : datetime.datetime
+        The start of the global time.
+    tsEpochDuration : int
+        The duration of one epoch in milliseconds.
+    nano_pn_lst : list of String
+        The list of all potential port names of the Arduino Nano.
+    wait_for_serial_seconds : int
+        the number of seconds after which we reboot if finding a serial was not
+        successful.
+    retry_seconds : float, optional
+        The number of seconds between attempts to find the serial port again
+        after it was lost, by default 1.
+    Returns
+    -------
+    serial.Serial
+        Serial object representing the port to which the Nano is attached. Must
+        be returned here, as object might change while in this function. None
+        if the Nano did not ask for the time within wait_for_serial_seconds.
+    """
+    globTimePattern = r'^Enter globTimeInput'
+
+    start_passing_at_time = datetime.datetime.now()
+    while True:
+        if datetime.datetime.now() < start_glob_time_at:
+            print("Global time starts only at {}".format(start_glob_time_at))
+        # now wait for the start of the next epoch to get perfect sync
+        sleep_until_next_epoch(start_glob_time_at, tsEpochDuration)
+        print("Seconds passed since start of global time: {}".format(
+            int((datetime.datetime.now()
+                 - start_glob_time_at).total_seconds())))
+        try:
+            while True:
+                if ((datetime.datetime.now() - start_passing_at_time).seconds
+                    > wait_for_serial_seconds):
+                    return None
+                # blocks until a line arrives or the read timeout passes
+                line = fc.readline().decode().strip()
+                if not line:
+                    continue
+                print(line)
+                if re.match(globTimePattern, line):
+                    fc.write("{}".format(int((
+                        datetime.datetime.now()
+                        -start_glob_time_at).total_seconds()
+                        * 1000)).encode())
+                    print(fc.readline().decode().strip())
+                    return fc
+        except OSError:
+            # when there is nothing found on the serial port
+            print("Connection to serial was lost. Waiting for serial...")
+            fc = wait_for_serial(nano_pn_lst, retry_seconds=retry_seconds)
+
+def reboot(rebooter):
+    """Reboot the nano microcontroller by triggering the reset pin via the
+    rebooter Uno.
+
+    Parameters
+    ----------
+    rebooter : serial.Serial
+        The object representing the rebooter microcontroller (arduino uno)
+    """
+    time.sleep(2)
+    rebooter.write("1".encode())
+    time.sleep(5)# this is crucial! Need to wait a bit for the pin to fire.
+
+def send_telegram_message(message, timeout=10):
+    """Sends the given message to subscribers of the telegram bot.
+
+    Parameters
+    ----------
+    message : String
+        The message to be send via the telegram bot
+    timeout : float, optional
+        The number of seconds after which sending is given up, by default 10.
+    """
+    import requests
+
+    # if you want to have a telegram bot, insert your own token, otherwise
+    # comment out
+    bot_token = "INSERTYOUROWNBOTTOKEN"
+    chat_id = "INSERTYOUR CHATID"
+    url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
+    payload = {"chat_id": chat_id, "text": message}
+    response = requests.post(url, json=payload, timeout=timeout)
+    #if response.status_code == 200:
+        #print("Telegram-Nachricht erfolgreich gesendet.")
+    #else:
+    #    print("Fehler beim Senden der Telegram-Nachricht.")
+
+def get_node_csv_files(this_node, data_directory, backup_directory,
+                       backup_key):
+    """Returns the csv file of the node and its backup, which are created if
+    they do not exist yet.
+
+    Parameters
+    ----------
+    this_node : int
+        the number of the node.
+    data_directory : String
+        The absolute path were the file should be stored.
+    backup_directory : String
+        The absolute path were the backup file should be stored.
+    backup_key : String
+        Previously generated string that makes the backup file unique.
+
+    Returns
+    -------
+    tuple
+        The absolute paths of the csv file and of its backup.
+    """
+    # create filename
+    filename = 'Node' + str(this_node) + '_data'
+    abs_filename = os.path.join(data_directory, filename + '.csv')
+    abs_filename_backup = os.path.join(
+        backup_directory, filename + '_' + backup_key + '.csv')
+
+    # check if file exists, otherwise create new
+    if not os.path.exists(data_directory):
+        os.makedirs(data_directory)
+    if not os.path.exists(backup_directory):
+        os.makedirs(backup_directory)
+
+    if not os.path.exists(abs_filename):
+        create_csv_datafile(abs_filename)
+    if not os.path.exists(abs_filename_backup):
+        create_csv_datafile(abs_filename_backup)
+    return abs_filename, abs_filename_backup
+
+def write_records_to_csv(records, data_directory, backup_directory,
+                         backup_key, skip_present=False):
+    """This function appends received records to the csv files of their nodes
+    and to the backups.
+
+    Parameters
+    ----------
+    records : numpy array
+        The records, of type record_dtype. Every record is stored, including
+        those of epoch 0.
+    data_directory : String
+        The absolute path were the files should be stored.
+    backup_directory : String
+        The absolute path were the backup files should be stored.
+    backup_key : String
+        Previously generated string that makes the backup files unique.
+    skip_present : bool, optional
+        If True, records whose epoch is already in a file of their node are
+        not appended to that file again, e.g., when replaying records that
+        were partly written before, by default False.
+    """
+    import pandas as pd
+
+    for this_node in np.unique(records['node']):
+        rec = records[records['node'] == this_node]
+        for abs_filename in get_node_csv_files(
+                int(this_node), data_directory, backup_directory, backup_key):
+            rec_file = rec
+            if skip_present:
+                present = pd.read_csv(abs_filename, usecols=['epoch'])['epoch']
+                rec_file = rec[~np.isin(rec['epoch'], present.values)]
+            # otherwise, the existing data is neither read nor rewritten
+            df = pd.DataFrame({'epoch': rec_file['epoch'],
+                               'temp': rec_file['temp'],
+                               'humid': rec_file['humid']})
+            df.to_csv(abs_filename, index=False, header=False, mode='a')
+
+def write_data_buffer_to_csv(data_buffer, this_node, data_directory,
+                             backup_directory, backup_key):
+    """This function appends the current data buffer of the fusion center to
+    the csv file of the node and to its backup.
+
+    Parameters
+    ----------
+    data_buffer : numpy array
+        array of size M x 3, where M is the number of epochs the FC currently
+        has data buffered for. First, second and third column are epoch index,
+        temperature and humidity test statistics, respectively. Rows with epoch
+        index 0 are considered empty and skipped.
+    this_node : int
+        the number of the node the data was received from.
+    data_directory : String
+        The absolute path were the file should be stored.
+    backup_directory : String
+        The absolute path were the backup file should be stored.
+    backup_key : String
+        Previously generated string that makes the backup file unique.
+    """
+    get_node_csv_files(this_node, data_directory, backup_directory, backup_key)
+    rows = data_buffer[data_buffer[:, 0] != 0]
+    records = np.zeros(rows.shape[0], dtype=record_dtype)
+    records['epoch'] = rows[:, 0]
+    records['temp'] = rows[:, 1]
+    records['humid'] = rows[:, 2]
+    records['node'] = this_node
+    write_records_to_csv(records, data_directory, backup_directory,
+                         backup_key)
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The buffer the fusion center (FC) collects received records in.
+
+The Nano transmits the records of a connection with queue indices 0, 1, ...,
+each into its slot of the buffer. Which slots are occupied is tracked
+explicitly, so that records of epoch 0 are kept, emptiness is known without
+scanning the buffer and only the filled part needs to be looked at. The buffer
+is allocated once and reused after every flush.
+"""
+import numpy as np
+
+from utilities.fc import record_dtype
+
+
+class RecordBuffer(object):
+    """Fixed-size buffer of records, indexed by queue index."""
+
+    def __init__(self, size):
+        """Allocate the buffer.
+
+        Parameters
+        ----------
+        size : int
+            The number of slots, i.e., the largest queue index plus one.
+        """
+        self.size = size
+        self.records = np.zeros(size, dtype=record_dtype)
+        self.occupied = np.zeros(size, dtype=bool)
+        self.n_filled = 0
+        self.max_queue_idx = -1
+
+    def __len__(self):
+        return self.n_filled
+
+    @property
+    def is_empty(self):
+        """True if no slot is occupied."""
+        return self.n_filled == 0
+
+    def put(self, queue_idx, node, epoch, temp, humid):
+        """Store a record in its slot. A record received earlier for the same
+        queue index is overwritten.
+
+        Parameters
+        ----------
+        queue_idx : int
+            The queue index of the record.
+        node : int
+            The node the record was received from.
+        epoch : int
+            The epoch index.
+        temp : float
+            The temperature test statistic.
+        humid : float
+            The humidity test statistic.
+
+        Raises
+        ------
+        IndexError
+            If the queue index does not fit into the buffer.
+        """
+        if not 0 <= queue_idx < self.size:
+            raise IndexError(
+                "Queue index {} out of range of the buffer of size {}".format(
+                    queue_idx, self.size))
+        if not self.occupied[queue_idx]:
+            self.occupied[queue_idx] = True
+            self.n_filled = self.n_filled + 1
+        self.records[queue_idx] = (epoch, temp, humid, node)
+        self.max_queue_idx = max(self.max_queue_idx, queue_idx)
+
+    def get_filled(self):
+        """Return the filled part of the buffer, without copying.
+
+        Returns
+        -------
+        tuple
+            Views of the records and of the occupied slots up to the highest
+            queue index received. Valid until the buffer is cleared.
+        """
+        end = self.max_queue_idx + 1
+        return self.records[:end], self.occupied[:end]
+
+    def take(self):
+        """Return the received records and clear the buffer.
+
+        Returns
+        -------
+        numpy array
+            The records of the occupied slots, in the order of their queue
+            indices, of type record_dtype. They are a copy, so that the buffer
+            can be refilled while they are written.
+        """
+        records, occupied = self.get_filled()
+        if self.n_filled == records.shape[0]:
+            taken = records.copy()
+        else:
+            taken = records[occupied]
+        self.clear()
+        return taken
+
+    def clear(self):
+        """Mark all slots as free."""
+        self.occupied[:self.max_queue_idx + 1] = False
+        self.n_filled = 0
+        self.max_queue_idx = -1
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Notifications of the fusion center (FC).
+
+Notifications are queued and sent by a background thread, so that a slow or
+unreachable endpoint never stalls the reception of data. Repeated alerts are
+counted instead of being sent each time, and at most one (batched) message is
+sent per interval. Where messages go is decided by a sink, i.e., any function
+that takes the message, e.g., send_telegram_message, print or a FileSink.
+"""
+import datetime
+import queue
+import threading
+import time
+
+
+class FileSink(object):
+    """Appends messages to a local file, a stand-in for the telegram bot."""
+
+    def __init__(self, path):
+        """Set up the sink.
+
+        Parameters
+        ----------
+        path : String
+            The file the messages are appended to.
+        """
+        self.path = path
+
+    def __call__(self, message):
+        with open(self.path, 'a') as f:
+            f.write("{} {}\n".format(
+                datetime.datetime.now().strftime("%Y-%m-%d, %H:%M:%S"),
+                message))
+
+
+class Notifier(threading.Thread):
+    """Sends notifications in the background, deduplicated and rate limited.
+    """
+
+    def __init__(self, sink, maxsize=100, min_interval=60, dedup_window=600):
+        """Set up the notifier. Start it with start.
+
+        Parameters
+        ----------
+        sink : callable
+            Sends one message (a String), e.g., send_telegram_message.
+        maxsize : int, optional
+            The maximum number of queued notifications, by default 100. Further
+            notifications are dropped and counted in dropped.
+        min_interval : float, optional
+            The minimum number of seconds between two messages, by default 60.
+            Notifications in between are batched into one message.
+        dedup_window : float, optional
+            A notification identical to one sent less than this many seconds
+            ago is held back and sent with its number of repetitions once the
+            window has passed, by default 600.
+        """
+        super().__init__(name='notifier', daemon=True)
+        self.sink = sink
+        self.min_interval = min_interval
+        self.dedup_window = dedup_window
+        self.dropped = 0
+        # notify and the notifier thread both update dropped
+        self._dropped_lock = threading.Lock()
+        self._queue = queue.Queue(maxsize)
+        self._pending = {}  # message -> number of repetitions, ordered
+        self._last_sent = {}  # message -> time it was last sent
+        self._next_send_at = 0
+
+    def notify(self, message):
+        """Queue a notification. Never blocks.
+
+        Parameters
+        ----------
+        message : String
+            The notification.
+        """
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped = self.dropped + 1
+
+    def stop(self):
+        """Send what is pending, regardless of rate limits, and wait for the
+        notifier to finish."""
+        self._queue.put(None)
+        self.join()
+
+    def _get_due_at(self, msg):
+        # when the dedup window of a message has passed
+        return self._last_sent.get(msg, -float('inf')) + self.dedup_window
+
+    def _get_timeout(self, now):
+        if not self._pending:
+            return None
+        send_at = max(self._next_send_at, min(
+            self._get_due_at(msg) for msg in self._pending))
+        return max(send_at - now, 0)
+
+    def _send(self, now, force=False):
+        due = [msg for msg in self._pending
+               if force or self._get_due_at(msg) <= now]
+        if not due:
+            return
+        lines = []
+        for msg in due:
+            count = self._pending.pop(msg)
+            lines.append(msg if count == 1 else "{} (x{})".format(msg, count))
+            self._last_sent[msg] = now
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped > 0:
+            lines.append("{} notifications were dropped.".format(dropped))
+        self._next_send_at = now + self.min_interval
+        try:
+            self.sink("\n".join(lines))
+        except Exception as e:
+            print("Sending notification failed: {}".format(e))
+
+    def run(self):
+        while True:
+            try:
+                msg = self._queue.get(timeout=self._get_timeout(
+                    time.monotonic()))
+            except queue.Empty:
+                msg = ''
+            if msg is None:
+                self._send(time.monotonic(), force=True)
+                return
+            if msg:
+                self._pending[msg] = self._pending.get(msg, 0) + 1
+            now = time.monotonic()
+            if now >= self._next_send_at:
+                self._send(now)
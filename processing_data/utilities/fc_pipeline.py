@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Threaded reception of the fusion center (FC).
+
+The serial port of the FC's Nano is drained by a dedicated reader thread into
+a queue of timestamped lines, so that no transmissions are lost while the main
+loop of run_fc.py parses lines, reboots the Nano or waits for the disk. The
+records taken from the buffer of received test statistics are handed to a
+writer thread that stores them in the csv files and the node store. The
+depths of both queues can be monitored.
+"""
+import datetime
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+from utilities.fc import write_records_to_csv
+
+
+class MonitoredQueue(queue.Queue):
+    """FIFO queue that keeps track of the largest depth it has reached."""
+
+    def __init__(self, maxsize=0):
+        """Set up the queue.
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            The maximum number of items, by default 0, i.e., unbounded.
+        """
+        super().__init__(maxsize)
+        self.max_depth = 0
+
+    def _put(self, item):
+        super()._put(item)
+        self.max_depth = max(self.max_depth, len(self.queue))
+
+
+class SerialReader(threading.Thread):
+    """Reads all lines the Nano writes to the serial port into a queue.
+
+    Every line is queued as tuple of the time it was received and the decoded
+    line. If the serial port is lost, or there is none when the reader starts,
+    (time, None) is queued and reading pauses until a new serial port is set
+    with set_serial.
+    """
+
+    def __init__(self, ser):
+        """Set up the reader. Start it with start.
+
+        Parameters
+        ----------
+        ser : serial.Serial or None
+            The serial port of the Nano. Must have a read timeout, so that the
+            reader can be stopped. None, e.g., if pass_time_to_nano failed,
+            counts as a lost port.
+        """
+        super().__init__(name='serial reader', daemon=True)
+        self.lines = MonitoredQueue()
+        self._ser = ser
+        self._cond = threading.Condition()
+        self._stopping = False
+
+    def set_serial(self, ser):
+        """Continue reading from another serial port, e.g., after the Nano was
+        reconnected.
+
+        Parameters
+        ----------
+        ser : serial.Serial or None
+            The serial port. None pauses reading.
+        """
+        with self._cond:
+            self._ser = ser
+            self._cond.notify_all()
+
+    def stop(self):
+        """Stop reading and wait for the reader to finish."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self.join()
+
+    def run(self):
+        with self._cond:
+            if self._ser is None:
+                # let the main loop reconnect, as if the port was lost
+                self.lines.put((datetime.datetime.now(), None))
+        while True:
+            with self._cond:
+                while self._ser is None and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                ser = self._ser
+            try:
+                # blocks until a line arrives or the read timeout passes
+                raw = ser.readline()
+            except (OSError, AttributeError, TypeError):
+                # the port vanished, e.g., because the Nano was rebooted
+                with self._cond:
+                    if self._ser is ser:
+                        self._ser = None
+                self.lines.put((datetime.datetime.now(), None))
+                continue
+            if raw:
+                self.lines.put((datetime.datetime.now(),
+                                raw.decode(errors='replace').strip()))
+
+
+class CsvWriter(threading.Thread):
+    """Stores the records handed to it in the csv files, one batch after the
+    other."""
+
+    def __init__(self, data_directory, backup_directory, backup_key,
+                 node_store=None):
+        """Set up the writer. Start it with start.
+
+        Parameters
+        ----------
+        data_directory : String
+            The absolute path were the files should be stored.
+        backup_directory : String
+            The absolute path were the backup files should be stored.
+        backup_key : String
+            Previously generated string that makes the backup files unique.
+        node_store : NodeStore, optional
+            If given, the records are also appended to this store, by default
+            None.
+        """
+        super().__init__(name='csv writer', daemon=True)
+        self.jobs = MonitoredQueue()
+        self.data_directory = data_directory
+        self.backup_directory = backup_directory
+        self.backup_key = backup_key
+        self.node_store = node_store
+
+    def submit(self, records, wal_segment=None):
+        """Queue received records for writing. The records must not be
+        changed afterwards.
+
+        Parameters
+        ----------
+        records : numpy array
+            The records, as expected by write_records_to_csv, e.g., taken from
+            a RecordBuffer.
+        wal_segment : String, optional
+            The closed write-ahead log segment holding the records, removed
+            once they are written, by default None.
+        """
+        self.jobs.put((records, wal_segment))
+
+    def stop(self):
+        """Write all queued records and wait for the writer to finish."""
+        self.jobs.put(None)
+        self.join()
+
+    def run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            records, wal_segment = job
+            try:
+                write_records_to_csv(
+                    records, self.data_directory, self.backup_directory,
+                    self.backup_key)
+                if self.node_store is not None:
+                    self.node_store.append(records)
+                # the records are safe in the csv files now. If writing
+                # failed, the segment is replayed at the next start-up, which
+                # skips what was stored before the failure.
+                if wal_segment is not None:
+                    os.remove(wal_segment)
+            except Exception as e:
+                # whatever went wrong, the writer has to keep going, or all
+                # later records would only pile up in the queue
+                print("Writing the data of node(s) {} failed: {!r}".format(
+                    np.unique(records['node']), e))
+
+
+def parse_data_line(line, precisionTS):
+    """Turn a data line of the Nano into a record.
+
+    Parameters
+    ----------
+    line : String
+        The line, formatted as Node<node>,<temp>,<humid>,<epoch>,<queue index>
+        where the test statistics are integers scaled by 10**precisionTS,
+        whose last two digits are a suffix.
+    precisionTS : int
+        The number of decimals the test statistics were transmitted with.
+
+    Returns
+    -------
+    tuple
+        The node, the queue index, the epoch index and the temperature and
+        humidity test statistics.
+    """
+    values = line.split(",")
+    data_sfx = int(values[1])%100
+    return (int(values[0][4:]), int(values[4]), int(values[3]),
+            (int(values[1]) - data_sfx) / (10**precisionTS),
+            (int(values[2]) - data_sfx) / (10**precisionTS))
+
+
+def wait_for_line(lines, pattern, timeout=None):
+    """Wait for the next line from the reader that contains the given pattern.
+    Lines in between are dropped.
+
+    Parameters
+    ----------
+    lines : queue.Queue
+        The lines queued by a SerialReader.
+    pattern : String
+        The regular expression searched for.
+    timeout : float, optional
+        The maximum number of seconds to wait, by default None, i.e., no limit.
+
+    Returns
+    -------
+    String
+        The line.
+
+    Raises
+    ------
+    OSError
+        If the serial port was lost while waiting.
+    TimeoutError
+        If no such line arrived in time.
+    """
+    if timeout is not None:
+        deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, line = lines.get(timeout=None if timeout is None else max(
+                deadline - time.monotonic(), 0))
+        except queue.Empty:
+            raise TimeoutError("No line with {} within {} s".format(
+                pattern, timeout))
+        if line is None:
+            raise OSError("Serial port was lost")
+        if re.search(pattern, line):
+            return line
+
+
+def get_queue_depths(reader, writer):
+    """Return a summary of how much work waits in the queues.
+
+    Parameters
+    ----------
+    reader : SerialReader
+        The serial reader.
+    writer : CsvWriter
+        The csv writer.
+
+    Returns
+    -------
+    String
+        The current and maximum number of queued lines and buffers.
+    """
+    return "Queued lines: {} (max {}), queued buffers: {} (max {})".format(
+        reader.lines.qsize(), reader.lines.max_depth, writer.jobs.qsize(),
+        writer.jobs.max_depth)
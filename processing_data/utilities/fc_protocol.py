@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The serial protocol between the fusion center (FC) script and its Nano.
+
+Lines are told apart by their beginning, with precompiled patterns, so that
+the frequent data lines are recognized with a cheap prefix check first. The
+parameter prompts of the Nano ("Enter <parameter>:", confirmed with
+"<parameter> set to: <value>") are answered from a table that maps every
+parameter name to its value.
+"""
+import re
+
+from utilities.fc_pipeline import wait_for_line
+
+data_prefix = 'Node'
+data_pattern = re.compile(r'Node\d+,\d+,\d+,\d+,\d+$')
+prompt_pattern = re.compile(r'Enter (\w+):')
+
+
+def is_data_line(line):
+    """Return if the line holds test statistics sent by a node.
+
+    Parameters
+    ----------
+    line : String
+        The line received from the Nano.
+
+    Returns
+    -------
+    bool
+        True for lines Node<node>,<temp>,<humid>,<epoch>,<queue index>.
+    """
+    return line.startswith(data_prefix) and data_pattern.match(line) is not None
+
+
+class ParameterHandshake(object):
+    """Answers the parameter prompts of the Nano from a table."""
+
+    def __init__(self, lines, parameters, timeout=10):
+        """Set up the handshake.
+
+        Parameters
+        ----------
+        lines : queue.Queue
+            The lines queued by a SerialReader.
+        parameters : dict
+            Maps the parameter names the Nano asks for to their values. Values
+            that change while the FC is running are given as functions
+            without arguments returning the current value.
+        timeout : float, optional
+            The number of seconds to wait for the Nano to confirm a parameter,
+            by default 10.
+        """
+        self.lines = lines
+        self.parameters = parameters
+        self.timeout = timeout
+
+    def answer(self, ser, line):
+        """Answer the line if it is a parameter prompt.
+
+        Parameters
+        ----------
+        ser : serial.Serial
+            The serial port of the Nano.
+        line : String
+            The line received from the Nano.
+
+        Returns
+        -------
+        bool
+            True if the line was a prompt for one of the parameters.
+        """
+        if not line.startswith('Enter '):
+            return False
+        match = prompt_pattern.match(line)
+        if match is None or match.group(1) not in self.parameters:
+            return False
+        name = match.group(1)
+        value = self.parameters[name]
+        if callable(value):
+            value = value()
+        ser.write("{}".format(value).encode())
+        try:
+            print(wait_for_line(self.lines, '^' + re.escape(name) + ' set to',
+                                timeout=self.timeout))
+        except TimeoutError:
+            print("{} was not confirmed by the Nano within {} s".format(
+                name, self.timeout))
+        return True
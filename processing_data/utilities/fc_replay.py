@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Replay of recorded data through a simulated Nano, for running the fusion
+center (FC) without hardware.
+
+FakeNano is a serial-like stand-in for the FC's Nano. It goes through the same
+serial protocol as fc_ts_only.ino: it asks for the global time and the
+parameters, then connects to the nodes one after the other and transmits the
+test statistics recorded in the csv files of an experiment (csv/<experiment>),
+as Node<node>,<temp>,<humid>,<epoch>,<queue index> lines, each connection
+ending with a disconnect. Soft resets can be injected, and FakeUno hard resets
+the FakeNano like the rebooter Uno resets the Nano. Time runs faster by a
+configurable speed-up. The FakeNano counts what it transmitted and how long
+lines waited until the FC read them, so that the ingest throughput and latency
+of the FC can be measured.
+
+Register the stand-ins in utilities.fc.fake_ports under the port names the FC
+opens, or set replay_directory in run_fc.py.
+"""
+import glob
+import os
+import queue
+import re
+import threading
+import time
+
+import numpy as np
+
+# the parameters the Nano asks for after the global time, in this order
+parameter_names = [
+    'recoverDataMode', 'tsWindowLength', 'tsEpochBufferDuration',
+    'startRecordingEpoch', 'waitingTimeBeforeReconnect',
+    'waitThisTimeBeforeSkippingNodeConnection', 'deathWarningAfterThisTime',
+    'transmitDataRecordedDuringThisTimeWindow', 'precisionTS',
+    'sensorSamplingTimeInterval', 'connectToNodeWithIndex']
+
+
+def load_replay_data(data_directory):
+    """Load the recorded test statistics of all nodes of an experiment.
+
+    Parameters
+    ----------
+    data_directory : String
+        The directory with the Node<node>_data.csv files.
+
+    Returns
+    -------
+    dict
+        Maps the node number to its n x 3 array of epoch index, temperature
+        and humidity test statistic, in the order they were recorded.
+    """
+    data = {}
+    for path in glob.glob(os.path.join(data_directory, 'Node*_data.csv')):
+        match = re.match(r'Node(\d+)_data\.csv$', os.path.basename(path))
+        if match is None:
+            continue
+        dat = np.genfromtxt(path, delimiter=',', skip_header=1, ndmin=2)
+        # the Nano can only transmit complete records
+        data[int(match.group(1))] = dat[~np.any(np.isnan(dat), axis=1)]
+    return data
+
+
+class FakeNano(object):
+    """Serial-like simulation of the FC's Nano that replays recorded data."""
+
+    def __init__(self, data_directory, tsEpochDuration=6000, speedup=1.,
+                 connection_seconds=10., max_records=720, soft_reset_every=0,
+                 timeout=1):
+        """Set up the simulation. It starts once the FC opens the port.
+
+        Parameters
+        ----------
+        data_directory : String
+            The directory with the Node<node>_data.csv files to be replayed.
+        tsEpochDuration : int, optional
+            The duration of one epoch in milliseconds, by default 6000.
+        speedup : float, optional
+            How much faster than real time the recording is replayed, by
+            default 1.
+        connection_seconds : float, optional
+            The time between two connections to nodes, in (sped up) seconds,
+            by default 10.
+        max_records : int, optional
+            The maximum number of records transmitted per connection, by
+            default 720.
+        soft_reset_every : int, optional
+            If positive, the Nano restarts softly after this many connections
+            and asks for its parameters again, by default 0.
+        timeout : float, optional
+            The read timeout in seconds, as of serial.Serial, by default 1.
+        """
+        self.name = 'replay of ' + data_directory
+        self.data = load_replay_data(data_directory)
+        if not self.data:
+            raise ValueError("No data to replay in {}".format(data_directory))
+        self.nodes = sorted(self.data)
+        # the replay starts at the first recorded epoch
+        self.first_epoch = min(dat[0, 0] for dat in self.data.values()
+                               if dat.shape[0] > 0)
+        self.tsEpochDuration = tsEpochDuration
+        self.speedup = speedup
+        self.connection_seconds = connection_seconds
+        self.max_records = max_records
+        self.soft_reset_every = soft_reset_every
+        self.timeout = timeout
+        self.parameters = {}
+
+        self._out = queue.Queue()
+        self._in = queue.Queue()
+        self._lost = False
+        self._reset = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        # how far every node has been replayed
+        self._next = {node: 0 for node in self.nodes}
+
+        self.n_lines = 0
+        self.n_records = 0
+        self.n_read = 0
+        self.latency_sum = 0.
+        self.latency_max = 0.
+        self.started_at = None
+
+    def reopen(self):
+        """Open the port, e.g., after it was lost because of a hard reset.
+
+        Returns
+        -------
+        FakeNano
+            This simulation.
+        """
+        self._lost = False
+        if self._thread is None:
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(
+                target=self._run, name='fake nano', daemon=True)
+            self._thread.start()
+        return self
+
+    @property
+    def in_waiting(self):
+        """The number of lines waiting to be read."""
+        self._check_port()
+        return self._out.qsize()
+
+    def readline(self):
+        """Read the next line.
+
+        Returns
+        -------
+        bytes
+            The line, empty if none arrived within the read timeout.
+        """
+        self._check_port()
+        try:
+            sent_at, line = self._out.get(timeout=self.timeout)
+        except queue.Empty:
+            return b''
+        latency = time.monotonic() - sent_at
+        self.n_read = self.n_read + 1
+        self.latency_sum = self.latency_sum + latency
+        self.latency_max = max(self.latency_max, latency)
+        return line
+
+    def write(self, data):
+        """Write to the Nano, i.e., answer the prompt it is waiting at.
+
+        Parameters
+        ----------
+        data : bytes
+            The answer.
+
+        Returns
+        -------
+        int
+            The number of bytes written.
+        """
+        self._check_port()
+        self._in.put(data.decode())
+        return len(data)
+
+    def close(self):
+        """Stop the simulation."""
+        self._closed.set()
+
+    def hard_reset(self):
+        """Reset the Nano as the rebooter does. The port is lost until it is
+        reopened, then the Nano asks for the global time again."""
+        if self._thread is not None:
+            self._reset.set()
+
+    def get_stats(self):
+        """Return how much was replayed and how long it took the FC to read.
+
+        Returns
+        -------
+        dict
+            The number of lines and data records transmitted, the records
+            transmitted per second, the mean and maximum time in seconds lines
+            waited until they were read and if all data has been replayed.
+        """
+        elapsed = 0 if self.started_at is None else (
+            time.monotonic() - self.started_at)
+        return {
+            'lines': self.n_lines, 'records': self.n_records,
+            'records_per_second': self.n_records / max(elapsed, 1e-9),
+            'mean_latency': self.latency_sum / max(self.n_read, 1),
+            'max_latency': self.latency_max,
+            'finished': all(self._next[node] == self.data[node].shape[0]
+                            for node in self.nodes)}
+
+    def _check_port(self):
+        if self._lost:
+            raise OSError("Port of the fake nano was lost")
+
+    def _emit(self, line):
+        self.n_lines = self.n_lines + 1
+        self._out.put((time.monotonic(), (line + '\r\n').encode()))
+
+    def _sleep(self, seconds):
+        # returns False if the Nano was reset or closed meanwhile
+        deadline = time.monotonic() + seconds
+        while not (self._reset.is_set() or self._closed.is_set()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, .1))
+        return False
+
+    def _ask(self, name):
+        self._emit("Enter {}:".format(name))
+        while not (self._reset.is_set() or self._closed.is_set()):
+            try:
+                answer = self._in.get(timeout=.1)
+            except queue.Empty:
+                continue
+            self.parameters[name] = int(answer)
+            self._emit("{} set to: {}".format(name, int(answer)))
+            return True
+        return False
+
+    def _encode(self, val, queue_idx):
+        # the last two digits of transmitted values are a suffix
+        val = int(round(val * 10**self.parameters.get('precisionTS', 9)))
+        return val - val%100 + queue_idx%100
+
+    def _connect(self, node):
+        start = self._next[node]
+        # the epoch the replay has reached
+        epoch = self.first_epoch + (
+            time.monotonic() - self.started_at) * 1000 * self.speedup / (
+            self.tsEpochDuration)
+        dat = self.data[node]
+        end = start
+        while (end < dat.shape[0] and end - start < self.max_records
+               and dat[end, 0] <= epoch):
+            end = end + 1
+        self._emit("found all characteristics!")
+        for queue_idx, (ep, temp, humid) in enumerate(dat[start:end]):
+            self._emit("Node{},{},{},{},{}".format(
+                node, self._encode(temp, queue_idx),
+                self._encode(humid, queue_idx), int(ep), queue_idx))
+        self.n_records = self.n_records + end - start
+        self._next[node] = end
+        self._emit("Peripheral disconnected")
+
+    def _run(self):
+        while not self._closed.is_set():
+            if not all(self._ask(name)
+                       for name in ['globTimeInput'] + parameter_names):
+                self._restart()
+                continue
+            node_idx = self.parameters['connectToNodeWithIndex'] + 1
+            k = int(np.searchsorted(self.nodes, node_idx)) % len(self.nodes)
+            n_conn = 0
+            while self._sleep(self.connection_seconds / self.speedup):
+                self._connect(self.nodes[k])
+                k = (k + 1) % len(self.nodes)
+                n_conn = n_conn + 1
+                if (self.soft_reset_every > 0
+                        and n_conn % self.soft_reset_every == 0):
+                    self._emit("Restarted softly!")
+                    if not all(self._ask(name) for name in parameter_names):
+                        break
+            self._restart()
+
+    def _restart(self):
+        if self._reset.is_set():
+            # the port vanishes and everything not yet read is gone
+            self._lost = True
+            while not self._out.empty():
+                self._out.get()
+            while not self._in.empty():
+                self._in.get()
+            self._reset.clear()
+
+
+class FakeUno(object):
+    """Serial-like stand-in for the rebooter Uno of a FakeNano."""
+
+    def __init__(self, nano):
+        """Set up the rebooter.
+
+        Parameters
+        ----------
+        nano : FakeNano
+            The simulated Nano that is reset.
+        """
+        self.nano = nano
+        self.name = 'rebooter of ' + nano.name
+
+    def reopen(self):
+        """Open the port.
+
+        Returns
+        -------
+        FakeUno
+            This rebooter.
+        """
+        return self
+
+    def write(self, data):
+        """Trigger the reset pin.
+
+        Parameters
+        ----------
+        data : bytes
+            Any data.
+
+        Returns
+        -------
+        int
+            The number of bytes written.
+        """
+        self.nano.hard_reset()
+        return len(data)
+
+    def close(self):
+        """Close the port."""
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Write-ahead log of the records received by the fusion center (FC).
+
+Every record is appended to the current log segment as soon as it was parsed,
+so that a crash of run_fc.py loses nothing and a power failure loses at most
+the records of the last fsync interval. Whenever the record buffer is handed
+to the csv writer, the segment is closed and a new one started. The csv writer
+removes a closed segment once its records are stored in the csv files. Segments
+that are left over at start-up, e.g., after a crash, are replayed into the csv
+files before new data is received.
+"""
+import glob
+import os
+import re
+import time
+
+import numpy as np
+
+from utilities.fc import record_dtype, write_records_to_csv
+
+# node, queue index, epoch index, temperature and humidity test statistics
+wal_dtype = np.dtype([('node', '<u2'), ('queue_idx', '<u2'), ('epoch', '<i8'),
+                      ('temp', '<f8'), ('humid', '<f8')])
+
+
+def read_wal_segment(path):
+    """Read the records of a log segment.
+
+    Parameters
+    ----------
+    path : String
+        The segment file.
+
+    Returns
+    -------
+    numpy array
+        The records, of type wal_dtype. An incomplete last record, e.g., from
+        a crash while writing, is ignored.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    n_rec = len(raw) // wal_dtype.itemsize
+    return np.frombuffer(raw[:n_rec * wal_dtype.itemsize], dtype=wal_dtype)
+
+
+def get_received_records(records):
+    """Arrange logged records as they were received into the record buffer.
+
+    Parameters
+    ----------
+    records : numpy array
+        The records, of type wal_dtype, in the order they were received.
+
+    Returns
+    -------
+    numpy array
+        The records, of type record_dtype, as expected by write_records_to_csv,
+        sorted by node and queue index. As in the record buffer of run_fc.py,
+        only the record received last for a queue index of a node is kept.
+    """
+    key = records['node'].astype(np.int64) * 2**16 + records['queue_idx']
+    # the index of the last occurrence of every key, in the order of the keys
+    _, rev_idx = np.unique(key[::-1], return_index=True)
+    rec = records[key.shape[0] - 1 - rev_idx]
+    received = np.zeros(rec.shape[0], dtype=record_dtype)
+    for name in ['epoch', 'temp', 'humid', 'node']:
+        received[name] = rec[name]
+    return received
+
+
+class WriteAheadLog(object):
+    """Append-only log of received records, in segments."""
+
+    def __init__(self, wal_directory, fsync_seconds=1):
+        """Open a new segment in the given directory.
+
+        Parameters
+        ----------
+        wal_directory : String
+            The directory of the segments.
+        fsync_seconds : float, optional
+            The maximum time in seconds appended records may stay in the
+            operating system's cache before being forced to the disk, by
+            default 1.
+        """
+        os.makedirs(wal_directory, exist_ok=True)
+        self.wal_directory = wal_directory
+        self.fsync_seconds = fsync_seconds
+        seq = [int(re.search(r'(\d+)\.wal$', path).group(1))
+               for path in self.get_segments()]
+        self._seq = max(seq) + 1 if seq else 0
+        self._open()
+
+    def _open(self):
+        self.path = os.path.join(
+            self.wal_directory, 'segment_{:08d}.wal'.format(self._seq))
+        # unbuffered, every record reaches the operating system right away
+        self._file = open(self.path, 'ab', buffering=0)
+        self._synced_at = time.monotonic()
+        self._dirty = False
+
+    def get_segments(self):
+        """Return the segment files in the order they were written.
+
+        Returns
+        -------
+        list
+            The paths of the segments.
+        """
+        return sorted(glob.glob(os.path.join(
+            self.wal_directory, 'segment_[0-9]*.wal')))
+
+    def append(self, node, queue_idx, epoch, temp, humid):
+        """Log a received record.
+
+        Parameters
+        ----------
+        node : int
+            The node the record was received from.
+        queue_idx : int
+            The queue index of the record.
+        epoch : int
+            The epoch index.
+        temp : float
+            The temperature test statistic.
+        humid : float
+            The humidity test statistic.
+        """
+        self._file.write(np.array(
+            [(node, queue_idx, epoch, temp, humid)], dtype=wal_dtype).tobytes())
+        self._dirty = True
+        self.sync_if_due()
+
+    def sync_if_due(self):
+        """Force the appended records to the disk if fsync_seconds passed
+        since this was last done."""
+        if (self._dirty
+                and time.monotonic() - self._synced_at >= self.fsync_seconds):
+            os.fsync(self._file.fileno())
+            self._synced_at = time.monotonic()
+            self._dirty = False
+
+    def rotate(self):
+        """Close the current segment and continue in a new one.
+
+        Returns
+        -------
+        String
+            The path of the closed segment, to be removed once its records are
+            stored elsewhere.
+        """
+        os.fsync(self._file.fileno())
+        self._file.close()
+        closed = self.path
+        self._seq = self._seq + 1
+        self._open()
+        return closed
+
+    def replay(self, data_directory, backup_directory, backup_key,
+               node_store=None):
+        """Store the records of all closed and left over segments in the csv
+        files and remove the segments. Records already stored for their node
+        and epoch are skipped, so that segments of partly failed writes are
+        not stored twice. Call before appending records.
+
+        Parameters
+        ----------
+        data_directory : String
+            The absolute path were the files should be stored.
+        backup_directory : String
+            The absolute path were the backup files should be stored.
+        backup_key : String
+            Previously generated string that makes the backup files unique.
+        node_store : NodeStore, optional
+            If given, the records are also appended to this store, by default
+            None.
+
+        Returns
+        -------
+        int
+            The number of records replayed.
+        """
+        n_rec = 0
+        for path in self.get_segments():
+            if path == self.path:
+                continue
+            records = read_wal_segment(path)
+            received = get_received_records(records)
+            # a failed write may have stored some of the records already
+            write_records_to_csv(received, data_directory, backup_directory,
+                                 backup_key, skip_present=True)
+            if node_store is not None:
+                node_store.append(received, skip_present=True)
+            os.remove(path)
+            n_rec = n_rec + records.shape[0]
+        return n_rec
+
+    def close(self):
+        """Force everything to the disk and close the current segment."""
+        os.fsync(self._file.fileno())
+        self._file.close()
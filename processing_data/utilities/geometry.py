@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Sensor and anchor coordinates for a static network geometry.
+
+spatialmht expects coordinates per epoch, i.e., as an n_MC x n_sen x 2 array.
+Since the sensors never move, every epoch holds the same coordinates. The
+functions in this module provide such arrays as read-only broadcast views of a
+single n_sen x 2 array, so that no per-epoch copies are ever created, neither
+in memory nor in the pickle files.
+"""
+import numpy as np
+
+
+class StaticCoords(np.ndarray):
+    """Read-only n_MC x n_sen x 2 coordinate array that is a broadcast view of
+    one n_sen x 2 array.
+
+    Pickles to a call of np.broadcast_to on the n_sen x 2 coordinates, so
+    stored files stay small and can be read without this module. Unpickling
+    yields a plain read-only numpy broadcast view.
+    """
+
+    def __reduce__(self):
+        if self.ndim > 0 and self.shape[0] > 0 and self.strides[0] == 0:
+            return (np.broadcast_to, (np.array(self[0]), self.shape))
+        # not a pure broadcast anymore (e.g., a single epoch), store as is
+        return (np.array, (np.asarray(self),))
+
+
+def static_coords(cds, n_MC):
+    """Return the given coordinates repeated for all epochs without copies.
+
+    Parameters
+    ----------
+    cds : numpy array
+        The n_sen x 2 coordinates.
+    n_MC : int
+        The number of epochs.
+
+    Returns
+    -------
+    StaticCoords
+        The read-only n_MC x n_sen x 2 view.
+    """
+    cds = np.asarray(cds)
+    return np.broadcast_to(cds, (n_MC,) + cds.shape).view(StaticCoords)
+
+
+def is_static(cds):
+    """Check if per-epoch coordinates are the same for all epochs.
+
+    Parameters
+    ----------
+    cds : numpy array
+        The n_MC x n_sen x 2 coordinates.
+
+    Returns
+    -------
+    bool
+        True if all epochs have the same coordinates.
+    """
+    cds = np.asarray(cds)
+    if cds.shape[0] == 0 or cds.strides[0] == 0:
+        return True
+    return bool(np.all(cds == cds[0]))
+
+
+def to_static_coords(cds):
+    """Replace per-epoch coordinates by a broadcast view if they are static.
+
+    Parameters
+    ----------
+    cds : numpy array
+        The n_MC x n_sen x 2 coordinates.
+
+    Returns
+    -------
+    numpy array
+        A StaticCoords view of the first epoch's coordinates if all epochs have
+        the same coordinates, cds unchanged otherwise.
+    """
+    if isinstance(cds, StaticCoords) or not is_static(cds):
+        return cds
+    return static_coords(np.array(cds[0]), cds.shape[0])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Discovery heatmaps over windows of epochs.
+
+The detection probability of a grid point over a window of epochs is the
+fraction of epochs in which it was discovered. The discoveries of a detection
+result are accumulated once over all epochs, after which the heatmap of any
+window is the difference of two rows of the cumulative counts, i.e., costs
+one pass over the grid instead of one pass over all epochs of the window.
+"""
+import numpy as np
+
+
+class DetectionCounts(object):
+    """Cumulative discovery counts of one detection result."""
+
+    def __init__(self, r_det, block=1024):
+        """Accumulate the discoveries over all epochs.
+
+        Parameters
+        ----------
+        r_det : numpy array
+            The n_MC x n detected discovery pattern, NaN where no data was
+            available, e.g., the r_det of a (packed) detection result.
+        block : int, optional
+            The number of epochs read from r_det at once, by default 1024.
+            Packed results are unpacked one block at a time.
+        """
+        n_MC, n = r_det.shape
+        # row k holds the counts over the first k epochs
+        self.cum_det = np.zeros((n_MC + 1, n), dtype=np.int32)
+        self.cum_nan = np.zeros((n_MC + 1, n), dtype=np.int32)
+        for start in np.arange(0, n_MC, block):
+            end = min(start + block, n_MC)
+            blk = np.asarray(r_det[start:end])
+            self.cum_det[start + 1:end + 1] = self.cum_det[start] + np.cumsum(
+                blk == 1, axis=0)
+            self.cum_nan[start + 1:end + 1] = self.cum_nan[start] + np.cumsum(
+                np.isnan(blk), axis=0)
+
+    @property
+    def n_epochs(self):
+        """The number of epochs of the detection result."""
+        return self.cum_det.shape[0] - 1
+
+    def _mean(self, start, end):
+        # as np.mean over the epochs, NaN wherever data was missing
+        av = (self.cum_det[end] - self.cum_det[start]) / (
+            end - start)[..., np.newaxis]
+        av[self.cum_nan[end] - self.cum_nan[start] > 0] = np.nan
+        return av
+
+    def mean(self, start, end):
+        """Return the detection probability over a window of epochs.
+
+        Parameters
+        ----------
+        start : int
+            The index of the first epoch of the window.
+        end : int
+            The index of the epoch after the window.
+
+        Returns
+        -------
+        numpy array
+            The fraction of the epochs in [start, end) in which each test was
+            discovered, NaN where data was missing in any of them or if the
+            window is empty.
+        """
+        if not 0 <= start <= end <= self.n_epochs:
+            raise ValueError("Window [{}, {}) is out of range".format(
+                start, end))
+        if end == start:
+            return np.zeros(self.cum_det.shape[1]) + np.nan
+        return self._mean(np.asarray(start), np.asarray(end))
+
+    def sliding(self, win_len, step=1):
+        """Return the detection probabilities over sliding windows.
+
+        Parameters
+        ----------
+        win_len : int
+            The number of epochs per window.
+        step : int, optional
+            The number of epochs between the starts of consecutive windows, by
+            default 1.
+
+        Returns
+        -------
+        tuple
+            The indexes of the first epochs of the windows and the
+            n_windows x n detection probabilities, as returned by mean.
+        """
+        if win_len < 1 or step < 1:
+            raise ValueError("win_len and step must be positive")
+        starts = np.arange(0, self.n_epochs - win_len + 1, step)
+        return starts, self._mean(starts, starts + win_len)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Interpolation of sensor lfdrs onto the grid with reusable weights.
+
+The RBF interpolation used by spatialmht's ipl_lfdrs is linear in the
+interpolated values. Since sensors and anchors never move, the interpolation
+weights only depend on which sensors have data in an epoch. They are computed
+once per such availability pattern and then reused for all epochs, all methods
+and the moving-average variants.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from rbf.interpolate import RBFInterpolant
+
+
+class InterpolationPlan(object):
+    """Precomputed RBF interpolation weights for a fixed sensor geometry.
+
+    Anchors (grid points where H0 is known to be true) always have lfdr = 1.
+    Their contribution to the interpolated lfdrs is hence a constant offset
+    that is folded into the plan.
+    """
+
+    def __init__(self, sen_cds, anchor_cds, dim, rbf='phs2'):
+        """Set up the plan.
+
+        Parameters
+        ----------
+        sen_cds : numpy array
+            The n_sen x 2 sensor location coordinates.
+        anchor_cds : numpy array
+            The n_anchor x 2 anchor location coordinates. Can be empty.
+        dim : tuple
+            The dimension of the grid of the room.
+        rbf : str, optional
+            The type of radial basis function for interpolation, by default
+            'phs2', as in spatialmht's ipl_lfdrs.
+        """
+        self.sen_cds = np.asarray(sen_cds).reshape(-1, 2)
+        self.anchor_cds = np.asarray(anchor_cds).reshape(-1, 2)
+        self.dim = dim
+        self.rbf = rbf
+        self.n_sen = self.sen_cds.shape[0]
+        self.n_gp = int(np.prod(dim))
+        # grid point coordinates, same order as in spatialmht's ipl_lfdrs
+        self.gp_crds = np.squeeze(np.array([
+            (np.remainder(np.arange(self.n_gp), dim[0]),
+             np.array((np.arange(self.n_gp) / dim[0])).astype(int))
+            ])).transpose()
+        self._weights = {}
+
+    def get_weights(self, avl):
+        """Return the interpolation weights for the given available sensors.
+
+        Parameters
+        ----------
+        avl : numpy array
+            Boolean vector of length n_sen, True where the sensor has data.
+
+        Returns
+        -------
+        tuple
+            The n_gp x sum(avl) weight matrix for the available sensors and
+            the n_gp offset vector caused by the anchors.
+        """
+        avl = np.asarray(avl, dtype=bool)
+        key = avl.tobytes()
+        if key not in self._weights:
+            n_avl = np.sum(avl)
+            crds = np.concatenate(
+                [self.sen_cds[avl], self.anchor_cds], axis=0)
+            # interpolating the unit vectors yields the columns of the
+            # (linear) interpolation operator
+            rbfi = RBFInterpolant(
+                crds, np.eye(crds.shape[0]), phi=self.rbf, sigma=0)
+            weights = rbfi(self.gp_crds)
+            self._weights[key] = (
+                weights[:, :n_avl], np.sum(weights[:, n_avl:], axis=1))
+        return self._weights[key]
+
+    def apply(self, lfdrs_sen):
+        """Interpolate the given sensor lfdrs onto all grid points.
+
+        Parameters
+        ----------
+        lfdrs_sen : numpy array
+            The n_MC x n_sen lfdrs at the sensors, NaN where no data.
+
+        Returns
+        -------
+        numpy array
+            The n_MC x n_gp interpolated lfdrs, clipped to [0, 1].
+        """
+        lfdrs_sen = np.asarray(lfdrs_sen, dtype=float)
+        nan_msk = np.isnan(lfdrs_sen)
+        patterns, inv = np.unique(nan_msk, axis=0, return_inverse=True)
+        inv = inv.reshape(-1)
+        lfdrs_ipl = np.zeros((lfdrs_sen.shape[0], self.n_gp))
+        for pat_idx, pat in enumerate(patterns):
+            rows = inv == pat_idx
+            weights, offset = self.get_weights(~pat)
+            lfdrs_ipl[rows, :] = (
+                lfdrs_sen[np.ix_(rows, ~pat)] @ weights.T + offset)
+        return np.clip(lfdrs_ipl, 0, 1)
+
+
+def ipl_lfdrs(plan, res_path, res_str, lfdrs_sen):
+    """Interpolate lfdrs with the given plan. Drop-in for spatialmht's
+    ipl_lfdrs, including the caching of results in res_path.
+
+    Parameters
+    ----------
+    plan : InterpolationPlan
+        The interpolation plan for the sensor and anchor geometry.
+    res_path : str
+        The path to where the results are stored.
+    res_str : str
+        The name of the file where the current results are stored.
+    lfdrs_sen : numpy array
+        The n_MC x n_sen lfdrs at the sensors (without anchors).
+
+    Returns
+    -------
+    numpy array
+        The n_MC x n_gp interpolated lfdrs.
+    """
+    res = pd.read_pickle(os.path.join(res_path, res_str + '.pkl'))
+    try:
+        lfdrs_ipl = res['lfdr_ipl'][0]
+    except KeyError:
+        lfdrs_ipl = plan.apply(lfdrs_sen)
+        new_res = pd.concat([res, pd.DataFrame({"lfdr_ipl": [lfdrs_ipl]})],
+                            axis=1)
+        new_res.to_pickle(os.path.join(res_path, res_str + '.pkl'))
+    return lfdrs_ipl
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar store of the test statistics received from the nodes.
+
+The records of each node are partitioned into chunks of consecutive epochs.
+Every chunk keeps one binary file per column (epoch index, temperature and
+humidity test statistic) with a fixed type:
+
+    <store directory>/Node<node>/chunk_<chunk index>.<column>
+
+New records are appended to the end of these files, so storing them never
+reads or rewrites what is already stored, and reading a node is a plain
+np.fromfile per column instead of parsing csv text. As in the csv files,
+records are kept in the order they were received, duplicates included.
+
+run_fc.py writes the store next to the csv files of an experiment, in the
+directory node_store_dirname. The loaders of utilities.aux read from it
+whenever it holds data of the requested node.
+"""
+import glob
+import json
+import os
+import re
+
+import numpy as np
+
+from utilities.fc import record_dtype
+
+node_store_dirname = 'node_store'
+
+column_dtypes = {'epoch': np.dtype('<i8'), 'temp': np.dtype('<f8'),
+                 'humid': np.dtype('<f8')}
+
+
+class NodeStore(object):
+    """Per-node, chunked, append-only column files of received records."""
+
+    def __init__(self, store_directory, chunk_epochs=14400):
+        """Open the store. It is created with the first append.
+
+        Parameters
+        ----------
+        store_directory : String
+            The directory of the store.
+        chunk_epochs : int, optional
+            The number of epochs per chunk, by default 14400, i.e., one day
+            with epochs of 6 s. Only used when the store is created, an
+            existing store keeps its chunk size.
+        """
+        self.store_directory = store_directory
+        self._meta_file = os.path.join(store_directory, 'node_store.json')
+        if os.path.exists(self._meta_file):
+            with open(self._meta_file) as f:
+                chunk_epochs = json.load(f)['chunk_epochs']
+        self.chunk_epochs = chunk_epochs
+
+    def _get_chunk_file(self, node, chunk, column):
+        return os.path.join(self.store_directory, 'Node{}'.format(node),
+                            'chunk_{:08d}.{}'.format(chunk, column))
+
+    def append(self, records, skip_present=False):
+        """Append received records to the chunks of their nodes.
+
+        Parameters
+        ----------
+        records : numpy array
+            The records, of type record_dtype.
+        skip_present : bool, optional
+            If True, records whose epoch is already stored for their node are
+            not appended again, e.g., when replaying records that were partly
+            stored before, by default False.
+        """
+        if records.shape[0] == 0:
+            return
+        if not os.path.exists(self._meta_file):
+            os.makedirs(self.store_directory, exist_ok=True)
+            with open(self._meta_file, 'w') as f:
+                json.dump({'chunk_epochs': self.chunk_epochs}, f)
+        chunks = records['epoch'] // self.chunk_epochs
+        for node in np.unique(records['node']):
+            os.makedirs(os.path.join(
+                self.store_directory, 'Node{}'.format(node)), exist_ok=True)
+            is_node = records['node'] == node
+            for chunk in np.unique(chunks[is_node]):
+                rec = records[is_node & (chunks == chunk)]
+                self._repair_chunk(node, chunk)
+                epoch_file = self._get_chunk_file(node, chunk, 'epoch')
+                if skip_present and os.path.exists(epoch_file):
+                    present = np.fromfile(
+                        epoch_file, dtype=column_dtypes['epoch'])
+                    rec = rec[~np.isin(rec['epoch'], present)]
+                    if rec.shape[0] == 0:
+                        continue
+                for column, dtype in column_dtypes.items():
+                    with open(self._get_chunk_file(node, chunk, column),
+                              'ab') as f:
+                        f.write(rec[column].astype(dtype).tobytes())
+
+    def _repair_chunk(self, node, chunk):
+        # cut off a record whose columns were not all written, e.g., because
+        # of a crash while appending, so that the columns stay aligned
+        paths = {column: self._get_chunk_file(node, chunk, column)
+                 for column in column_dtypes}
+        n_rec = [os.path.getsize(path) // column_dtypes[column].itemsize
+                 if os.path.exists(path) else 0
+                 for column, path in paths.items()]
+        for (column, path), n in zip(paths.items(), n_rec):
+            if n > min(n_rec):
+                os.truncate(path, min(n_rec) * column_dtypes[column].itemsize)
+
+    def import_csv(self, data_directory):
+        """Append the records of the csv files of an experiment, e.g., to
+        start a store for an experiment that is already running.
+
+        Parameters
+        ----------
+        data_directory : String
+            The directory with the Node<node>_data.csv files.
+
+        Returns
+        -------
+        int
+            The number of records imported.
+        """
+        import pandas as pd
+
+        n_rec = 0
+        for path in sorted(glob.glob(
+                os.path.join(data_directory, 'Node*_data.csv'))):
+            match = re.match(r'Node(\d+)_data\.csv$', os.path.basename(path))
+            if match is None:
+                continue
+            df = pd.read_csv(path).dropna(subset=['epoch'])
+            records = np.zeros(df.shape[0], dtype=record_dtype)
+            for column in column_dtypes:
+                records[column] = df[column]
+            records['node'] = int(match.group(1))
+            self.append(records)
+            n_rec = n_rec + records.shape[0]
+        return n_rec
+
+    def get_nodes(self):
+        """Return the nodes the store holds data of.
+
+        Returns
+        -------
+        list
+            The node numbers, in ascending order.
+        """
+        nodes = []
+        for path in glob.glob(os.path.join(self.store_directory, 'Node*')):
+            match = re.match(r'Node(\d+)$', os.path.basename(path))
+            if match is not None:
+                nodes.append(int(match.group(1)))
+        return sorted(nodes)
+
+    def get_chunks(self, node):
+        """Return the chunks stored for a node.
+
+        Parameters
+        ----------
+        node : int
+            The node.
+
+        Returns
+        -------
+        list
+            The chunk indices, in ascending order. Chunk k holds the epochs k *
+            chunk_epochs to (k + 1) * chunk_epochs - 1.
+        """
+        paths = glob.glob(os.path.join(
+            self.store_directory, 'Node{}'.format(node), 'chunk_*.epoch'))
+        return sorted(int(re.search(r'chunk_(\d+)\.epoch$', path).group(1))
+                      for path in paths)
+
+    def read_node(self, node, columns=None, epoch_start=None, epoch_end=None):
+        """Read the records of a node.
+
+        Parameters
+        ----------
+        node : int
+            The node.
+        columns : list, optional
+            The columns to read besides the epoch index, by default None, i.e.,
+            temp and humid.
+        epoch_start : int, optional
+            The first epoch to read, by default None, i.e., from the start.
+        epoch_end : int, optional
+            The last epoch to read, by default None, i.e., to the end. Only
+            the chunks overlapping the requested epochs are read.
+
+        Returns
+        -------
+        DataFrame
+            The records, indexed by epoch, in the order they were received.
+        """
+        import pandas as pd
+
+        if columns is None:
+            columns = ['temp', 'humid']
+        data = {column: [] for column in ['epoch'] + columns}
+        for chunk in self.get_chunks(node):
+            if (epoch_start is not None
+                    and (chunk + 1) * self.chunk_epochs <= epoch_start):
+                continue
+            if epoch_end is not None and chunk * self.chunk_epochs > epoch_end:
+                continue
+            chunk_data = {column: np.fromfile(
+                self._get_chunk_file(node, chunk, column),
+                dtype=column_dtypes[column]) for column in data}
+            # a record whose columns were not all written is ignored
+            n_rec = min(val.shape[0] for val in chunk_data.values())
+            for column, val in chunk_data.items():
+                data[column].append(val[:n_rec])
+        data = {column: np.concatenate(val) if val else np.zeros(
+            0, dtype=column_dtypes[column]) for column, val in data.items()}
+        in_range = np.ones(data['epoch'].shape[0], dtype=bool)
+        if epoch_start is not None:
+            in_range = in_range & (data['epoch'] >= epoch_start)
+        if epoch_end is not None:
+            in_range = in_range & (data['epoch'] <= epoch_end)
+        df = pd.DataFrame({column: val[in_range]
+                           for column, val in data.items()})
+        return df.set_index('epoch')
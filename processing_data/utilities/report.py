@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless rendering of the evolution plots to image files.
+
+In report mode, the plots selected in produce_results are not shown. Instead,
+every plot is queued and, once all results are available, rendered with the
+non-interactive Agg backend in a pool of worker processes. Each plot writes
+its frames as png files into its own subdirectory of the report directory.
+Alternatively, the evolution plots are exported as videos: their epochs are
+split into chunks that are encoded by separate workers and stitched together
+once all chunks are done.
+"""
+import inspect
+import os
+
+import matplotlib.pyplot as plt
+
+from utilities.scheduling import run_dependent_jobs
+from utilities.video import (VideoExport, get_default_video_fmt,
+                             render_video_chunk, stitch_videos)
+
+
+def render_plot(plot_func, args, kwargs, save_dir):
+    """Render one plot to image files with the Agg backend.
+
+    Parameters
+    ----------
+    plot_func : function
+        One of the plotting functions from aux that accept save_dir.
+    args : tuple
+        The positional arguments of plot_func.
+    kwargs : dict
+        The keyword arguments of plot_func.
+    save_dir : str
+        The directory the frames are saved to.
+
+    Returns
+    -------
+    str
+        The directory the frames were saved to.
+    """
+    plt.switch_backend('Agg')
+    try:
+        plot_func(*args, save_dir=save_dir, **kwargs)
+    finally:
+        plt.close('all')
+    return save_dir
+
+
+class PlotReport(object):
+    """Either shows plots right away or collects them for headless rendering.
+    """
+
+    def __init__(self, report_dir, headless=False, video=False, fps=2,
+                 video_fmt=None, n_chunks=None):
+        """Set up the report.
+
+        Parameters
+        ----------
+        report_dir : str
+            The directory the frames are saved to in headless mode. Every plot
+            gets its own subdirectory.
+        headless : bool, optional
+            If True, plots are queued and rendered to files by render. If
+            False, plots are shown right away, by default False.
+        video : bool, optional
+            If True, the evolution plots are rendered to videos instead of
+            png frames in headless mode, by default False. Other plots are
+            still saved as png files.
+        fps : float, optional
+            The frames (epochs) per second of the videos, by default 2.
+        video_fmt : str, optional
+            'mp4' (needs ffmpeg) or 'gif', by default None, which uses mp4 if
+            ffmpeg is installed and gif otherwise.
+        n_chunks : int, optional
+            The number of chunks the epochs of each video are split into, by
+            default None, which uses one chunk per CPU.
+        """
+        self.report_dir = report_dir
+        self.headless = headless
+        self.video = video
+        self.fps = fps
+        self.video_fmt = video_fmt
+        self.n_chunks = n_chunks
+        self.jobs = {}
+
+    def plot(self, name, plot_func, *args, **kwargs):
+        """Show the given plot or queue it for rendering.
+
+        Parameters
+        ----------
+        name : str
+            The name of the plot, used as name of its subdirectory.
+        plot_func : function
+            The plotting function.
+        *args
+            The positional arguments of plot_func.
+        **kwargs
+            The keyword arguments of plot_func.
+        """
+        if not self.headless:
+            plot_func(*args, **kwargs)
+            return
+        if name in self.jobs:
+            raise ValueError("Plot {} has already been added".format(name))
+        # frames are saved without waiting for user input
+        kwargs['click'] = False
+        self.jobs[name] = (plot_func, args, kwargs)
+
+    def get_render_jobs(self):
+        """Return the jobs that render the queued plots.
+
+        Returns
+        -------
+        dict
+            The jobs as expected by run_dependent_jobs. In video mode, each
+            evolution plot is rendered by one job per chunk and the job with
+            the name of the plot stitches the chunks together.
+        """
+        n_chunks = self.n_chunks
+        if n_chunks is None:
+            n_chunks = os.cpu_count()
+        video_fmt = self.video_fmt
+        if self.video and video_fmt is None:
+            # resolved once, so that all chunks agree
+            video_fmt = get_default_video_fmt()
+
+        jobs = {}
+        for name, (plot_func, args, kwargs) in self.jobs.items():
+            save_dir = os.path.join(self.report_dir, name)
+            if not (self.video and 'video' in inspect.signature(
+                    plot_func).parameters):
+                jobs[name] = (render_plot, (plot_func, args, kwargs, save_dir),
+                              [])
+                continue
+            chunk_names = []
+            for chunk in range(n_chunks):
+                chunk_names.append('{} chunk {}'.format(name, chunk))
+                jobs[chunk_names[-1]] = (render_video_chunk, (
+                    plot_func, args, kwargs, VideoExport(
+                        save_dir, fmt=video_fmt, fps=self.fps, chunk=chunk,
+                        n_chunks=n_chunks)), [])
+            if n_chunks == 1:
+                # the single chunk writes the final videos directly
+                jobs[name] = jobs.pop(chunk_names[0])
+            else:
+                jobs[name] = (stitch_videos, (save_dir, video_fmt, self.fps),
+                              chunk_names)
+        return jobs
+
+    def render(self, max_wrk=None):
+        """Render all queued plots in a process pool.
+
+        Parameters
+        ----------
+        max_wrk : int, optional
+            The maximum number of plots rendered at the same time, by default
+            None, which uses one worker per CPU.
+
+        Returns
+        -------
+        dict
+            Maps the plot name to the directory with its frames or videos.
+        """
+        if not self.jobs:
+            return {}
+        if max_wrk is None:
+            max_wrk = os.cpu_count()
+        os.makedirs(self.report_dir, exist_ok=True)
+        res = run_dependent_jobs(self.get_render_jobs(), max_wrk=max_wrk)
+        res = {name: res[name] for name in self.jobs}
+        self.jobs = {}
+        return res
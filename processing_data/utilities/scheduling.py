@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run a set of jobs with dependencies between them in a process pool.
+
+Used to run the lfdr estimators concurrently: the estimators that only need
+the field are started right away, the ones that build on a previous estimate
+(e.g., clfdrs on top of lfdr-sMoM) are started as soon as their prerequisite
+has finished.
+"""
+import multiprocessing as mp
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def get_mp_context():
+    """Return the multiprocessing context used for the worker processes.
+
+    The analysis scripts are plain scripts without a __main__ guard, hence
+    workers are forked where possible so that they don't re-execute the
+    calling script.
+
+    Returns
+    -------
+    multiprocessing.context.BaseContext
+        The fork context if available on this platform, the default otherwise.
+    """
+    if 'fork' in mp.get_all_start_methods():
+        return mp.get_context('fork')
+    return mp.get_context()
+
+
+def run_dependent_jobs(jobs, max_wrk=None, verbose=True):
+    """Run the given jobs, each as soon as all of its dependencies finished.
+
+    Parameters
+    ----------
+    jobs : dict
+        Maps the job name to a tuple (func, args, deps), where func is a
+        picklable module-level function, args the tuple of arguments it is
+        called with and deps a list with the names of the jobs that must have
+        finished before this job can start.
+    max_wrk : int, optional
+        The maximum number of jobs running at the same time, by default None,
+        which uses one worker per job. If 1, the jobs are run one after
+        another in this process.
+    verbose : bool, optional
+        If progress is to be printed, by default True.
+
+    Returns
+    -------
+    dict
+        Maps the job name to what its function returned.
+    """
+    for name, (_, _, deps) in jobs.items():
+        for dep in deps:
+            if dep not in jobs:
+                raise ValueError(
+                    "Job {} depends on unknown job {}".format(name, dep))
+
+    results = {}
+    pending = dict(jobs)
+
+    def pop_ready_jobs():
+        ready = [name for name, (_, _, deps) in pending.items()
+                 if all(dep in results for dep in deps)]
+        return [(name, pending.pop(name)) for name in ready]
+
+    if max_wrk == 1:
+        while pending:
+            ready = pop_ready_jobs()
+            if not ready:
+                raise ValueError("Circular dependencies between jobs {}".format(
+                    list(pending.keys())))
+            for name, (func, args, _) in ready:
+                results[name] = func(*args)
+        return results
+
+    if max_wrk is None:
+        max_wrk = len(jobs)
+    with ProcessPoolExecutor(max_workers=max(1, min(max_wrk, len(jobs))),
+                             mp_context=get_mp_context()) as pool:
+        running = {}
+        while pending or running:
+            for name, (func, args, _) in pop_ready_jobs():
+                if verbose:
+                    print("Started {}".format(name))
+                running[pool.submit(func, *args)] = name
+            if not running:
+                raise ValueError("Circular dependencies between jobs {}".format(
+                    list(pending.keys())))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                # re-raises exceptions of the job in this process
+                results[name] = future.result()
+                if verbose:
+                    print("Finished {}".format(name))
+    return results
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Temporal smoothing of lfdrs and other per-epoch quantities.
+
+Sensors drop out from time to time, which shows up as NaN entries in the
+(n_MC, n_sensors) arrays. The moving average in this module restarts at every
+NaN, so that no value ever gets averaged across a gap in the data.
+"""
+import numpy as np
+
+
+def segment_moving_average(vals, win_len, origin=None, mode='nearest'):
+    """Apply a moving average along the epoch axis that respects NaN gaps.
+
+    Every column is split into the segments between its NaN entries and each
+    segment is filtered on its own. For mode 'nearest', the result is
+    identical to calling scipy's uniform_filter1d with mode='nearest' on every
+    segment separately, but all columns and segments are handled at once with
+    cumulative sums that are reset at the start of every segment.
+
+    Parameters
+    ----------
+    vals : numpy array
+        The n_MC x ... array to be filtered, e.g. sensor lfdrs of shape
+        (n_MC, n_sensors) or interpolated lfdrs of shape (n_MC, n_gp). Axis 0
+        is the epoch axis.
+    win_len : int
+        The number of epochs across which the average is computed.
+    origin : int, optional
+        The placement of the window, same convention as for scipy's
+        uniform_filter1d: 0 centers the window, positive values shift it
+        towards earlier epochs. By default None, which selects
+        (win_len - 1) // 2, i.e., a causal window that covers the current
+        and the win_len - 1 previous epochs.
+    mode : str, optional
+        How windows that extend beyond the start or end of a segment are
+        treated, by default 'nearest'.
+            'nearest': The first/last value of the segment is repeated.
+            'shrink':  Only the available values of the segment are
+                       averaged.
+            'nan':     The result is NaN.
+
+    Returns
+    -------
+    numpy array
+        The filtered values, same shape as vals. NaN wherever vals is NaN.
+    """
+    vals = np.asarray(vals, dtype=float)
+    shape = vals.shape
+    vals = vals.reshape(shape[0], -1)
+    n_MC = vals.shape[0]
+
+    if origin is None:
+        origin = (win_len - 1) // 2
+    # offsets of the first and last epoch of the window w.r.t. current epoch
+    first_off = -(win_len // 2) - origin
+    last_off = first_off + win_len - 1
+    if win_len < 1 or first_off > 0 or last_off < 0:
+        raise ValueError("invalid origin {} for window length {}".format(
+            origin, win_len))
+    if mode not in ('nearest', 'shrink', 'nan'):
+        raise ValueError("unknown mode {}".format(mode))
+
+    nan_msk = np.isnan(vals)
+    epoch_idx = np.arange(n_MC)[:, np.newaxis]
+
+    # first and last epoch index of the segment each entry belongs to
+    seg_start = np.maximum.accumulate(
+        np.where(nan_msk, epoch_idx, -1), axis=0) + 1
+    next_nan_rev = np.maximum.accumulate(
+        np.where(nan_msk[::-1], epoch_idx, -1), axis=0)[::-1]
+    seg_end = n_MC - 2 - next_nan_rev
+
+    # cumulative sums with NaNs counted as zero. Window sums are only ever
+    # taken between two epochs of the same segment, which is equivalent to
+    # resetting the sum at the start of every segment.
+    csum = np.concatenate([
+        np.zeros((1, vals.shape[1])),
+        np.cumsum(np.where(nan_msk, 0, vals), axis=0)])
+
+    win_first = epoch_idx + first_off
+    win_last = epoch_idx + last_off
+    avl_first = np.clip(np.maximum(win_first, seg_start), 0, n_MC)
+    avl_last = np.clip(np.minimum(win_last, seg_end), -1, n_MC - 1)
+
+    avl_sum = (np.take_along_axis(csum, avl_last + 1, axis=0)
+               - np.take_along_axis(csum, avl_first, axis=0))
+
+    if mode == 'nearest':
+        first_val = np.take_along_axis(
+            vals, np.clip(seg_start, 0, n_MC - 1), axis=0)
+        last_val = np.take_along_axis(
+            vals, np.clip(seg_end, 0, n_MC - 1), axis=0)
+        res = (avl_sum
+               + np.clip(seg_start - win_first, 0, None) * first_val
+               + np.clip(win_last - seg_end, 0, None) * last_val) / win_len
+    elif mode == 'shrink':
+        res = avl_sum / np.maximum(avl_last - avl_first + 1, 1)
+    else:
+        res = avl_sum / win_len
+        res[(win_first < seg_start) | (win_last > seg_end)] = np.nan
+
+    res[nan_msk] = np.nan
+    return res.reshape(shape)
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Export of the evolution plots to videos.
+
+The rendered frames are piped straight to ffmpeg and encoded as mp4 if ffmpeg
+is installed, otherwise they are collected with Pillow and stored as animated
+gif. Long evolutions are split into chunks of consecutive epochs, each encoded
+by its own worker process, and the chunks are stitched together in order
+afterwards.
+"""
+import glob
+import os
+import shutil
+import subprocess
+
+import matplotlib as mpl
+import matplotlib.pyplot as plt
+import numpy as np
+
+from PIL import Image, ImageSequence
+
+
+def get_ffmpeg_path():
+    """Return the path of the ffmpeg executable matplotlib is configured with.
+
+    Returns
+    -------
+    str
+        The path, None if ffmpeg is not installed.
+    """
+    return shutil.which(mpl.rcParams['animation.ffmpeg_path'])
+
+
+def get_default_video_fmt():
+    """Return the video format used if none is specified.
+
+    Returns
+    -------
+    str
+        'mp4' if ffmpeg is installed, 'gif' otherwise.
+    """
+    return 'mp4' if get_ffmpeg_path() is not None else 'gif'
+
+
+class FFMpegSegment(object):
+    """Encodes frames to an mp4 file by piping them to ffmpeg."""
+
+    def __init__(self, path, width, height, fps):
+        """Start ffmpeg.
+
+        Parameters
+        ----------
+        path : str
+            The video file.
+        width : int
+            The width of the frames in pixels.
+        height : int
+            The height of the frames in pixels.
+        fps : float
+            The frames per second.
+        """
+        self.path = path
+        # h264 needs even dimensions, hence the padding
+        self.proc = subprocess.Popen(
+            [get_ffmpeg_path(), '-y', '-loglevel', 'error', '-f', 'rawvideo',
+             '-pix_fmt', 'rgba', '-s', '{}x{}'.format(width, height), '-r',
+             str(fps), '-i', '-', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2',
+             '-c:v', 'libx264', '-pix_fmt', 'yuv420p', path],
+            stdin=subprocess.PIPE)
+
+    def write(self, rgba):
+        """Encode one frame.
+
+        Parameters
+        ----------
+        rgba : numpy array
+            The height x width x 4 uint8 frame.
+        """
+        self.proc.stdin.write(np.ascontiguousarray(rgba).tobytes())
+
+    def close(self):
+        """Finish the video file."""
+        self.proc.stdin.close()
+        if self.proc.wait() != 0:
+            raise RuntimeError("ffmpeg failed to write {}".format(self.path))
+
+
+class PillowSegment(object):
+    """Collects frames and stores them as animated gif."""
+
+    def __init__(self, path, width, height, fps):
+        """Set up the gif.
+
+        Parameters
+        ----------
+        path : str
+            The gif file.
+        width : int
+            The width of the frames in pixels.
+        height : int
+            The height of the frames in pixels.
+        fps : float
+            The frames per second.
+        """
+        self.path = path
+        self.fps = fps
+        self.frames = []
+
+    def write(self, rgba):
+        """Add one frame.
+
+        Parameters
+        ----------
+        rgba : numpy array
+            The height x width x 4 uint8 frame.
+        """
+        self.frames.append(Image.fromarray(np.asarray(rgba)).convert('RGB'))
+
+    def close(self):
+        """Write the gif file."""
+        save_gif(self.path, self.frames, self.fps)
+        self.frames = []
+
+
+def save_gif(path, frames, fps):
+    """Store frames as animated gif.
+
+    Parameters
+    ----------
+    path : str
+        The gif file.
+    frames : list
+        The frames as PIL images.
+    fps : float
+        The frames per second.
+    """
+    if len(frames) == 0:
+        return
+    frames[0].save(path, save_all=True, append_images=frames[1:],
+                   duration=int(round(1000 / fps)), loop=0)
+
+
+class VideoExport(object):
+    """Where and how (one chunk of) an evolution plot is encoded to videos.
+
+    Every figure of the plot gets its own video file in video_dir. If the
+    epochs are split into several chunks, each chunk writes part files that
+    are joined by stitch_videos.
+    """
+
+    def __init__(self, video_dir, fmt=None, fps=2, chunk=0, n_chunks=1):
+        """Set up the export.
+
+        Parameters
+        ----------
+        video_dir : str
+            The directory the videos are written to.
+        fmt : str, optional
+            'mp4' (needs ffmpeg) or 'gif', by default None, which uses mp4 if
+            ffmpeg is installed and gif otherwise.
+        fps : float, optional
+            The frames (epochs) per second, by default 2.
+        chunk : int, optional
+            The index of the chunk of epochs to encode, by default 0.
+        n_chunks : int, optional
+            The number of chunks the epochs are split into, by default 1.
+        """
+        if fmt is None:
+            fmt = get_default_video_fmt()
+        if fmt not in ['mp4', 'gif']:
+            raise ValueError("Unknown video format {}".format(fmt))
+        self.video_dir = video_dir
+        self.fmt = fmt
+        self.fps = fps
+        self.chunk = chunk
+        self.n_chunks = n_chunks
+
+    def get_chunk_frames(self, n_frames):
+        """Return the frame indexes of this chunk.
+
+        Parameters
+        ----------
+        n_frames : int
+            The total number of frames of the plot.
+
+        Returns
+        -------
+        numpy array
+            The consecutive frame indexes encoded by this chunk.
+        """
+        bnd = np.linspace(0, n_frames, self.n_chunks + 1).astype(int)
+        return np.arange(bnd[self.chunk], bnd[self.chunk + 1])
+
+    def get_file(self, file_prefix, fig_idx):
+        """Return the path of the video file of this chunk for one figure.
+
+        Parameters
+        ----------
+        file_prefix : str
+            The beginning of the file name.
+        fig_idx : int
+            The index of the figure in the plot.
+
+        Returns
+        -------
+        str
+            The path.
+        """
+        if self.n_chunks == 1:
+            fnam = '{}_fig{}.{}'.format(file_prefix, fig_idx, self.fmt)
+        else:
+            fnam = '{}_fig{}_part{:04d}.{}'.format(
+                file_prefix, fig_idx, self.chunk, self.fmt)
+        return os.path.join(self.video_dir, fnam)
+
+    def open(self, file_prefix, fig_idx, width, height):
+        """Open the video file of this chunk for one figure.
+
+        Parameters
+        ----------
+        file_prefix : str
+            The beginning of the file name.
+        fig_idx : int
+            The index of the figure in the plot.
+        width : int
+            The width of the frames in pixels.
+        height : int
+            The height of the frames in pixels.
+
+        Returns
+        -------
+        FFMpegSegment or PillowSegment
+            The writer, with the methods write and close.
+        """
+        os.makedirs(self.video_dir, exist_ok=True)
+        path = self.get_file(file_prefix, fig_idx)
+        if self.fmt == 'mp4':
+            return FFMpegSegment(path, width, height, self.fps)
+        return PillowSegment(path, width, height, self.fps)
+
+
+def render_video_chunk(plot_func, args, kwargs, video):
+    """Render one chunk of an evolution plot to video files with Agg.
+
+    Parameters
+    ----------
+    plot_func : function
+        One of the evolution plotting functions from aux that accept video.
+    args : tuple
+        The positional arguments of plot_func.
+    kwargs : dict
+        The keyword arguments of plot_func.
+    video : VideoExport
+        The chunk and where it is written to.
+
+    Returns
+    -------
+    str
+        The directory the videos were written to.
+    """
+    plt.switch_backend('Agg')
+    try:
+        plot_func(*args, video=video, **kwargs)
+    finally:
+        plt.close('all')
+    return video.video_dir
+
+
+def stitch_videos(video_dir, fmt, fps):
+    """Join the part files written by the chunks in order and remove them.
+
+    Parameters
+    ----------
+    video_dir : str
+        The directory with the part files.
+    fmt : str
+        'mp4' or 'gif'.
+    fps : float
+        The frames per second.
+
+    Returns
+    -------
+    str
+        The directory the videos were written to.
+    """
+    parts = {}
+    for path in sorted(glob.glob(os.path.join(
+            video_dir, '*_part[0-9][0-9][0-9][0-9].' + fmt))):
+        parts.setdefault(path.rsplit('_part', 1)[0], []).append(path)
+
+    for base, part_lst in parts.items():
+        out = '{}.{}'.format(base, fmt)
+        if fmt == 'mp4':
+            lst_file = base + '_parts.txt'
+            with open(lst_file, 'w') as f:
+                for path in part_lst:
+                    f.write("file '{}'\n".format(os.path.abspath(path)))
+            # all parts are encoded alike, hence no re-encoding needed
+            subprocess.run(
+                [get_ffmpeg_path(), '-y', '-loglevel', 'error', '-f', 'concat',
+                 '-safe', '0', '-i', lst_file, '-c', 'copy', out], check=True)
+            os.remove(lst_file)
+        else:
+            frames = []
+            for path in part_lst:
+                with Image.open(path) as im:
+                    frames += [frame.convert('RGB')
+                               for frame in ImageSequence.Iterator(im)]
+            save_gif(out, frames, fps)
+        for path in part_lst:
+            os.remove(path)
+    return video_dir
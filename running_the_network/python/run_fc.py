@@ -42,18 +42,25 @@ Arduino requirements:
 # =============================================================================
 
 # %% setup: imports
-import numpy as np
-
 import os
 import sys
 import time
 import datetime
+import queue
+import atexit
 
-import serial
 import re
 
-from utilities.aux import (restart_serial, pass_time_to_nano, reboot,
-                           send_telegram_message, write_data_buffer_to_csv)
+from utilities.fc import (restart_serial, pass_time_to_nano, reboot,
+                          send_telegram_message, fake_ports)
+from utilities.fc_pipeline import (SerialReader, CsvWriter, parse_data_line,
+                                   get_queue_depths)
+from utilities.fc_protocol import is_data_line, ParameterHandshake
+from utilities.fc_notify import Notifier
+from utilities.fc_replay import FakeNano, FakeUno
+from utilities.fc_wal import WriteAheadLog
+from utilities.fc_buffer import RecordBuffer
+from utilities.node_store import NodeStore, node_store_dirname
 # %% setup: port names and directories
 """
 These here variables here have to be customized to match your own platform!
@@ -122,6 +129,12 @@ waitThisTimeBeforeSkippingNodeConnection = waitingTimeBeforeReconnect # time in
 transmitDataRecordedDuringThisTimeWindow = 3600000 # in ms, 3600000 equals one
 # hour
 
+replay_directory = None # For testing without hardware, set this to a directory
+# with recorded Node<node>_data.csv files, e.g., os.path.join('..', '..',
+# 'csv', 'bonus'). A simulated nano (and uno) then replays the recorded data,
+# which is stored in the subdirectory replay of data_directory.
+replay_speedup = 100 # how much faster than real time data is replayed
+
 # %% setup: processing user inputs
 # experiment-dependent parameters. If you wish to run your own experiments, 
 # expand.
@@ -175,6 +188,20 @@ max_data_buffer_size = int(
     transmitDataRecordedDuringThisTimeWindow /  tsEpochDuration * 1.2) # gather
 # at most this many values before writing in the CSV file. must be larger than
 # the max number of transmitted test statistics per one connection!!
+# %% setup: simulated nano and uno replaying recorded data
+if replay_directory is not None:
+    fake_nano = FakeNano(
+        replay_directory, tsEpochDuration=tsEpochDuration,
+        speedup=replay_speedup,
+        connection_seconds=waitingTimeBeforeReconnect / 1000,
+        max_records=max_data_buffer_size)
+    possible_nano_port_names = ['replay nano']
+    possible_rebooter_port_names = ['replay uno']
+    fake_ports['replay nano'] = fake_nano
+    fake_ports['replay uno'] = FakeUno(fake_nano)
+    data_directory = os.path.join(data_directory, 'replay')
+    backup_directory = os.path.join(backup_directory, 'replay')
+
 # %% setup: sanity check for port names
 # check if user has input their own port names
 if "TBA" in possible_nano_port_names or "TBA" in possible_rebooter_port_names:
@@ -184,14 +211,14 @@ if "TBA" in possible_nano_port_names or "TBA" in possible_rebooter_port_names:
 
 # %% setup: start the serial ports to nano and uno
 for pn in possible_rebooter_port_names:
-    if restart_serial(pn) is not None:
-        uno = serial.Serial(pn, 9600, timeout=1)
+    uno = restart_serial(pn)
+    if uno is not None:
         reboot(uno)
         break
 
 for pn in possible_nano_port_names:
-    if restart_serial(pn) is not None:
-        nano = serial.Serial(pn, 9600, timeout=1)
+    nano = restart_serial(pn)
+    if nano is not None:
         break
 try:
     print("Nano port name is " + nano.name)
@@ -212,8 +239,30 @@ reboot_after_time = 300 # in seconds. With = 300, reboots
 
 wait_for_serial_seconds = 30 # in seconds. Reboots FC nano after this time if
 # serial is not found for whatever strange reason
-
-data_buffer = np.zeros([max_data_buffer_size, 3])
+wal_fsync_seconds = 1 # in seconds. Received records are logged to disk right
+# away (write-ahead log), so that nothing is lost if this script crashes. They
+# are forced onto the storage at least this often, which bounds what is lost on
+# a power failure.
+write_node_store = True # also stores received records in the columnar node
+# store next to the csv files, from where processing_data reads them directly.
+node_store_chunk_epochs = 14400 # number of epochs per chunk of the node store
+
+serial_retry_seconds = 1 # in seconds. Time between attempts to find the serial
+# port of the nano after it was lost
+
+notification_sink = send_telegram_message # where notifications are sent to.
+# For testing without the telegram bot, use print or
+# utilities.fc_notify.FileSink(<path of a file>)
+notification_interval = 60 # in seconds. At most one notification is sent per
+# this time, notifications in between are batched.
+notification_dedup_window = 600 # in seconds. Identical notifications are sent
+# at most once per this time, repetitions are counted and reported afterwards.
+
+print_queue_depths_after = 600 # in seconds. Regularly prints how many received
+# lines and data buffers wait for processing. Growing numbers mean that this
+# script cannot keep up with the network.
+
+data_buffer = RecordBuffer(max_data_buffer_size) # reused after every write
 
 # need to keep track which nodes have all been triggered, in order to switch to
 # recoverData mode once all have been triffered
@@ -223,222 +272,172 @@ numNodesTriggered = 0
 data_directory = os.path.join(data_directory, experiment_name)
 backup_directory = os.path.join(backup_directory, experiment_name)
 
+# records left over in the write-ahead log, e.g., after a crash, are stored in
+# the csv files before anything new is received
+wal = WriteAheadLog(os.path.join(data_directory, 'wal'),
+                    fsync_seconds=wal_fsync_seconds)
+node_store = None
+if write_node_store:
+    node_store = NodeStore(os.path.join(data_directory, node_store_dirname),
+                           chunk_epochs=node_store_chunk_epochs)
+    if not node_store.get_nodes():
+        # the analysis prefers the store over the csv files, so a new store
+        # starts with what has been received so far
+        n_imported = node_store.import_csv(data_directory)
+        if n_imported > 0:
+            print("Imported {} records into the node store.".format(
+                n_imported))
+n_replayed = wal.replay(data_directory, backup_directory, backup_key,
+                        node_store=node_store)
+if n_replayed > 0:
+    print("Stored {} records from the write-ahead log.".format(n_replayed))
+atexit.register(wal.close)
+
 # upon start-up, pass the current time and time index to the nanao
 # first communicate the global time to the nano
 print("Global time starts at {}".format(
     start_glob_time_at.strftime("%Y-%m-%d, %H:%M:%S")))
 
 nano = pass_time_to_nano(nano, start_glob_time_at, tsEpochDuration,
-                         possible_nano_port_names, wait_for_serial_seconds)
+                         possible_nano_port_names, wait_for_serial_seconds,
+                         retry_seconds=serial_retry_seconds)
 
 last_successfull_connection_at_time = datetime.datetime.now() # init
 last_successfull_transmission_at_time = datetime.datetime.now() # init
+last_queue_depths_at_time = datetime.datetime.now() # init
+
+# from now on, a reader thread drains the serial port of the nano into a queue
+# and a writer thread stores the data buffers, so that neither parsing nor
+# disk I/O nor rebooting can make the serial input buffer overflow. If the nano
+# did not take the time (nano is None), the reader reports the port as lost
+# right away and the loop below reconnects and passes the time again.
+reader = SerialReader(nano)
+reader.start()
+writer = CsvWriter(data_directory, backup_directory, backup_key,
+                   node_store=node_store)
+writer.start()
+atexit.register(writer.stop) # write what is still queued when terminated
+# notifications are sent in the background, so a slow or unreachable telegram
+# server never stalls the reception of data
+notifier = Notifier(notification_sink, min_interval=notification_interval,
+                    dedup_window=notification_dedup_window)
+notifier.start()
+atexit.register(notifier.stop)
 
 # %% setup: define all serial outputs from the nano and uno that trigger serial
 # input from this script.
 
-# now set all the remaining parameters 
-# the patterns to look for while writing input parameters
-set_to_pattern = r'set to'
-
-recoverDataPattern = r'^Enter recoverDataMode'
-
-tsWindowLengthPattern = r'^Enter tsWindowLength'
-tsEpochBufferDurationPattern = r'^Enter tsEpochBufferDuration'
-precisionTSPattern = r'Enter precisionTS'
-startRecordingEpochPattern = r'^Enter startRecordingEpoch'
-sensorSamplingTimeIntervalPattern = r'^Enter sensorSamplingTimeInterval'
-
-waitingTimeBeforeReconnectPattern = r'^Enter waitingTimeBeforeReconnect'
-waitThisTimeBeforeSkippingNodeConnectionPattern = (
-    r'^Enter waitThisTimeBeforeSkippingNodeConnection')
-deathWarningAfterThisTimePattern = r'^Enter deathWarningAfterThisTime'
-transmitDataRecordedDuringThisTimeWindowPattern = (
-    r'^Enter transmitDataRecordedDuringThisTimeWindow')
-
-connectToNodeWithIndexPattern = r'^Enter connectToNodeWithIndex'
-
-# what patterns are we looking for during data transmission?
-data_pattern = r'^Node\d+,\d+,\d+,\d+,\d+$'  # Regex pattern to match the
-# desired format
-successful_connect_pattern  = 'found all characteristics'
-disconnect_pattern = r'^Peripheral disconnected' # disconnection pattern
-soft_reset_pattern = r'^Restarted softly!' # raise suspicion via telegram bot
-
-trigger_pattern = r'^All have been triggered' # to count number of triggered
-# nodes
+# the parameter prompts of the nano and the values they are answered with.
+# Values changing while running are given as functions returning them.
+parameter_prompts = {
+    'recoverDataMode': lambda: recoverData,
+    'tsWindowLength': tsWindowLength,
+    'tsEpochBufferDuration': tsEpochBufferDuration,
+    'precisionTS': precisionTS,
+    'startRecordingEpoch': startRecordingEpoch,
+    'sensorSamplingTimeInterval': sensorSamplingTimeInterval,
+    'waitingTimeBeforeReconnect': waitingTimeBeforeReconnect,
+    'waitThisTimeBeforeSkippingNodeConnection': (
+        waitThisTimeBeforeSkippingNodeConnection),
+    'deathWarningAfterThisTime': deathWarningAfterThisTime,
+    'transmitDataRecordedDuringThisTimeWindow': (
+        transmitDataRecordedDuringThisTimeWindow),
+    # make sure to start where we left before being turned off
+    'connectToNodeWithIndex': lambda: this_node - 1,
+}
+handshake_timeout = 10 # in seconds. Maximum time the nano may take to confirm
+# a parameter.
+handshake = ParameterHandshake(reader.lines, parameter_prompts,
+                               timeout=handshake_timeout)
+
+# what patterns are we looking for during data transmission? Data lines are
+# checked by is_data_line.
+successful_connect_pattern  = re.compile('found all characteristics')
+disconnect_pattern = re.compile(r'^Peripheral disconnected') # disconnection
+# pattern
+soft_reset_pattern = re.compile(r'^Restarted softly!') # raise suspicion via
+# telegram bot
+
+trigger_pattern = re.compile(r'^All have been triggered') # to count number of
+# triggered nodes
 
 #%% endlessly running loop to set parameters and receive/store data from nodes
 while True:
     if ((datetime.datetime.now() - last_successfull_connection_at_time).seconds
         > reboot_after_time):
         print("Maximum time without connection has passed! Rebooting Nano.")
-        send_telegram_message(
+        notifier.notify(
             "max time without connection.")
             # save what has been in the buffer to this stage
-        write_data_buffer_to_csv(
-            data_buffer, this_node, data_directory, backup_directory,
-            backup_key)
-        data_buffer = np.zeros([max_data_buffer_size, 3])
+        writer.submit(data_buffer.take(), wal_segment=wal.rotate())
         reboot(uno)
     if ((datetime.datetime.now()
          - last_successfull_transmission_at_time).seconds > reboot_after_time):
         print("Maximum time without transmission has passed! Rebooting Nano.")
-        send_telegram_message(
+        notifier.notify(
             "max time without transmission.")
         # save what has been in the buffer to this stage
-        write_data_buffer_to_csv(
-            data_buffer, this_node, data_directory, backup_directory,
-            backup_key)
-        data_buffer = np.zeros([max_data_buffer_size, 3])
+        writer.submit(data_buffer.take(), wal_segment=wal.rotate())
 
         this_node = this_node%numberOfNodes + 1 # increase by 1, in case node
         # got stuck somewhere
         reboot(uno)
+    wal.sync_if_due()
+    if ((datetime.datetime.now() - last_queue_depths_at_time).seconds
+        > print_queue_depths_after):
+        print(get_queue_depths(reader, writer))
+        if replay_directory is not None:
+            print("Replay: {}".format(fake_nano.get_stats()))
+        last_queue_depths_at_time = datetime.datetime.now()
     try:
-        if nano.in_waiting > 0: # if the nano has written something new onto
-            # serial output
-            line = nano.readline().decode().strip() # grab current line
-            print(line)
-            # first check for data matching pattern -> this is always found
-            # as fastest
-            if re.match(data_pattern, line):
-                last_successfull_transmission_at_time = datetime.datetime.now()
-                values = line.split(",")
-                this_node = int(values[0][4:])
-
-                queue_idx = int(values[4])
-                data_sfx = int(values[1])%100
-                try: 
-                    data_buffer[queue_idx, 0] = int(values[3])
-                    data_buffer[queue_idx, 1] = (int(values[1]) - data_sfx) / (
-                        10**precisionTS)
-                    data_buffer[queue_idx, 2] = (int(values[2]) - data_sfx) / (
-                        10**precisionTS)
-                except IndexError as e:
-                    # In case the node was not succesful in reading a smaller
-                    # number of samples that should be transmitted during one
-                    # connection, reboot and connect to the same node again.
-                    # (could also be solved on the node level, but we do as
-                    # much as possible in the python script for easier
-                    # maintenance)
-                    print(e)
-                    this_node = this_node - 1
-                    send_telegram_message("Index Error! Rebooting")
-                    reboot(uno)
-            # check if buffer should be written to file
-            elif re.match(disconnect_pattern, line) and np.sum(data_buffer)>0:
-                write_data_buffer_to_csv(
-                    data_buffer, this_node, data_directory, backup_directory,
-                    backup_key)
-                data_buffer = np.zeros([max_data_buffer_size, 3])
-            # check if connection was established
-            elif re.search(successful_connect_pattern, line):
-                last_successfull_connection_at_time = datetime.datetime.now()
-            # check if line matches any of the defined patterns for input
-            # parameters
-            elif re.match(recoverDataPattern, line):
-                nano.write(("{}".format(recoverData)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(tsWindowLengthPattern, line):
-                nano.write(("{}".format(tsWindowLength)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(tsEpochBufferDurationPattern, line):
-                nano.write(("{}".format(tsEpochBufferDuration)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(precisionTSPattern, line):
-                nano.write(("{}".format(precisionTS)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(startRecordingEpochPattern, line):
-                nano.write(("{}".format(startRecordingEpoch)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(sensorSamplingTimeIntervalPattern, line):
-                nano.write(("{}".format(sensorSamplingTimeInterval)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(waitingTimeBeforeReconnectPattern, line):
-                nano.write(("{}".format(waitingTimeBeforeReconnect)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(
-                waitThisTimeBeforeSkippingNodeConnectionPattern, line):
-                nano.write(("{}".format(
-                    waitThisTimeBeforeSkippingNodeConnection)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(deathWarningAfterThisTimePattern, line):
-                nano.write(("{}".format(deathWarningAfterThisTime)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(transmitDataRecordedDuringThisTimeWindowPattern,
-                          line):
-                nano.write(("{}".format(
-                    transmitDataRecordedDuringThisTimeWindow)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(connectToNodeWithIndexPattern, line):
-                # make sure to start where we left before being turned off
-                nano.write(("{}".format(this_node-1)).encode())
-                while True:
-                    if nano.in_waiting > 0:
-                        line = nano.readline().decode().strip()
-                        if re.search(set_to_pattern, line):
-                            print(line)
-                            break
-            elif re.match(trigger_pattern, line):
-                numNodesTriggered = numNodesTriggered + 1
-                print("Number of triggered nodes: {}".format(
-                    numNodesTriggered))
-                if numNodesTriggered == numberOfNodes:
-                    recoverData = 1 # switch to recover data mode if all nodes
-                    # have been triggered!
+        try:
+            # the next line the nano has written onto serial output
+            received_at, line = reader.lines.get(timeout=1)
+        except queue.Empty:
+            continue
+        if line is None:
+            raise OSError("Serial port was lost")
+        print(line)
+        # first check for data matching pattern -> this is always found
+        # as fastest
+        if is_data_line(line):
+            last_successfull_transmission_at_time = received_at
+            this_node, queue_idx, epoch, temp, humid = parse_data_line(
+                line, precisionTS)
+            try: 
+                data_buffer.put(queue_idx, this_node, epoch, temp, humid)
+                wal.append(this_node, queue_idx, epoch, temp, humid)
+            except IndexError as e:
+                # In case the node was not succesful in reading a smaller
+                # number of samples that should be transmitted during one
+                # connection, reboot and connect to the same node again.
+                # (could also be solved on the node level, but we do as
+                # much as possible in the python script for easier
+                # maintenance)
+                print(e)
+                this_node = this_node - 1
+                notifier.notify("Index Error! Rebooting")
+                reboot(uno)
+        # check if buffer should be written to file
+        elif disconnect_pattern.match(line) and not data_buffer.is_empty:
+            writer.submit(data_buffer.take(), wal_segment=wal.rotate())
+        # check if connection was established
+        elif successful_connect_pattern.search(line):
+            last_successfull_connection_at_time = datetime.datetime.now()
+        # check if line is a prompt for any of the input parameters, which
+        # is answered right away
+        elif handshake.answer(nano, line):
+            pass
+        elif trigger_pattern.match(line):
+            numNodesTriggered = numNodesTriggered + 1
+            print("Number of triggered nodes: {}".format(
+                numNodesTriggered))
+            if numNodesTriggered == numberOfNodes:
+                recoverData = 1 # switch to recover data mode if all nodes
+                # have been triggered!
     except (OSError, AttributeError): 
         print("Connection to serial was lost. Waiting for serial...")
+        reader.set_serial(None)
         serial_found = False
         while not serial_found:
             for cand_pn in possible_nano_port_names:
@@ -447,7 +446,8 @@ while True:
                     print("Serial found!")
                     nano = pass_time_to_nano(
                         nano_restarted, start_glob_time_at, tsEpochDuration,
-                        possible_nano_port_names, wait_for_serial_seconds)
+                        possible_nano_port_names, wait_for_serial_seconds,
+                        retry_seconds=serial_retry_seconds)
                     print("Time succesfully passed to Nano.")
                     if nano is not None:
                         # set to the time of the last reset
@@ -460,8 +460,11 @@ while True:
                     else:
                         print("Nano became None in pass_time_to_nano")
                         reboot(uno)
-                        send_telegram_message(
+                        notifier.notify(
                             "Rebooted nano, serial failed to init.")
                         cand_pn = possible_nano_port_names[0] # start from
                         # the first possible name again in the loop
+            if not serial_found:
+                time.sleep(serial_retry_seconds)
         print("Serial_found is true and the loop was escaped!")
+        reader.set_serial(nano)